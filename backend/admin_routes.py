@@ -1,23 +1,23 @@
 # admin_routes.py
 from flask import Blueprint, request, jsonify
 from models import db, BarbeariaCliente, Agendamento, PlanoAssinatura, Pagamento, AdminUser
-from sqlalchemy import func
+from sqlalchemy import func, or_, and_
+from sqlalchemy.orm import joinedload
 from datetime import datetime, timedelta
-import jwt
-from config import Config
+from contexto_barbearia import invalidar_barbearia
+from autenticacao import principal_atual
+from resumos import resumo_periodo
+from utils import codificar_cursor, decodificar_cursor
+from whatsapp_service import estatisticas_whatsapp
 
 admin_routes = Blueprint('admin_routes', __name__)
 
 def verificar_token_admin():
-    """Middleware para verificar token JWT"""
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
-    try:
-        payload = jwt.decode(token, Config.SECRET_KEY, algorithms=['HS256'])
-        return payload
-    except jwt.ExpiredSignatureError:
-        return None
-    except jwt.InvalidTokenError:
+    """Middleware para verificar token JWT (claims do admin ou None)"""
+    principal = principal_atual()
+    if not principal or principal.tipo != 'admin':
         return None
+    return principal.claims
 
 @admin_routes.route('/admin/dashboard', methods=['GET'])
 def admin_dashboard():
@@ -29,13 +29,11 @@ def admin_dashboard():
         # Estatísticas gerais
         total_barbearias = BarbeariaCliente.query.count()
         barbearias_ativas = BarbeariaCliente.query.filter_by(ativo=True).count()
-        total_agendamentos = Agendamento.query.count()
+        total_agendamentos = resumo_periodo(None)["agendamentos"]
         
-        # Agendamentos últimos 7 dias
-        sete_dias_atras = datetime.utcnow() - timedelta(days=7)
-        agendamentos_recentes = Agendamento.query.filter(
-            Agendamento.data_criacao >= sete_dias_atras
-        ).count()
+        # Agendamentos últimos 7 dias (pelos resumos diários de todas as barbearias)
+        hoje = datetime.utcnow().date()
+        agendamentos_recentes = resumo_periodo(None, hoje - timedelta(days=6), hoje)["agendamentos"]
 
         # Faturamento
         faturamento_mensal = Pagamento.query.filter(
@@ -66,19 +64,125 @@ def admin_dashboard():
     except Exception as e:
         return jsonify({"erro": "Erro interno do servidor"}), 500
 
+# Ordenações aceitas na listagem; barbearias sem expiração vão para o fim da ordem crescente
+SEM_EXPIRACAO = datetime(9999, 12, 31)
+ORDENACOES_BARBEARIAS = {
+    'data_criacao': BarbeariaCliente.data_criacao,
+    'nome': BarbeariaCliente.nome,
+    'data_expiracao': func.coalesce(BarbeariaCliente.data_expiracao, SEM_EXPIRACAO)
+}
+POR_PAGINA_BARBEARIAS = 20
+
+def _filtros_barbearias(args):
+    """Filtros da listagem a partir da query string; levanta ValueError se inválidos"""
+    filtros = []
+
+    plano = args.get('plano')
+    if plano == 'free':
+        filtros.append(BarbeariaCliente.plano_id.is_(None))
+    elif plano:
+        filtros.append(BarbeariaCliente.plano_id == int(plano))
+
+    ativo = args.get('ativo')
+    if ativo is not None:
+        if ativo not in ('true', 'false'):
+            raise ValueError(ativo)
+        filtros.append(BarbeariaCliente.ativo.is_(ativo == 'true'))
+
+    agora = datetime.utcnow()
+    expiracao = args.get('expiracao')
+    if expiracao == 'expiradas':
+        filtros.append(BarbeariaCliente.data_expiracao < agora)
+    elif expiracao == 'vigentes':
+        filtros.append(or_(BarbeariaCliente.data_expiracao.is_(None), BarbeariaCliente.data_expiracao >= agora))
+    elif expiracao:
+        raise ValueError(expiracao)
+
+    expira_ate = args.get('expira_ate')
+    if expira_ate:
+        fim = datetime.strptime(expira_ate, '%Y-%m-%d') + timedelta(days=1)
+        filtros.append(BarbeariaCliente.data_expiracao < fim)
+
+    return filtros
+
 @admin_routes.route('/admin/barbearias', methods=['GET'])
 def listar_barbearias():
+    """Barbearias paginadas por cursor.
+
+    Parâmetros: `ordenar` (data_criacao, nome, data_expiracao), `direcao` (asc, desc),
+    filtros `plano` (id ou "free"), `ativo` (true/false), `expiracao`
+    (expiradas/vigentes) e `expira_ate` (YYYY-MM-DD), e o `cursor` devolvido
+    em `proximo_cursor` para a página seguinte.
+    """
     auth = verificar_token_admin()
     if not auth:
         return jsonify({"erro": "Não autorizado"}), 401
 
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = 20
+        ordenar = request.args.get('ordenar', 'data_criacao')
+        direcao = request.args.get('direcao', 'asc' if ordenar == 'nome' else 'desc')
+        coluna = ORDENACOES_BARBEARIAS.get(ordenar)
+        if coluna is None or direcao not in ('asc', 'desc'):
+            return jsonify({"erro": "Ordenação inválida"}), 400
+
+        try:
+            filtros = _filtros_barbearias(request.args)
+        except ValueError:
+            return jsonify({"erro": "Filtro inválido"}), 400
+
+        total = BarbeariaCliente.query.filter(*filtros).count()
 
-        barbearias = BarbeariaCliente.query.order_by(
-            BarbeariaCliente.data_criacao.desc()
-        ).paginate(page=page, per_page=per_page, error_out=False)
+        query = BarbeariaCliente.query.options(
+            joinedload(BarbeariaCliente.plano)
+        ).filter(*filtros)
+
+        # Keyset: continua depois da última linha da página anterior (valor, id)
+        cursor = request.args.get('cursor')
+        if cursor:
+            valores = decodificar_cursor(cursor, 2)
+            if not valores:
+                return jsonify({"erro": "Cursor inválido"}), 400
+            valor, ultimo_id = valores
+            # O formato confere, mas os valores vêm do cliente
+            try:
+                if not isinstance(valor, str):
+                    raise TypeError(valor)
+                if ordenar != 'nome':
+                    valor = datetime.fromisoformat(valor)
+                ultimo_id = int(ultimo_id)
+            except (TypeError, ValueError):
+                return jsonify({"erro": "Cursor inválido"}), 400
+            depois = (coluna < valor) if direcao == 'desc' else (coluna > valor)
+            mesmo_id = (BarbeariaCliente.id < ultimo_id) if direcao == 'desc' else (BarbeariaCliente.id > ultimo_id)
+            query = query.filter(or_(depois, and_(coluna == valor, mesmo_id)))
+
+        if direcao == 'desc':
+            query = query.order_by(coluna.desc(), BarbeariaCliente.id.desc())
+        else:
+            query = query.order_by(coluna.asc(), BarbeariaCliente.id.asc())
+
+        # Uma linha a mais só para saber se existe próxima página
+        barbearias = query.limit(POR_PAGINA_BARBEARIAS + 1).all()
+        tem_mais = len(barbearias) > POR_PAGINA_BARBEARIAS
+        barbearias = barbearias[:POR_PAGINA_BARBEARIAS]
+
+        # Total de agendamentos da página inteira numa única consulta agrupada
+        ids = [b.id for b in barbearias]
+        totais = dict(db.session.query(
+            Agendamento.barbearia_id, func.count(Agendamento.id)
+        ).filter(
+            Agendamento.barbearia_id.in_(ids)
+        ).group_by(Agendamento.barbearia_id).all()) if ids else {}
+
+        proximo_cursor = None
+        if tem_mais:
+            ultima = barbearias[-1]
+            valor = {
+                'data_criacao': ultima.data_criacao,
+                'nome': ultima.nome,
+                'data_expiracao': ultima.data_expiracao or SEM_EXPIRACAO
+            }[ordenar]
+            proximo_cursor = codificar_cursor(valor, ultima.id)
 
         resultado = {
             "barbearias": [
@@ -92,13 +196,12 @@ def listar_barbearias():
                     "ativo": b.ativo,
                     "data_criacao": b.data_criacao.isoformat(),
                     "data_expiracao": b.data_expiracao.isoformat() if b.data_expiracao else None,
-                    "total_agendamentos": Agendamento.query.filter_by(barbearia_id=b.id).count()
+                    "total_agendamentos": totais.get(b.id, 0)
                 }
-                for b in barbearias.items
+                for b in barbearias
             ],
-            "total": barbearias.total,
-            "paginas": barbearias.pages,
-            "pagina_atual": page
+            "total": total,
+            "proximo_cursor": proximo_cursor
         }
 
         return jsonify(resultado), 200
@@ -119,6 +222,7 @@ def ativar_barbearia(barbearia_id):
 
         barbearia.ativo = True
         db.session.commit()
+        invalidar_barbearia(barbearia_id)
 
         return jsonify({"msg": "Barbearia ativada com sucesso"}), 200
 
@@ -139,9 +243,20 @@ def desativar_barbearia(barbearia_id):
 
         barbearia.ativo = False
         db.session.commit()
+        invalidar_barbearia(barbearia_id)
 
         return jsonify({"msg": "Barbearia desativada com sucesso"}), 200
 
     except Exception as e:
         db.session.rollback()
-        return jsonify({"erro": "Erro interno do servidor"}), 500
\ No newline at end of file
+        return jsonify({"erro": "Erro interno do servidor"}), 500
+
+
+@admin_routes.route('/admin/whatsapp/estatisticas', methods=['GET'])
+def admin_estatisticas_whatsapp():
+    """Chamadas à API do WhatsApp pelo número da plataforma e uso do registro por barbearia"""
+    auth = verificar_token_admin()
+    if not auth:
+        return jsonify({"erro": "Não autorizado"}), 401
+
+    return jsonify(estatisticas_whatsapp()), 200
@@ -1,11 +1,16 @@
 from flask import Flask, g, request, render_template, jsonify
 from flask_cors import CORS
-from models import db, BarbeariaCliente, PlanoAssinatura, AdminUser, ConfiguracaoBarbearia
+from models import db, PlanoAssinatura, AdminUser, ConfiguracaoBarbearia
 from routes import routes
 from auth_routes import auth_routes
 from admin_routes import admin_routes
 from main_routes import payment_routes
 from config import Config
+from migracoes import aplicar_migracoes
+from contexto_barbearia import obter_barbearia
+from cache_http import etag_versao, nao_modificado, com_cache
+from notificacoes import processador_notificacoes
+from lembretes import agendador_lembretes
 import logging
 import json
 from datetime import datetime
@@ -24,7 +29,7 @@ app.config.from_object(Config)
 db.init_app(app)
 
 # Libera CORS para acesso mobile
-CORS(app)
+CORS(app, expose_headers=["X-Proximo-Cursor"])
 
 # Blueprints (rotas separadas)
 app.register_blueprint(routes)
@@ -77,42 +82,54 @@ def health_check():
             "message": "❌ Erro no sistema"
         }), 500
 
+# Conteúdo fixo durante a vida do processo: o ETag é o próprio nonce do processo
+INFO_API = {
+    "name": "GPlan API",
+    "version": "1.0.0",
+    "status": "running",
+    "timestamp": datetime.now().isoformat(),
+    "endpoints": {
+        "health": "/health",
+        "landing": "/",
+        "admin": "/admin/login",
+        "agendamento": "/agendamento",
+        "pagamento": "/payment"
+    }
+}
+
 @app.route('/api/info')
 def api_info():
     """Informações da API"""
-    return jsonify({
-        "name": "GPlan API",
-        "version": "1.0.0",
-        "status": "running",
-        "timestamp": datetime.now().isoformat(),
-        "endpoints": {
-            "health": "/health",
-            "landing": "/",
-            "admin": "/admin/login",
-            "agendamento": "/agendamento",
-            "pagamento": "/payment"
-        }
-    })
+    etag = etag_versao('info')
+    resposta = nao_modificado(etag)
+    if resposta:
+        return resposta
+    return com_cache(jsonify(INFO_API), etag)
 
 # -------------------- MIDDLEWARE --------------------
 
 @app.before_request
 def identificar_barbearia():
+    # Arquivos estáticos e health check não dependem da barbearia
+    if request.endpoint in ('static', 'health_check'):
+        return
+
     barbearia_id = request.headers.get('X-Barbearia-ID') or request.args.get('barbearia_id')
     if barbearia_id:
         try:
-            barbearia = BarbeariaCliente.query.get(int(barbearia_id))
+            barbearia = obter_barbearia(barbearia_id)
             if barbearia:
                 g.barbearia = barbearia
                 g.barbearia_id = barbearia.id
-        except:
-            pass
+        except Exception as e:
+            logger.error(f"Erro ao identificar barbearia: {str(e)}")
 
 # -------------------- DADOS INICIAIS --------------------
 
 def criar_dados_iniciais():
     with app.app_context():
         db.create_all()
+        aplicar_migracoes()
         
         if not PlanoAssinatura.query.first():
             planos = [
@@ -152,6 +169,12 @@ if __name__ == '__main__':
         criar_dados_iniciais()
     
     logger.info("✅ Dados iniciais criados com sucesso!")
+
+    # Envio das notificações do outbox em segundo plano
+    if app.config['NOTIFICACOES_WORKERS'] > 0:
+        processador_notificacoes.iniciar(app, app.config['NOTIFICACOES_WORKERS'])
+    if app.config['LEMBRETES_ATIVOS']:
+        agendador_lembretes.iniciar(app)
     
     # ✅ CORREÇÃO: Usar porta do ambiente (Railway fornece via variável)
     port = int(os.environ.get('PORT', 5000))
@@ -0,0 +1,132 @@
+# autenticacao.py
+import hashlib
+import logging
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+import jwt
+from flask import g, request
+from models import db, TokenRevogado
+from config import Config
+from cache import CacheLRU
+
+logger = logging.getLogger(__name__)
+
+# Intervalo para enxergar revogações feitas por outros processos
+RECARREGAR_REVOGADOS_SEGUNDOS = 30
+
+Principal = namedtuple('Principal', 'tipo usuario_id barbearia_id claims expira_em token_hash')
+
+# Claims já verificados, por hash do token; cada item vale até o `exp` do token
+cache_tokens = CacheLRU(max_itens=4096)
+
+
+def hash_token(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class ListaRevogacao:
+    """Hashes de tokens revogados em memória (consulta O(1)), espelhando a tabela
+    TokenRevogado, que é relida a cada RECARREGAR_REVOGADOS_SEGUNDOS."""
+
+    def __init__(self):
+        self._hashes = {}
+        self._carregado_em = None
+        self._lock = threading.Lock()
+
+    def _recarregar_se_preciso(self):
+        agora = time.monotonic()
+        if self._carregado_em is not None and agora - self._carregado_em < RECARREGAR_REVOGADOS_SEGUNDOS:
+            return
+
+        with self._lock:
+            if self._carregado_em is not None and agora - self._carregado_em < RECARREGAR_REVOGADOS_SEGUNDOS:
+                return
+            try:
+                linhas = db.session.query(TokenRevogado.token_hash, TokenRevogado.expira_em).filter(
+                    TokenRevogado.expira_em > datetime.utcnow()
+                ).all()
+                self._hashes = dict(linhas)
+            except Exception as e:
+                logger.error(f"Erro ao carregar tokens revogados: {str(e)}")
+            self._carregado_em = agora
+
+    def contem(self, token_hash):
+        self._recarregar_se_preciso()
+        return token_hash in self._hashes
+
+    def revogar(self, token_hash, expira_em):
+        db.session.merge(TokenRevogado(token_hash=token_hash, expira_em=expira_em))
+        # Revogações vencidas não servem mais para nada
+        TokenRevogado.query.filter(TokenRevogado.expira_em < datetime.utcnow()).delete(synchronize_session=False)
+        db.session.commit()
+        with self._lock:
+            self._hashes[token_hash] = expira_em
+
+
+revogados = ListaRevogacao()
+
+
+def verificar_token(token):
+    """Principal do token JWT, ou None se inválido, expirado ou revogado.
+
+    A assinatura é verificada uma vez por token; depois disso os claims saem
+    do cache até o `exp`.
+    """
+    if not token:
+        return None
+
+    token_hash = hash_token(token)
+    if revogados.contem(token_hash):
+        return None
+
+    principal = cache_tokens.obter(token_hash)
+    if principal is not None:
+        if principal.expira_em > time.time():
+            return principal
+        cache_tokens.invalidar(token_hash)
+        return None
+
+    try:
+        claims = jwt.decode(token, Config.SECRET_KEY, algorithms=['HS256'], options={'require': ['exp']})
+    except jwt.InvalidTokenError:
+        return None
+
+    principal = Principal(
+        tipo=claims.get('tipo'),
+        usuario_id=claims.get('user_id'),
+        barbearia_id=claims.get('barbearia_id'),
+        claims=claims,
+        expira_em=claims['exp'],
+        token_hash=token_hash
+    )
+    cache_tokens.definir(token_hash, principal)
+    return principal
+
+
+def token_da_requisicao():
+    cabecalho = request.headers.get('Authorization', '')
+    return cabecalho[7:].strip() if cabecalho.startswith('Bearer ') else None
+
+
+def principal_atual():
+    """Principal da requisição; o token é verificado uma única vez e fica em g"""
+    if 'principal' not in g:
+        g.principal = verificar_token(token_da_requisicao())
+    return g.principal
+
+
+def token_revogado(token):
+    return revogados.contem(hash_token(token))
+
+
+def revogar_token(token):
+    """Revoga um token válido até o `exp` dele. Retorna False se o token já não valia."""
+    principal = verificar_token(token)
+    if not principal:
+        return False
+
+    revogados.revogar(principal.token_hash, datetime.utcfromtimestamp(principal.expira_em))
+    cache_tokens.invalidar(principal.token_hash)
+    return True
@@ -5,6 +5,7 @@ from models import db, AdminUser, BarbeariaCliente
 from werkzeug.security import check_password_hash
 import datetime
 from config import Config
+from autenticacao import token_da_requisicao, token_revogado, revogar_token
 
 auth_routes = Blueprint('auth_routes', __name__)
 
@@ -165,10 +166,27 @@ def verificar_token():
         if not token:
             return jsonify({"valido": False, "erro": "Token não fornecido"}), 400
 
+        if token_revogado(token):
+            return jsonify({"valido": False, "erro": "Token revogado"}), 401
+
         payload = jwt.decode(token, Config.SECRET_KEY, algorithms=['HS256'])
         return jsonify({"valido": True, "payload": payload}), 200
 
     except jwt.ExpiredSignatureError:
         return jsonify({"valido": False, "erro": "Token expirado"}), 401
     except jwt.InvalidTokenError:
-        return jsonify({"valido": False, "erro": "Token inválido"}), 401
\ No newline at end of file
+        return jsonify({"valido": False, "erro": "Token inválido"}), 401
+
+@auth_routes.route('/logout', methods=['POST'])
+def logout():
+    """Revoga o token do cabeçalho Authorization até ele expirar"""
+    try:
+        token = token_da_requisicao()
+        if not token or not revogar_token(token):
+            return jsonify({"erro": "Token inválido ou expirado"}), 401
+
+        return jsonify({"msg": "Logout realizado com sucesso"}), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"erro": "Erro interno do servidor"}), 500
\ No newline at end of file
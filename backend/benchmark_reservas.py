@@ -0,0 +1,100 @@
+# benchmark_reservas.py
+# Dispara centenas de POST /agendar simultâneos para o mesmo barbeiro e horário e
+# confere que exatamente um é aceito. Usa um banco SQLite temporário.
+#
+#   python benchmark_reservas.py --requisicoes 300 --threads 64
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import Flask
+from models import db, PlanoAssinatura, BarbeariaCliente, Barbeiro, Servico, ConfiguracaoBarbearia, Agendamento
+from routes import routes
+
+
+def montar_app(caminho_banco):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{caminho_banco}'
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': 30}}
+    db.init_app(app)
+    app.register_blueprint(routes)
+    return app
+
+
+def popular(app):
+    with app.app_context():
+        db.create_all()
+        plano = PlanoAssinatura(nome="Benchmark", preco_mensal=0, limite_barbeiros=10, limite_agendamentos=100000)
+        db.session.add(plano)
+        db.session.flush()
+
+        barbearia = BarbeariaCliente(
+            nome="Barbearia Benchmark", email="bench@gplan.com.br", telefone="11999999999",
+            dominio="benchmark", plano_id=plano.id, ativo=True
+        )
+        db.session.add(barbearia)
+        db.session.flush()
+
+        barbeiro = Barbeiro(barbearia_id=barbearia.id, nome="Barbeiro Benchmark")
+        servico = Servico(barbearia_id=barbearia.id, nome="Corte", duracao_minutos=30, preco=30.0)
+        db.session.add_all([barbeiro, servico, ConfiguracaoBarbearia(barbearia_id=barbearia.id)])
+        db.session.commit()
+        return barbearia.id, barbeiro.id, servico.id
+
+
+def executar(requisicoes, threads):
+    pasta = tempfile.mkdtemp()
+    app = montar_app(os.path.join(pasta, 'benchmark.db'))
+    barbearia_id, barbeiro_id, servico_id = popular(app)
+
+    horario = (datetime.utcnow() + timedelta(days=1)).replace(hour=10, minute=0, second=0, microsecond=0)
+    largada = threading.Barrier(min(threads, requisicoes))
+
+    def agendar(n):
+        cliente = app.test_client()
+        if n < threads:
+            largada.wait()
+        inicio = time.perf_counter()
+        resposta = cliente.post('/agendar', headers={'X-Barbearia-ID': str(barbearia_id)}, json={
+            "nome": f"Cliente {n}",
+            "telefone": f"1198{n:07d}",
+            "servico_id": servico_id,
+            "barbeiro_id": barbeiro_id,
+            "horario": horario.isoformat()
+        })
+        return resposta.status_code, time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        resultados = list(executor.map(agendar, range(requisicoes)))
+    duracao = time.perf_counter() - inicio
+
+    sucessos = sum(1 for status, _ in resultados if status == 200)
+    recusados = sum(1 for status, _ in resultados if status == 400)
+    erros = requisicoes - sucessos - recusados
+    latencias = sorted(t for _, t in resultados)
+
+    with app.app_context():
+        gravados = Agendamento.query.filter_by(barbeiro_id=barbeiro_id, horario=horario, status='confirmado').count()
+
+    print(f"Requisições: {requisicoes} ({threads} threads) em {duracao:.2f}s -> {requisicoes / duracao:.1f} req/s")
+    print(f"Aceitas: {sucessos} | Recusadas (horário ocupado): {recusados} | Erros: {erros}")
+    print(f"Latência p50: {latencias[len(latencias) // 2] * 1000:.1f}ms | p99: {latencias[int(len(latencias) * 0.99) - 1] * 1000:.1f}ms")
+    print(f"Agendamentos confirmados no banco para o horário: {gravados}")
+
+    return sucessos == 1 and gravados == 1 and erros == 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark de reservas concorrentes no mesmo horário")
+    parser.add_argument('--requisicoes', type=int, default=300)
+    parser.add_argument('--threads', type=int, default=64)
+    args = parser.parse_args()
+
+    ok = executar(args.requisicoes, args.threads)
+    print("✅ Exatamente um agendamento aceito" if ok else "❌ Reserva duplicada ou erro inesperado")
+    sys.exit(0 if ok else 1)
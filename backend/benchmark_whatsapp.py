@@ -0,0 +1,98 @@
+# benchmark_whatsapp.py
+# Mede a vazão do WhatsAppService.enviar_lote contra um servidor local que imita a
+# Graph API: responde com a latência indicada e devolve 429 quando recebe mais de
+# --limite mensagens no mesmo segundo. Com --url usa outro endpoint de teste.
+#
+#   python benchmark_whatsapp.py --mensagens 300 --taxa 50 --limite 60
+#   python benchmark_whatsapp.py --taxa 1000   # sem ritmo: mostra os 429
+import argparse
+import json
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from whatsapp_service import WhatsAppService, cliente_whatsapp
+
+
+class ApiSimulada(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    latencia = 0.05
+    limite = 60
+    chegadas = deque()
+    maximo_por_segundo = 0
+    recusadas = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        cls = type(self)
+        with cls.lock:
+            agora = time.monotonic()
+            while cls.chegadas and agora - cls.chegadas[0] >= 1:
+                cls.chegadas.popleft()
+            cls.chegadas.append(agora)
+            cls.maximo_por_segundo = max(cls.maximo_por_segundo, len(cls.chegadas))
+            excedeu = len(cls.chegadas) > cls.limite
+            if excedeu:
+                cls.recusadas += 1
+
+        time.sleep(cls.latencia)
+        status, corpo = (429, {"error": {"code": 130429}}) if excedeu else (200, {"messages": [{"id": "wamid.teste"}]})
+        dados = json.dumps(corpo).encode()
+        self.send_response(status)
+        if excedeu:
+            self.send_header('Retry-After', '1')
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def log_message(self, *args):
+        pass
+
+
+def iniciar_api_simulada(latencia, limite):
+    ApiSimulada.latencia = latencia
+    ApiSimulada.limite = limite
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), ApiSimulada)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{servidor.server_port}"
+
+
+def executar(mensagens, taxa, rajada, concorrencia, url):
+    # Número próprio por execução: o token bucket é por phone_number_id
+    servico = WhatsAppService(url, f"benchmark-{time.time_ns()}", 'benchmark', taxa=taxa, rajada=rajada)
+
+    lote = [(f"55119{n:08d}", f"Mensagem de teste {n}") for n in range(mensagens)]
+    inicio = time.perf_counter()
+    resultados = servico.enviar_lote(lote, concorrencia)
+    duracao = time.perf_counter() - inicio
+
+    enviadas = sum(1 for r in resultados if r["enviada"])
+    estatisticas = cliente_whatsapp.estatisticas()
+
+    print(f"Mensagens: {mensagens} em {duracao:.2f}s -> {enviadas / duracao:.1f} enviadas/s (taxa configurada {taxa}/s)")
+    print(f"Enviadas: {enviadas} | Falharam: {mensagens - enviadas}")
+    print(f"Respostas: {estatisticas['contadores']} | latência média {estatisticas['latencia_media_ms']}ms")
+    return enviadas == mensagens
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Vazão do envio em lote de mensagens WhatsApp")
+    parser.add_argument('--mensagens', type=int, default=300)
+    parser.add_argument('--taxa', type=float, default=50, help="Mensagens por segundo permitidas pelo token bucket")
+    parser.add_argument('--rajada', type=int, default=10)
+    parser.add_argument('--concorrencia', type=int, default=None)
+    parser.add_argument('--latencia', type=float, default=0.05, help="Latência da API simulada (s)")
+    parser.add_argument('--limite', type=int, default=60, help="Mensagens por segundo aceitas pela API simulada")
+    parser.add_argument('--url', help="Endpoint de teste próprio no lugar da API simulada")
+    args = parser.parse_args()
+
+    url = args.url or iniciar_api_simulada(args.latencia, args.limite)
+    ok = executar(args.mensagens, args.taxa, args.rajada, args.concorrencia, url)
+    if not args.url:
+        print(f"API simulada: pico de {ApiSimulada.maximo_por_segundo} msg/s, {ApiSimulada.recusadas} recusadas com 429")
+    print("✅ Todas as mensagens enviadas" if ok else "❌ Houve mensagens não enviadas")
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,112 @@
+# cache.py
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheLRU:
+    """Cache em memória com expulsão LRU, TTL opcional e contadores de uso.
+
+    `geracao` muda a cada invalidação: quem calcula um valor a partir do banco
+    guarda a geração lida antes da consulta e a repassa para `definir`, assim um
+    valor calculado antes de uma escrita concorrente nunca entra no cache.
+
+    `ao_remover(valor)`, se informado, é chamado (fora do lock) para cada valor
+    que sai do cache: expulso, expirado, substituído ou invalidado.
+    """
+
+    def __init__(self, max_itens=1024, ttl=None, ao_remover=None):
+        self.max_itens = max_itens
+        self.ttl = ttl
+        self.ao_remover = ao_remover
+        self.geracao = 0
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirados = 0
+        self.invalidacoes = 0
+
+    def _avisar_removidos(self, valores):
+        if self.ao_remover:
+            for valor in valores:
+                self.ao_remover(valor)
+
+    def obter(self, chave, padrao=None):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                self.misses += 1
+                return padrao
+
+            valor, expira_em = item
+            if expira_em is None or expira_em > time.monotonic():
+                self._itens.move_to_end(chave)
+                self.hits += 1
+                return valor
+
+            del self._itens[chave]
+            self.expirados += 1
+            self.misses += 1
+        self._avisar_removidos([valor])
+        return padrao
+
+    def definir(self, chave, valor, geracao=None):
+        removidos = []
+        with self._lock:
+            if geracao is not None and geracao != self.geracao:
+                return False
+
+            expira_em = time.monotonic() + self.ttl if self.ttl else None
+            anterior = self._itens.get(chave)
+            if anterior is not None and anterior[0] is not valor:
+                removidos.append(anterior[0])
+            self._itens[chave] = (valor, expira_em)
+            self._itens.move_to_end(chave)
+
+            while len(self._itens) > self.max_itens:
+                removidos.append(self._itens.popitem(last=False)[1][0])
+                self.evictions += 1
+        self._avisar_removidos(removidos)
+        return True
+
+    def invalidar(self, chave):
+        with self._lock:
+            self.geracao += 1
+            item = self._itens.pop(chave, None)
+            if item is not None:
+                self.invalidacoes += 1
+        if item is not None:
+            self._avisar_removidos([item[0]])
+
+    def invalidar_onde(self, predicado):
+        """Remove todas as entradas cuja chave satisfaz `predicado`"""
+        with self._lock:
+            self.geracao += 1
+            chaves = [chave for chave in self._itens if predicado(chave)]
+            removidos = [self._itens.pop(chave)[0] for chave in chaves]
+            self.invalidacoes += len(chaves)
+        self._avisar_removidos(removidos)
+
+    def limpar(self):
+        with self._lock:
+            self.geracao += 1
+            self.invalidacoes += len(self._itens)
+            removidos = [valor for valor, _ in self._itens.values()]
+            self._itens.clear()
+        self._avisar_removidos(removidos)
+
+    def estatisticas(self):
+        with self._lock:
+            consultas = self.hits + self.misses
+            return {
+                "itens": len(self._itens),
+                "max_itens": self.max_itens,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / consultas, 4) if consultas else 0.0,
+                "evictions": self.evictions,
+                "expirados": self.expirados,
+                "invalidacoes": self.invalidacoes
+            }
@@ -0,0 +1,47 @@
+# cache_http.py
+# ETag / Last-Modified para endpoints públicos de leitura. As versões vêm de
+# contadores em memória (contexto_barbearia), então o ETag leva um nonce do
+# processo: depois de um restart os contadores recomeçam, mas o ETag não repete.
+import secrets
+from datetime import datetime, timezone
+from flask import current_app, make_response, request
+
+NONCE_PROCESSO = secrets.token_hex(4)
+INICIADO_EM = datetime.now(timezone.utc).replace(microsecond=0)
+
+# O cliente pode guardar, mas sempre revalida (um 304 custa só a checagem da versão)
+CACHE_CONTROL = 'public, no-cache'
+
+
+def etag_versao(*partes):
+    return '-'.join([NONCE_PROCESSO] + [str(parte) for parte in partes])
+
+
+def _aplicar_cabecalhos(resposta, etag, modificado_em, vary):
+    resposta.set_etag(etag)
+    resposta.last_modified = max(INICIADO_EM, modificado_em or INICIADO_EM)
+    resposta.headers['Cache-Control'] = CACHE_CONTROL
+    if vary:
+        resposta.vary.add(vary)
+    return resposta
+
+
+def nao_modificado(etag, modificado_em=None, vary=None):
+    """Resposta 304 se o cliente já tem a versão `etag`, senão None"""
+    if request.if_none_match:
+        if not request.if_none_match.contains(etag):
+            return None
+    else:
+        desde = request.if_modified_since
+        if not desde or max(INICIADO_EM, modificado_em or INICIADO_EM) > desde:
+            return None
+
+    return _aplicar_cabecalhos(current_app.response_class(status=304), etag, modificado_em, vary)
+
+
+def com_cache(resposta, etag, modificado_em=None, vary=None):
+    """Acrescenta ETag, Last-Modified e Cache-Control a uma resposta 200"""
+    resposta = make_response(resposta)
+    if resposta.status_code == 200:
+        _aplicar_cabecalhos(resposta, etag, modificado_em, vary)
+    return resposta
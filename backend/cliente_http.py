@@ -0,0 +1,192 @@
+# cliente_http.py
+# Cliente HTTP para APIs externas: sessão com pool de conexões keep-alive,
+# timeouts de conexão/leitura, novas tentativas com backoff exponencial e
+# jitter em 429/5xx, disjuntor (circuit breaker) e contadores de resultado.
+import logging
+import random
+import threading
+import time
+from collections import Counter
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+STATUS_REPETIR = {429, 500, 502, 503, 504}
+
+
+class CircuitoAberto(Exception):
+    """O disjuntor está aberto: a chamada nem foi feita"""
+
+
+class Disjuntor:
+    """Abre depois de `limite_falhas` chamadas seguidas com falha; após `tempo_aberto`
+    segundos deixa passar uma chamada de teste (meio-aberto), que fecha ou reabre."""
+
+    def __init__(self, limite_falhas=5, tempo_aberto=30):
+        self.limite_falhas = limite_falhas
+        self.tempo_aberto = tempo_aberto
+        self._falhas = 0
+        self._aberto_em = None
+        self._testando = False
+        self._lock = threading.Lock()
+
+    @property
+    def estado(self):
+        with self._lock:
+            if self._aberto_em is None:
+                return 'fechado'
+            if time.monotonic() - self._aberto_em >= self.tempo_aberto:
+                return 'meio_aberto'
+            return 'aberto'
+
+    def permitir(self):
+        with self._lock:
+            if self._aberto_em is None:
+                return True
+            if time.monotonic() - self._aberto_em < self.tempo_aberto or self._testando:
+                return False
+            # Uma única chamada de teste por vez
+            self._testando = True
+            return True
+
+    def registrar_sucesso(self):
+        with self._lock:
+            self._falhas = 0
+            self._aberto_em = None
+            self._testando = False
+
+    def registrar_falha(self):
+        with self._lock:
+            self._falhas += 1
+            if self._testando or self._falhas >= self.limite_falhas:
+                if self._aberto_em is None or self._testando:
+                    logger.warning(f"⚡ Disjuntor aberto após {self._falhas} falha(s) seguida(s)")
+                self._aberto_em = time.monotonic()
+            self._testando = False
+
+
+class BaldeTokens:
+    """Token bucket: libera `taxa` envios por segundo, com rajada de até `capacidade`.
+
+    Quem chega sem ficha disponível reserva a próxima (o saldo fica negativo) e
+    dorme só o necessário, então as threads são atendidas em ordem de chegada.
+    """
+
+    def __init__(self, taxa, capacidade=None):
+        self.taxa = float(taxa)
+        self.capacidade = float(capacidade or taxa)
+        self._fichas = self.capacidade
+        self._atualizado = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reservar(self):
+        """Consome uma ficha; retorna quantos segundos esperar até poder usá-la"""
+        with self._lock:
+            agora = time.monotonic()
+            self._fichas = min(self.capacidade, self._fichas + (agora - self._atualizado) * self.taxa)
+            self._atualizado = agora
+            self._fichas -= 1
+            return 0 if self._fichas >= 0 else -self._fichas / self.taxa
+
+    def aguardar(self):
+        espera = self.reservar()
+        if espera:
+            time.sleep(espera)
+        return espera
+
+
+class ClienteHTTP:
+    """Sessão requests compartilhada (thread-safe para envio) com resiliência.
+
+    `pool` limita as conexões abertas por host; `timeout` é (conexão, leitura).
+    Repete erros de conexão (a requisição não chegou) e respostas 429/5xx;
+    timeout de leitura não é repetido, pois o servidor pode ter aceitado.
+    """
+
+    def __init__(self, nome, pool=10, timeout=(3.05, 10), tentativas=3,
+                 espera_base=0.5, espera_maxima=8, disjuntor=None):
+        self.nome = nome
+        self.pool = pool
+        self.timeout = timeout
+        self.tentativas = tentativas
+        self.espera_base = espera_base
+        self.espera_maxima = espera_maxima
+        self.disjuntor = disjuntor or Disjuntor()
+
+        self.sessao = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=pool, pool_maxsize=pool, pool_block=True, max_retries=0)
+        self.sessao.mount('https://', adaptador)
+        self.sessao.mount('http://', adaptador)
+
+        self._contadores = Counter()
+        self._latencia_total = 0.0
+        self._latencia_maxima = 0.0
+        self._lock = threading.Lock()
+
+    def _contar(self, chave, latencia=None):
+        with self._lock:
+            self._contadores[chave] += 1
+            if latencia is not None:
+                self._latencia_total += latencia
+                self._latencia_maxima = max(self._latencia_maxima, latencia)
+
+    def _espera(self, tentativa, resposta=None):
+        # Retry-After (segundos) do servidor tem prioridade sobre o backoff
+        if resposta is not None and resposta.headers.get('Retry-After', '').isdigit():
+            return min(self.espera_maxima, int(resposta.headers['Retry-After']))
+        return random.uniform(0, min(self.espera_maxima, self.espera_base * 2 ** tentativa))
+
+    def requisitar(self, metodo, url, **kwargs):
+        """Resposta final (pode ser 4xx/5xx); levanta CircuitoAberto ou requests.RequestException"""
+        if not self.disjuntor.permitir():
+            self._contar('rejeitadas_circuito')
+            raise CircuitoAberto(f"{self.nome}: circuito aberto")
+
+        kwargs.setdefault('timeout', self.timeout)
+        for tentativa in range(self.tentativas):
+            if tentativa:
+                self._contar('novas_tentativas')
+
+            inicio = time.monotonic()
+            try:
+                resposta = self.sessao.request(metodo, url, **kwargs)
+            except requests.ConnectionError:
+                # Inclui ConnectTimeout; a mensagem não chegou ao servidor
+                self._contar('erros_rede', time.monotonic() - inicio)
+                if tentativa + 1 < self.tentativas:
+                    time.sleep(self._espera(tentativa))
+                    continue
+                self.disjuntor.registrar_falha()
+                raise
+            except Exception:
+                self._contar('erros_rede', time.monotonic() - inicio)
+                self.disjuntor.registrar_falha()
+                raise
+
+            self._contar(f'status_{resposta.status_code}', time.monotonic() - inicio)
+            if resposta.status_code in STATUS_REPETIR and tentativa + 1 < self.tentativas:
+                time.sleep(self._espera(tentativa, resposta))
+                continue
+            break
+
+        if resposta.status_code in STATUS_REPETIR:
+            self.disjuntor.registrar_falha()
+        else:
+            # 2xx e erros do cliente (4xx) mostram que o serviço está de pé
+            self.disjuntor.registrar_sucesso()
+        return resposta
+
+    def post(self, url, **kwargs):
+        return self.requisitar('POST', url, **kwargs)
+
+    def estatisticas(self):
+        with self._lock:
+            chamadas = sum(v for k, v in self._contadores.items() if k.startswith('status_') or k == 'erros_rede')
+            return {
+                "nome": self.nome,
+                "circuito": self.disjuntor.estado,
+                "contadores": dict(self._contadores),
+                "latencia_media_ms": round(1000 * self._latencia_total / chamadas, 1) if chamadas else None,
+                "latencia_maxima_ms": round(1000 * self._latencia_maxima, 1)
+            }
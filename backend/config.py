@@ -36,6 +36,22 @@ class Config:
         ''  # colocar token de acesso do WhatsApp Business
     )
 
+    # Threads que enviam as notificações do outbox (0 desliga o envio neste processo)
+    NOTIFICACOES_WORKERS = int(os.environ.get('NOTIFICACOES_WORKERS', 4))
+    # Varredura de lembretes de 24h/1h neste processo
+    LEMBRETES_ATIVOS = os.environ.get('LEMBRETES_ATIVOS', 'True').lower() in ['true', '1', 'yes']
+
+    # Cliente HTTP da API do WhatsApp (segundos / conexões por host)
+    WHATSAPP_TIMEOUT_CONEXAO = float(os.environ.get('WHATSAPP_TIMEOUT_CONEXAO', 3.05))
+    WHATSAPP_TIMEOUT_LEITURA = float(os.environ.get('WHATSAPP_TIMEOUT_LEITURA', 10))
+    WHATSAPP_POOL_CONEXOES = int(os.environ.get('WHATSAPP_POOL_CONEXOES', 10))
+    # Barbearias com número próprio: pool por barbearia e quantas ficam em memória
+    WHATSAPP_POOL_CONEXOES_BARBEARIA = int(os.environ.get('WHATSAPP_POOL_CONEXOES_BARBEARIA', 2))
+    WHATSAPP_CLIENTES_MAX = int(os.environ.get('WHATSAPP_CLIENTES_MAX', 256))
+    # Envios por segundo por número remetente (a Cloud API aceita 80/s por padrão)
+    WHATSAPP_MENSAGENS_POR_SEGUNDO = float(os.environ.get('WHATSAPP_MENSAGENS_POR_SEGUNDO', 80))
+    WHATSAPP_RAJADA = int(os.environ.get('WHATSAPP_RAJADA', 10))
+
     # -------------------- URLs do Sistema --------------------
     SITE_URL = os.environ.get(
         'SITE_URL',
@@ -0,0 +1,311 @@
+# contexto_barbearia.py
+import threading
+from collections import namedtuple
+from datetime import datetime, timezone
+from sqlalchemy import event
+from sqlalchemy.orm import Session, joinedload, selectinload, object_session
+from models import BarbeariaCliente, PlanoAssinatura, Barbeiro, Servico, ConfiguracaoBarbearia
+from cache import CacheLRU
+
+
+class SnapshotBarbearia(namedtuple('SnapshotBarbearia', [
+    'id', 'nome', 'email', 'telefone', 'dominio', 'ativo', 'data_expiracao',
+    'plano_id', 'plano_nome', 'limite_barbeiros', 'limite_agendamentos'
+])):
+    """Cópia imutável dos dados da barbearia usados em toda requisição"""
+
+    __slots__ = ()
+
+    @property
+    def expirada(self):
+        return bool(self.data_expiracao and self.data_expiracao < datetime.utcnow())
+
+
+# Mesmos nomes de atributo dos modelos, então servem onde o modelo era usado para leitura
+SnapshotConfiguracao = namedtuple('SnapshotConfiguracao', [
+    'barbearia_id', 'horario_abertura', 'horario_fechamento', 'intervalo_agendamento',
+    'whatsapp_ativo', 'whatsapp_numero', 'confirmacao_automatica', 'lembrete_24h', 'lembrete_1h'
+])
+SnapshotServico = namedtuple('SnapshotServico', 'id nome duracao_minutos preco descricao')
+SnapshotBarbeiro = namedtuple('SnapshotBarbeiro', 'id nome especialidade foto_url')
+
+
+class ContextoBarbearia:
+    """Tudo que o agendamento precisa da barbearia: dados, plano, configuração,
+    serviços e barbeiros ativos. Imutável; `versao` muda a cada invalidação."""
+
+    __slots__ = ('versao', 'barbearia', 'configuracao', 'servicos', 'barbeiros', '_servicos', '_barbeiros')
+
+    def __init__(self, versao, barbearia, configuracao, servicos, barbeiros):
+        self.versao = versao
+        self.barbearia = barbearia
+        self.configuracao = configuracao
+        self.servicos = tuple(servicos)
+        self.barbeiros = tuple(barbeiros)
+        self._servicos = {s.id: s for s in self.servicos}
+        self._barbeiros = {b.id: b for b in self.barbeiros}
+
+    def servico(self, servico_id):
+        """Serviço ativo da barbearia, ou None"""
+        return self._servicos.get(_id_valido(servico_id))
+
+    def barbeiro(self, barbeiro_id):
+        """Barbeiro ativo da barbearia, ou None"""
+        return self._barbeiros.get(_id_valido(barbeiro_id))
+
+
+# Resolução de barbearia por id. O TTL cobre alterações feitas por outros processos;
+# mudanças locais (ativação, desativação, assinatura, cadastros) invalidam na hora.
+cache_barbearias = CacheLRU(max_itens=2048, ttl=60)
+cache_contextos = CacheLRU(max_itens=1024, ttl=300)
+# Domínio -> (versão, snapshot) do último contexto lido por ele
+cache_dominios = CacheLRU(max_itens=2048, ttl=300)
+
+# Versões de conteúdo (usadas também nos ETags). Só crescem: a versão de uma
+# barbearia é a soma da global (invalidação de todas) com a dela.
+_versoes = {}
+_modificacoes = {}
+_versao_global = 0
+_versao_planos = 0
+_planos_modificados_em = None
+_versoes_lock = threading.Lock()
+
+
+def _id_valido(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def versao_barbearia(barbearia_id):
+    """Versão atual do contexto da barbearia (incrementada a cada invalidação)"""
+    return _versao_global + _versoes.get(int(barbearia_id), 0)
+
+
+def modificacao_barbearia(barbearia_id):
+    """Momento (UTC) da última invalidação da barbearia, ou None se não houve"""
+    return _modificacoes.get(int(barbearia_id), _modificacoes.get(None))
+
+
+def versao_planos():
+    """Versão da lista de planos e o momento da última alteração (ou None)"""
+    return _versao_planos, _planos_modificados_em
+
+
+def _agora():
+    return datetime.now(timezone.utc).replace(microsecond=0)
+
+
+def _criar_snapshot(barbearia):
+    plano = barbearia.plano
+    return SnapshotBarbearia(
+        id=barbearia.id,
+        nome=barbearia.nome,
+        email=barbearia.email,
+        telefone=barbearia.telefone,
+        dominio=barbearia.dominio,
+        ativo=bool(barbearia.ativo),
+        data_expiracao=barbearia.data_expiracao,
+        plano_id=barbearia.plano_id,
+        plano_nome=plano.nome if plano else None,
+        limite_barbeiros=plano.limite_barbeiros if plano else None,
+        limite_agendamentos=plano.limite_agendamentos if plano else None
+    )
+
+
+def _criar_configuracao(config):
+    if not config:
+        return None
+    return SnapshotConfiguracao(
+        barbearia_id=config.barbearia_id,
+        horario_abertura=config.horario_abertura,
+        horario_fechamento=config.horario_fechamento,
+        intervalo_agendamento=config.intervalo_agendamento,
+        whatsapp_ativo=bool(config.whatsapp_ativo),
+        whatsapp_numero=config.whatsapp_numero,
+        confirmacao_automatica=bool(config.confirmacao_automatica),
+        lembrete_24h=bool(config.lembrete_24h),
+        lembrete_1h=bool(config.lembrete_1h)
+    )
+
+
+def obter_barbearia(barbearia_id):
+    """SnapshotBarbearia do id (do cache quando possível), ou None se não existir"""
+    barbearia_id = _id_valido(barbearia_id)
+    if barbearia_id is None:
+        return None
+
+    snapshot = cache_barbearias.obter(barbearia_id)
+    if snapshot is not None:
+        return snapshot
+
+    geracao = cache_barbearias.geracao
+    barbearia = BarbeariaCliente.query.options(
+        joinedload(BarbeariaCliente.plano)
+    ).filter_by(id=barbearia_id).first()
+    if not barbearia:
+        return None
+
+    snapshot = _criar_snapshot(barbearia)
+    cache_barbearias.definir(barbearia_id, snapshot, geracao)
+    return snapshot
+
+
+def obter_contexto(barbearia_id):
+    """ContextoBarbearia do id, montado em uma única rodada de consultas; None se não existir"""
+    barbearia_id = _id_valido(barbearia_id)
+    if barbearia_id is None:
+        return None
+
+    contexto = cache_contextos.obter(barbearia_id)
+    if contexto is not None:
+        return contexto
+
+    geracao = cache_contextos.geracao
+    versao = versao_barbearia(barbearia_id)
+    barbearia = BarbeariaCliente.query.options(
+        joinedload(BarbeariaCliente.plano),
+        joinedload(BarbeariaCliente.configuracao),
+        selectinload(BarbeariaCliente.servicos),
+        selectinload(BarbeariaCliente.barbeiros)
+    ).filter_by(id=barbearia_id).first()
+    if not barbearia:
+        return None
+
+    contexto = ContextoBarbearia(
+        versao=versao,
+        barbearia=_criar_snapshot(barbearia),
+        configuracao=_criar_configuracao(barbearia.configuracao),
+        servicos=[
+            SnapshotServico(s.id, s.nome, s.duracao_minutos, s.preco, s.descricao)
+            for s in sorted(barbearia.servicos, key=lambda s: s.id) if s.ativo
+        ],
+        barbeiros=[
+            SnapshotBarbeiro(b.id, b.nome, b.especialidade, b.foto_url)
+            for b in sorted(barbearia.barbeiros, key=lambda b: b.id) if b.ativo
+        ]
+    )
+    cache_contextos.definir(barbearia_id, contexto, geracao)
+    return contexto
+
+
+def obter_contexto_por_dominio(dominio):
+    """ContextoBarbearia pelo domínio público, ou None"""
+    guardado = cache_dominios.obter(dominio)
+    if guardado is not None:
+        versao, barbearia = guardado
+        contexto = obter_contexto(barbearia.id)
+        # O domínio pode ter mudado depois de guardado
+        if contexto and contexto.barbearia.dominio == dominio:
+            if contexto.versao != versao:
+                cache_dominios.definir(dominio, (contexto.versao, contexto.barbearia))
+            return contexto
+        cache_dominios.invalidar(dominio)
+
+    barbearia = BarbeariaCliente.query.with_entities(BarbeariaCliente.id).filter_by(dominio=dominio).first()
+    if not barbearia:
+        return None
+
+    contexto = obter_contexto(barbearia.id)
+    if contexto:
+        cache_dominios.definir(dominio, (contexto.versao, contexto.barbearia))
+    return contexto
+
+
+def barbearia_em_memoria(dominio):
+    """SnapshotBarbearia do domínio sem consultar o banco, mesmo que o contexto
+    já tenha saído do cache; None se não estiver guardado ou se a barbearia mudou"""
+    guardado = cache_dominios.obter(dominio)
+    if guardado is None:
+        return None
+    versao, barbearia = guardado
+    return barbearia if versao == versao_barbearia(barbearia.id) else None
+
+
+def invalidar_barbearia(barbearia_id=None):
+    """Descarta snapshot e contexto da barbearia (ou de todas, ex.: quando um plano muda)"""
+    global _versao_global
+    with _versoes_lock:
+        if barbearia_id is None:
+            _versao_global += 1
+            _modificacoes.clear()
+        else:
+            barbearia_id = int(barbearia_id)
+            _versoes[barbearia_id] = _versoes.get(barbearia_id, 0) + 1
+        _modificacoes[barbearia_id] = _agora()
+
+    if barbearia_id is None:
+        cache_barbearias.limpar()
+        cache_contextos.limpar()
+    else:
+        cache_barbearias.invalidar(barbearia_id)
+        cache_contextos.invalidar(barbearia_id)
+
+
+def _registrar_alteracao(objeto, barbearia_id):
+    sessao = object_session(objeto)
+    if sessao is not None and barbearia_id is not None:
+        sessao.info.setdefault('barbearias_alteradas', set()).add(barbearia_id)
+
+
+@event.listens_for(BarbeariaCliente, 'after_update')
+@event.listens_for(BarbeariaCliente, 'after_delete')
+def _registrar_barbearia_alterada(mapper, connection, barbearia):
+    _registrar_alteracao(barbearia, barbearia.id)
+
+
+@event.listens_for(Barbeiro, 'after_insert')
+@event.listens_for(Barbeiro, 'after_update')
+@event.listens_for(Barbeiro, 'after_delete')
+@event.listens_for(Servico, 'after_insert')
+@event.listens_for(Servico, 'after_update')
+@event.listens_for(Servico, 'after_delete')
+@event.listens_for(ConfiguracaoBarbearia, 'after_insert')
+@event.listens_for(ConfiguracaoBarbearia, 'after_update')
+@event.listens_for(ConfiguracaoBarbearia, 'after_delete')
+def _registrar_item_alterado(mapper, connection, item):
+    _registrar_alteracao(item, item.barbearia_id)
+
+
+def _invalidar_planos():
+    global _versao_planos, _planos_modificados_em
+    with _versoes_lock:
+        _versao_planos += 1
+        _planos_modificados_em = _agora()
+
+
+@event.listens_for(PlanoAssinatura, 'after_insert')
+def _registrar_plano_criado(mapper, connection, plano):
+    sessao = object_session(plano)
+    if sessao is not None:
+        sessao.info['planos_criados'] = True
+
+
+@event.listens_for(PlanoAssinatura, 'after_update')
+@event.listens_for(PlanoAssinatura, 'after_delete')
+def _registrar_plano_alterado(mapper, connection, plano):
+    sessao = object_session(plano)
+    if sessao is not None:
+        sessao.info['planos_alterados'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidar_barbearias_alteradas(sessao):
+    if sessao.info.pop('planos_criados', False) or sessao.info.get('planos_alterados'):
+        _invalidar_planos()
+
+    # Limites de plano entram em todos os snapshots das barbearias daquele plano
+    if sessao.info.pop('planos_alterados', False):
+        sessao.info.pop('barbearias_alteradas', None)
+        invalidar_barbearia()
+        return
+    for barbearia_id in sessao.info.pop('barbearias_alteradas', ()):
+        invalidar_barbearia(barbearia_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_barbearias_alteradas(sessao):
+    sessao.info.pop('barbearias_alteradas', None)
+    sessao.info.pop('planos_alterados', None)
+    sessao.info.pop('planos_criados', None)
@@ -0,0 +1,403 @@
+# disponibilidade.py
+import copy
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from models import db, Agendamento, ConfiguracaoBarbearia
+from cache import CacheLRU
+from utils import intervalo_do_dia
+from pre_reservas import pre_reservas
+
+# Limite de dias consultados de uma vez no modo período
+MAX_DIAS_PERIODO = 31
+
+# Horizonte máximo da busca pelo próximo horário livre
+MAX_DIAS_BUSCA = 60
+
+# Maior duração considerada para um agendamento ao buscar sobreposições
+DURACAO_MAXIMA_MINUTOS = 24 * 60
+
+# Grades diárias por (barbearia_id, barbeiro_id, data). Só mudam quando alguém
+# agenda/cancela ou a configuração muda; o TTL limita a defasagem entre processos.
+cache_disponibilidade = CacheLRU(max_itens=4096, ttl=300)
+
+
+def _minutos(hora):
+    """Converte um datetime.time em minutos desde a meia-noite"""
+    return hora.hour * 60 + hora.minute
+
+
+class GradeDia:
+    """Grade de horários de um barbeiro em um dia, com a ocupação guardada em bitmap.
+
+    O bit i representa o slot que começa em abertura + i * intervalo.
+    Bit ligado = slot ocupado por algum agendamento confirmado.
+    """
+
+    def __init__(self, data, abertura, fechamento, intervalo):
+        self.data = data
+        self.inicio = datetime.combine(data, abertura)
+        self.intervalo = intervalo
+        self.duracao_dia = max(0, _minutos(fechamento) - _minutos(abertura))
+        self.total_slots = -(-self.duracao_dia // intervalo) if intervalo else 0
+        self.ocupacao = 0
+
+    def ocupar(self, inicio, fim):
+        """Marca como ocupados todos os slots que intersectam [inicio, fim)"""
+        ini_min = (inicio - self.inicio).total_seconds() / 60
+        fim_min = (fim - self.inicio).total_seconds() / 60
+        if fim_min <= 0 or ini_min >= self.duracao_dia:
+            return
+
+        primeiro = max(0, int(ini_min // self.intervalo))
+        ultimo = min(self.total_slots, -int(-fim_min // self.intervalo))
+        if ultimo > primeiro:
+            self.ocupacao |= ((1 << (ultimo - primeiro)) - 1) << primeiro
+
+    def inicios_livres(self, duracao_minutos=None, agora=None):
+        """Bitmap dos slots onde cabe um serviço de `duracao_minutos` sem conflito"""
+        duracao = duracao_minutos or self.intervalo
+        if duracao > self.duracao_dia:
+            return 0
+
+        livres = ~self.ocupacao & ((1 << self.total_slots) - 1)
+
+        # Um início só serve se os k slots seguintes também estiverem livres
+        cabe = livres
+        for deslocamento in range(1, -(-duracao // self.intervalo)):
+            cabe &= livres >> deslocamento
+
+        # O serviço precisa terminar até o fechamento
+        ultimo_inicio = (self.duracao_dia - duracao) // self.intervalo
+        cabe &= (1 << (ultimo_inicio + 1)) - 1
+
+        # Descartar horários que já passaram
+        if agora is not None and agora >= self.inicio:
+            passados = int((agora - self.inicio).total_seconds() // 60 // self.intervalo) + 1
+            cabe &= ~((1 << passados) - 1)
+
+        return cabe
+
+    def com_ocupacoes(self, intervalos):
+        """Cópia da grade com ocupações extras; a grade original (que pode estar em cache) não muda"""
+        if not intervalos:
+            return self
+        grade = copy.copy(self)
+        for inicio, fim in intervalos:
+            grade.ocupar(inicio, fim)
+        return grade
+
+    def horario_do_slot(self, indice):
+        return self.inicio + timedelta(minutes=indice * self.intervalo)
+
+    def horarios_livres(self, duracao_minutos=None, agora=None):
+        """Lista de horários livres no formato HH:MM"""
+        cabe = self.inicios_livres(duracao_minutos, agora)
+        horarios = []
+        while cabe:
+            bit = cabe & -cabe
+            horarios.append(self.horario_do_slot(bit.bit_length() - 1).strftime('%H:%M'))
+            cabe ^= bit
+        return horarios
+
+
+def _filtro_sobreposicao(inicio, fim):
+    """Agendamentos confirmados cujo [horario, fim) intersecta [inicio, fim).
+
+    O limite inferior em `horario` mantém a consulta como faixa no índice
+    (barbeiro_id, horario, fim) em vez de varrer todo o histórico do barbeiro.
+    """
+    return (
+        Agendamento.status == 'confirmado',
+        Agendamento.horario >= inicio - timedelta(minutes=DURACAO_MAXIMA_MINUTOS),
+        Agendamento.horario < fim,
+        Agendamento.fim > inicio
+    )
+
+
+def carregar_ocupacoes_por_barbeiro(barbeiro_ids, inicio, fim):
+    """{barbeiro_id: [(inicio, fim), ...]} dos agendamentos confirmados em [inicio, fim), ordenado por início.
+
+    Uma única consulta, independente do número de barbeiros e de dias.
+    """
+    linhas = db.session.query(
+        Agendamento.barbeiro_id, Agendamento.horario, Agendamento.fim
+    ).filter(
+        Agendamento.barbeiro_id.in_(barbeiro_ids),
+        *_filtro_sobreposicao(inicio, fim)
+    ).order_by(Agendamento.horario).all()
+
+    ocupacoes = {}
+    for barbeiro_id, horario, horario_fim in linhas:
+        ocupacoes.setdefault(barbeiro_id, []).append((horario, horario_fim))
+    return ocupacoes
+
+
+def buscar_conflito(barbeiro_id, inicio, fim, ignorar_id=None):
+    """Primeiro agendamento confirmado do barbeiro que se sobrepõe a [inicio, fim), ou None"""
+    query = Agendamento.query.filter(
+        Agendamento.barbeiro_id == barbeiro_id,
+        *_filtro_sobreposicao(inicio, fim)
+    )
+    if ignorar_id is not None:
+        query = query.filter(Agendamento.id != ignorar_id)
+    return query.order_by(Agendamento.horario).first()
+
+
+def carregar_ocupacoes(barbeiro_id, inicio, fim):
+    """Busca (horario, fim) dos agendamentos confirmados do barbeiro em [inicio, fim) numa única consulta"""
+    ocupacoes = carregar_ocupacoes_por_barbeiro([barbeiro_id], inicio, fim)
+    return [ocupacao for lista in ocupacoes.values() for ocupacao in lista]
+
+
+def conflitos_em_lote(barbeiro_id, intervalos):
+    """Para cada (inicio, fim) informado, diz se há sobreposição com agendamento confirmado
+    ou com outro intervalo anterior da própria lista.
+
+    Todos os intervalos são verificados com uma única consulta de faixa.
+    """
+    if not intervalos:
+        return []
+
+    inicio = min(i for i, _ in intervalos)
+    fim = max(f for _, f in intervalos)
+    existentes = carregar_ocupacoes(barbeiro_id, inicio, fim)
+    inicios = [i for i, _ in existentes]
+
+    conflitos = []
+    aceitos = []
+    for novo_inicio, novo_fim in intervalos:
+        # Existentes ordenados por início: só os que começam antes de novo_fim importam
+        limite = bisect_left(inicios, novo_fim)
+        conflito = any(f > novo_inicio for _, f in existentes[:limite])
+        conflito = conflito or any(i < novo_fim and f > novo_inicio for i, f in aceitos)
+        if not conflito:
+            aceitos.append((novo_inicio, novo_fim))
+        conflitos.append(conflito)
+    return conflitos
+
+
+def montar_grades(config, barbeiro_ids, de, ate):
+    """{(barbeiro_id, data): GradeDia} para os barbeiros em [de, ate].
+
+    O que não está no cache é carregado com uma única consulta, qualquer que seja
+    o número de barbeiros e de dias faltando.
+    """
+    barbeiro_ids = [int(barbeiro_id) for barbeiro_id in barbeiro_ids]
+    grades = {}
+    faltando = []
+    for barbeiro_id in barbeiro_ids:
+        data = de
+        while data <= ate:
+            grade = cache_disponibilidade.obter((config.barbearia_id, barbeiro_id, data))
+            if grade is None:
+                faltando.append((barbeiro_id, data))
+            else:
+                grades[(barbeiro_id, data)] = grade
+            data += timedelta(days=1)
+
+    if not faltando:
+        return grades
+
+    geracao = cache_disponibilidade.geracao
+    novas = {
+        chave: GradeDia(chave[1], config.horario_abertura, config.horario_fechamento, config.intervalo_agendamento)
+        for chave in faltando
+    }
+
+    inicio = intervalo_do_dia(min(data for _, data in faltando))[0]
+    fim = intervalo_do_dia(max(data for _, data in faltando))[1]
+    barbeiros_faltando = sorted({barbeiro_id for barbeiro_id, _ in faltando})
+    ocupacoes = carregar_ocupacoes_por_barbeiro(barbeiros_faltando, inicio, fim)
+
+    for barbeiro_id, lista in ocupacoes.items():
+        for ocupado_inicio, ocupado_fim in lista:
+            # Um agendamento que atravessa a meia-noite ocupa os dois dias
+            data = ocupado_inicio.date()
+            while data <= ocupado_fim.date():
+                grade = novas.get((barbeiro_id, data))
+                if grade:
+                    grade.ocupar(ocupado_inicio, ocupado_fim)
+                data += timedelta(days=1)
+
+    for (barbeiro_id, data), grade in novas.items():
+        cache_disponibilidade.definir((config.barbearia_id, barbeiro_id, data), grade, geracao)
+
+    grades.update(novas)
+    return grades
+
+
+def montar_grades_periodo(config, barbeiro_id, de, ate):
+    """Monta as grades de cada dia em [de, ate] para um barbeiro"""
+    grades = montar_grades(config, [barbeiro_id], de, ate)
+    return {data: grade for (_, data), grade in sorted(grades.items())}
+
+
+def invalidar_disponibilidade(barbearia_id, barbeiro_id=None, data=None):
+    """Descarta grades em cache após agendamento, cancelamento ou mudança de configuração"""
+    barbearia_id = int(barbearia_id)
+    if barbeiro_id is not None and data is not None:
+        cache_disponibilidade.invalidar((barbearia_id, int(barbeiro_id), data))
+        return
+
+    barbeiro_id = int(barbeiro_id) if barbeiro_id is not None else None
+    cache_disponibilidade.invalidar_onde(
+        lambda chave: chave[0] == barbearia_id and (barbeiro_id is None or chave[1] == barbeiro_id)
+    )
+
+
+@event.listens_for(ConfiguracaoBarbearia, 'after_insert')
+@event.listens_for(ConfiguracaoBarbearia, 'after_update')
+@event.listens_for(ConfiguracaoBarbearia, 'after_delete')
+def _registrar_configuracao_alterada(mapper, connection, config):
+    sessao = object_session(config)
+    if sessao is not None:
+        sessao.info.setdefault('configuracoes_alteradas', set()).add(config.barbearia_id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidar_configuracoes_alteradas(sessao):
+    # Horários de funcionamento mudaram: todas as grades da barbearia ficam inválidas
+    for barbearia_id in sessao.info.pop('configuracoes_alteradas', ()):
+        invalidar_disponibilidade(barbearia_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_configuracoes_alteradas(sessao):
+    sessao.info.pop('configuracoes_alteradas', None)
+
+
+def montar_grade_dia(config, barbeiro_id, data):
+    """Monta a grade do dia com a ocupação do barbeiro"""
+    return montar_grades_periodo(config, barbeiro_id, data, data)[data]
+
+
+def _com_pre_reservas(config, barbeiro_id, grade):
+    """Aplica as pré-reservas ativas sobre a grade (sem consultar o banco)"""
+    return grade.com_ocupacoes(pre_reservas.intervalos(config.barbearia_id, barbeiro_id, grade.data))
+
+
+def horarios_disponiveis_dia(config, barbeiro_id, data, duracao_minutos=None):
+    """Horários livres (HH:MM) do barbeiro no dia para um serviço da duração informada"""
+    grade = _com_pre_reservas(config, barbeiro_id, montar_grade_dia(config, barbeiro_id, data))
+    return grade.horarios_livres(duracao_minutos, agora=datetime.utcnow())
+
+
+def horarios_disponiveis_periodo(config, barbeiro_id, de, ate, duracao_minutos=None):
+    """Horários livres por dia (YYYY-MM-DD -> [HH:MM]) em [de, ate]"""
+    if ate < de or (ate - de).days >= MAX_DIAS_PERIODO:
+        raise ValueError(f"Período deve ter entre 1 e {MAX_DIAS_PERIODO} dias")
+
+    agora = datetime.utcnow()
+    grades = montar_grades_periodo(config, barbeiro_id, de, ate)
+    return {
+        data.isoformat(): _com_pre_reservas(config, barbeiro_id, grade).horarios_livres(duracao_minutos, agora=agora)
+        for data, grade in grades.items()
+    }
+
+
+def _primeiro_encaixe(inicio_grade, intervalo, livre_de, livre_ate, duracao):
+    """Primeiro início alinhado à grade dentro de [livre_de, livre_ate) onde cabe `duracao`"""
+    atraso = (livre_de - inicio_grade).total_seconds() / 60
+    passos = max(0, -int(-atraso // intervalo))
+    candidato = inicio_grade + timedelta(minutes=passos * intervalo)
+    if candidato + duracao <= livre_ate:
+        return candidato
+    return None
+
+
+def proximo_horario_livre(config, barbeiro_ids, duracao_minutos=None, a_partir_de=None, dias=14):
+    """Primeiro horário livre (barbeiro_id, datetime) entre os barbeiros dentro de `dias` dias.
+
+    Carrega os agendamentos do horizonte inteiro uma vez e procura nos intervalos
+    entre eles, dia a dia. Retorna None se não houver vaga dentro do horizonte.
+    """
+    if not barbeiro_ids:
+        return None
+
+    dias = max(1, min(dias, MAX_DIAS_BUSCA))
+    intervalo = config.intervalo_agendamento
+    duracao = timedelta(minutes=duracao_minutos or intervalo)
+    agora = a_partir_de or datetime.utcnow()
+
+    primeiro_dia = agora.date()
+    inicio = intervalo_do_dia(primeiro_dia)[0]
+    ocupacoes = carregar_ocupacoes_por_barbeiro(barbeiro_ids, inicio, inicio + timedelta(days=dias))
+
+    # Pré-reservas ativas também ocupam o barbeiro (só consultas em memória)
+    for barbeiro_id in barbeiro_ids:
+        # Um conjunto: a pré-reserva que passa da meia-noite aparece nos dois dias
+        retidos = list({
+            intervalo
+            for deslocamento in range(dias)
+            for intervalo in pre_reservas.intervalos(config.barbearia_id, barbeiro_id, primeiro_dia + timedelta(days=deslocamento))
+        })
+        if retidos:
+            ocupacoes[barbeiro_id] = sorted(ocupacoes.get(barbeiro_id, []) + retidos)
+
+    # Cursor por barbeiro: as listas estão ordenadas e os dias são visitados em ordem
+    cursores = {barbeiro_id: 0 for barbeiro_id in barbeiro_ids}
+
+    for deslocamento in range(dias):
+        data = primeiro_dia + timedelta(days=deslocamento)
+        abertura = datetime.combine(data, config.horario_abertura)
+        fechamento = datetime.combine(data, config.horario_fechamento)
+        melhor = None
+
+        for barbeiro_id in barbeiro_ids:
+            lista = ocupacoes.get(barbeiro_id, [])
+            i = cursores[barbeiro_id]
+
+            # Ignorar agendamentos que terminam antes da abertura do dia
+            while i < len(lista) and lista[i][1] <= abertura:
+                i += 1
+            cursores[barbeiro_id] = i
+
+            livre_de = max(abertura, agora)
+            encaixe = None
+            while livre_de < fechamento:
+                proximo_ocupado = lista[i][0] if i < len(lista) and lista[i][0] < fechamento else fechamento
+                encaixe = _primeiro_encaixe(abertura, intervalo, livre_de, proximo_ocupado, duracao)
+                if encaixe or proximo_ocupado >= fechamento:
+                    break
+                livre_de = max(livre_de, lista[i][1])
+                i += 1
+
+            if encaixe and (melhor is None or encaixe < melhor[1]):
+                melhor = (barbeiro_id, encaixe)
+
+        if melhor:
+            return melhor
+
+    return None
+
+
+def horarios_disponiveis_todos(config, barbeiro_ids, data, duracao_minutos=None):
+    """Horários livres do dia com qualquer barbeiro: [(HH:MM, [barbeiro_id, ...]), ...].
+
+    Junta em memória a disponibilidade de todos os barbeiros, com no máximo uma
+    consulta de agendamentos para a barbearia no dia.
+    """
+    if not barbeiro_ids:
+        return []
+
+    agora = datetime.utcnow()
+    grades = montar_grades(config, barbeiro_ids, data, data)
+    livres = {
+        barbeiro_id: _com_pre_reservas(config, barbeiro_id, grade).inicios_livres(duracao_minutos, agora)
+        for (barbeiro_id, _), grade in grades.items()
+    }
+    grade_base = next(iter(grades.values()))
+
+    uniao = 0
+    for bitmap in livres.values():
+        uniao |= bitmap
+
+    horarios = []
+    while uniao:
+        bit = uniao & -uniao
+        disponiveis = [barbeiro_id for barbeiro_id, bitmap in livres.items() if bitmap & bit]
+        horarios.append((grade_base.horario_do_slot(bit.bit_length() - 1).strftime('%H:%M'), disponiveis))
+        uniao ^= bit
+    return horarios
@@ -0,0 +1,155 @@
+# eventos.py
+# Eventos de agenda em tempo real (Server-Sent Events) por barbearia.
+# Os eventos entram na sessão durante a transação e só são publicados depois
+# do commit; um rollback os descarta. A distribuição é em memória, então cada
+# processo só vê os eventos publicados por ele mesmo.
+import json
+import queue
+import threading
+from collections import deque
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import db
+from cache_http import NONCE_PROCESSO
+
+# Eventos guardados por barbearia para retomar a conexão via Last-Event-ID
+EVENTOS_RETIDOS = 200
+# Eventos pendentes por assinante antes de ele ser considerado atrasado
+FILA_ASSINANTE = 100
+# Intervalo do comentário de keep-alive enviado ao cliente
+INTERVALO_PING = 15
+
+
+class Assinatura:
+    def __init__(self, barbearia_id):
+        self.barbearia_id = barbearia_id
+        self.fila = queue.Queue(maxsize=FILA_ASSINANTE)
+        self.atrasada = False
+
+
+class CanalEventos:
+    """Pub/sub em memória: cada barbearia tem seus assinantes e um buffer de retomada"""
+
+    def __init__(self):
+        self._assinantes = {}
+        self._retidos = {}
+        self._descartados_ate = {}
+        self._sequencia = 0
+        self._lock = threading.Lock()
+
+    def publicar(self, barbearia_id, tipo, dados):
+        with self._lock:
+            self._sequencia += 1
+            evento = (self._sequencia, tipo, dados)
+            retidos = self._retidos.setdefault(barbearia_id, deque(maxlen=EVENTOS_RETIDOS))
+            if len(retidos) == EVENTOS_RETIDOS:
+                self._descartados_ate[barbearia_id] = retidos[0][0]
+            retidos.append(evento)
+            assinantes = list(self._assinantes.get(barbearia_id, ()))
+
+        for assinatura in assinantes:
+            try:
+                assinatura.fila.put_nowait(evento)
+            except queue.Full:
+                # O cliente não acompanha: a conexão é encerrada e ele recarrega
+                assinatura.atrasada = True
+
+    def assinar(self, barbearia_id, ultimo_id=None):
+        """(assinatura, pendentes, completo): `pendentes` são os eventos retidos depois
+        de `ultimo_id`; `completo` é False se não é possível garantir que nada se perdeu."""
+        assinatura = Assinatura(barbearia_id)
+        with self._lock:
+            self._assinantes.setdefault(barbearia_id, set()).add(assinatura)
+            if ultimo_id is None:
+                return assinatura, [], True
+
+            sequencia = _sequencia_do_id(ultimo_id)
+            if sequencia is None or sequencia > self._sequencia:
+                return assinatura, [], False
+
+            # Se o buffer já descartou eventos posteriores ao último visto, houve perda
+            completo = self._descartados_ate.get(barbearia_id, 0) <= sequencia
+            pendentes = [e for e in self._retidos.get(barbearia_id, ()) if e[0] > sequencia]
+            return assinatura, pendentes, completo
+
+    def cancelar(self, assinatura):
+        with self._lock:
+            assinantes = self._assinantes.get(assinatura.barbearia_id)
+            if assinantes:
+                assinantes.discard(assinatura)
+                if not assinantes:
+                    del self._assinantes[assinatura.barbearia_id]
+
+
+canal_eventos = CanalEventos()
+
+
+def _id_evento(sequencia):
+    return f"{NONCE_PROCESSO}-{sequencia}"
+
+
+def _sequencia_do_id(id_evento):
+    # IDs de outro processo (ex.: antes de um restart) não servem para retomar
+    nonce, _, sequencia = str(id_evento).rpartition('-')
+    if nonce != NONCE_PROCESSO or not sequencia.isdigit():
+        return None
+    return int(sequencia)
+
+
+def formatar_evento(tipo, dados, sequencia=None):
+    """Mensagem no formato text/event-stream"""
+    linhas = []
+    if sequencia is not None:
+        linhas.append(f"id: {_id_evento(sequencia)}")
+    linhas.append(f"event: {tipo}")
+    linhas.append(f"data: {json.dumps(dados)}")
+    return '\n'.join(linhas) + '\n\n'
+
+
+def fluxo_eventos(barbearia_id, ultimo_id=None):
+    """Gerador do stream SSE da barbearia (não usa banco nem contexto da requisição)"""
+    assinatura, pendentes, completo = canal_eventos.assinar(barbearia_id, ultimo_id)
+    try:
+        yield "retry: 3000\n\n"
+        if not completo:
+            # Eventos perdidos: o cliente precisa buscar o estado completo de novo
+            yield formatar_evento('recarregar', {})
+        for sequencia, tipo, dados in pendentes:
+            yield formatar_evento(tipo, dados, sequencia)
+
+        while not assinatura.atrasada:
+            try:
+                sequencia, tipo, dados = assinatura.fila.get(timeout=INTERVALO_PING)
+            except queue.Empty:
+                yield ": ping\n\n"
+                continue
+            yield formatar_evento(tipo, dados, sequencia)
+
+        yield formatar_evento('recarregar', {})
+    finally:
+        canal_eventos.cancelar(assinatura)
+
+
+def notificar(barbearia_id, tipo, dados):
+    """Agenda a publicação do evento para depois do commit da sessão atual"""
+    db.session.info.setdefault('eventos_pendentes', []).append((int(barbearia_id), tipo, dados))
+
+
+def notificar_agendamento(tipo, agendamento_id, barbearia_id, barbeiro_id, horario, status):
+    notificar(barbearia_id, tipo, {
+        "id": agendamento_id,
+        "barbeiro_id": barbeiro_id,
+        "horario": horario.isoformat(),
+        "status": status
+    })
+
+
+@event.listens_for(Session, 'after_commit')
+def _publicar_eventos_pendentes(sessao):
+    for barbearia_id, tipo, dados in sessao.info.pop('eventos_pendentes', ()):
+        canal_eventos.publicar(barbearia_id, tipo, dados)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_eventos_pendentes(sessao):
+    sessao.info.pop('eventos_pendentes', None)
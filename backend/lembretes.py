@@ -0,0 +1,138 @@
+# lembretes.py
+# Lembretes de 24h e 1h antes do atendimento (flags lembrete_24h / lembrete_1h da
+# ConfiguracaoBarbearia). A cada rodada só é lida a faixa de horários que entrou
+# na janela desde a rodada anterior (ix_agendamento_horario), então o custo é
+# proporcional aos lembretes devidos, não ao total de agendamentos futuros.
+# Cada agendamento é marcado (lembrete_*_em) com UPDATE condicional na mesma
+# transação que grava a notificação no outbox: restart ou vários processos
+# nunca enviam o mesmo lembrete duas vezes. O envio em si fica com o
+# ProcessadorNotificacoes (pool de workers).
+import logging
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from models import db, Agendamento, ConfiguracaoBarbearia
+from notificacoes import enfileirar_lote
+
+logger = logging.getLogger(__name__)
+
+INTERVALO_RODADA = 60
+# Máximo de agendamentos marcados por UPDATE
+LOTE = 500
+
+TipoLembrete = namedtuple('TipoLembrete', 'horas_antes flag marca')
+
+TIPOS_LEMBRETE = (
+    TipoLembrete(24, ConfiguracaoBarbearia.lembrete_24h, Agendamento.lembrete_24h_em),
+    TipoLembrete(1, ConfiguracaoBarbearia.lembrete_1h, Agendamento.lembrete_1h_em),
+)
+
+
+def _devidos(tipo, de, ate):
+    """Agendamentos confirmados, sem lembrete, com horário em (de, ate] e flag ligada"""
+    antecedencia = timedelta(hours=tipo.horas_antes)
+    linhas = db.session.query(
+        Agendamento.id, Agendamento.barbearia_id, Agendamento.horario, Agendamento.data_criacao
+    ).join(
+        ConfiguracaoBarbearia, ConfiguracaoBarbearia.barbearia_id == Agendamento.barbearia_id
+    ).filter(
+        Agendamento.horario > de,
+        Agendamento.horario <= ate,
+        Agendamento.status == 'confirmado',
+        tipo.marca.is_(None),
+        tipo.flag.is_(True),
+        ConfiguracaoBarbearia.whatsapp_ativo.is_(True)
+    ).all()
+
+    # Quem agendou já dentro da janela não recebe este lembrete
+    return [
+        (ag_id, barbearia_id) for ag_id, barbearia_id, horario, criado_em in linhas
+        if not criado_em or criado_em <= horario - antecedencia
+    ]
+
+
+def _marcar_e_enfileirar(tipo, devidos, agora):
+    """Marca os agendamentos e grava os lembretes no outbox; retorna quantos entraram"""
+    barbearia_de = dict(devidos)
+    ids = list(barbearia_de)
+    total = 0
+    for inicio in range(0, len(ids), LOTE):
+        # Só ficam os que ninguém marcou antes (outro processo, rodada anterior)
+        marcados = db.session.scalars(
+            update(Agendamento).where(
+                Agendamento.id.in_(ids[inicio:inicio + LOTE]), tipo.marca.is_(None)
+            ).values({tipo.marca: agora}).returning(Agendamento.id).execution_options(synchronize_session=False)
+        ).all()
+        if not marcados:
+            continue
+
+        enfileirar_lote(
+            'lembrete_agendamento',
+            [(barbearia_de[ag_id], ag_id) for ag_id in marcados],
+            horas_antes=tipo.horas_antes
+        )
+        total += len(marcados)
+
+    db.session.commit()
+    return total
+
+
+class AgendadorLembretes:
+    """Thread que, a cada INTERVALO_RODADA, põe no outbox os lembretes que venceram.
+
+    Guarda em memória até onde cada tipo já foi varrido. Ao iniciar, recupera
+    um quarto da antecedência para trás (ex.: lembretes de 24h atrasados em
+    até 6h por um restart ainda saem); as marcas evitam duplicatas.
+    """
+
+    def __init__(self):
+        self._app = None
+        self._thread = None
+        self._parar = threading.Event()
+        self._varrido_ate = {}
+
+    def iniciar(self, app):
+        if self._thread:
+            return
+        self._app = app
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._laco, name='lembretes', daemon=True)
+        self._thread.start()
+        logger.info("⏰ Agendador de lembretes iniciado")
+
+    def parar(self):
+        if not self._thread:
+            return
+        self._parar.set()
+        self._thread.join()
+        self._thread = None
+
+    def rodada(self, agora=None):
+        """Uma varredura de todos os tipos; retorna {horas_antes: lembretes enfileirados}"""
+        agora = agora or datetime.utcnow()
+        resultado = {}
+        for tipo in TIPOS_LEMBRETE:
+            antecedencia = timedelta(hours=tipo.horas_antes)
+            ate = agora + antecedencia
+            de = self._varrido_ate.get(tipo.horas_antes, ate - antecedencia / 4)
+            if ate <= de:
+                continue
+            try:
+                resultado[tipo.horas_antes] = _marcar_e_enfileirar(tipo, _devidos(tipo, de, ate), agora)
+                self._varrido_ate[tipo.horas_antes] = ate
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Erro ao agendar lembretes de {tipo.horas_antes}h: {str(e)}")
+        return resultado
+
+    def _laco(self):
+        while not self._parar.is_set():
+            with self._app.app_context():
+                enfileirados = self.rodada()
+            if any(enfileirados.values()):
+                logger.info(f"⏰ Lembretes enfileirados: {enfileirados}")
+            self._parar.wait(INTERVALO_RODADA)
+
+
+agendador_lembretes = AgendadorLembretes()
@@ -0,0 +1,99 @@
+# listagens.py
+# Listagem paginada de agendamentos: uma única consulta com as colunas exibidas
+# (já com os nomes de cliente, serviço e barbeiro) e cursor em (horario, id).
+from collections import namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_
+from models import db, Agendamento, Barbeiro, Cliente, Servico
+from utils import codificar_cursor, decodificar_cursor
+
+POR_PAGINA_PADRAO = 50
+POR_PAGINA_MAXIMO = 200
+
+LinhaAgendamento = namedtuple('LinhaAgendamento', [
+    'id', 'horario', 'status', 'observacoes', 'barbeiro_id',
+    'cliente', 'telefone', 'email', 'servico', 'barbeiro'
+])
+
+
+class ParametroInvalido(ValueError):
+    pass
+
+
+def _data(valor, nome):
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d')
+    except ValueError:
+        raise ParametroInvalido(f"Formato de data inválido em '{nome}'. Use YYYY-MM-DD")
+
+
+def pagina_agendamentos(barbearia_id, args, paginar=True):
+    """(linhas, proximo_cursor) dos agendamentos da barbearia em ordem de horário.
+
+    Aceita em `args` (query string): `data` ou `de`/`ate` (YYYY-MM-DD, inclusivos),
+    `status`, `barbeiro_id`, `limite` e o `cursor` da página anterior.
+    Com `paginar=False` devolve todas as linhas do filtro (proximo_cursor None).
+    Levanta ParametroInvalido se algum valor não for válido.
+    """
+    limite = None
+    if paginar:
+        try:
+            limite = int(args.get('limite', POR_PAGINA_PADRAO))
+        except ValueError:
+            raise ParametroInvalido("Limite inválido")
+        if not 1 <= limite <= POR_PAGINA_MAXIMO:
+            raise ParametroInvalido(f"O limite deve estar entre 1 e {POR_PAGINA_MAXIMO}")
+
+    query = db.session.query(
+        Agendamento.id, Agendamento.horario, Agendamento.status, Agendamento.observacoes,
+        Agendamento.barbeiro_id, Cliente.nome, Cliente.telefone, Cliente.email,
+        Servico.nome, Barbeiro.nome
+    ).join(
+        Cliente, Agendamento.cliente_id == Cliente.id
+    ).join(
+        Servico, Agendamento.servico_id == Servico.id
+    ).join(
+        Barbeiro, Agendamento.barbeiro_id == Barbeiro.id
+    ).filter(Agendamento.barbearia_id == barbearia_id)
+
+    if args.get('data'):
+        de = ate = _data(args['data'], 'data')
+    else:
+        de = _data(args['de'], 'de') if args.get('de') else None
+        ate = _data(args['ate'], 'ate') if args.get('ate') else None
+    if de:
+        query = query.filter(Agendamento.horario >= de)
+    if ate:
+        query = query.filter(Agendamento.horario < ate + timedelta(days=1))
+
+    if args.get('status'):
+        query = query.filter(Agendamento.status == args['status'])
+
+    if args.get('barbeiro_id'):
+        try:
+            query = query.filter(Agendamento.barbeiro_id == int(args['barbeiro_id']))
+        except ValueError:
+            raise ParametroInvalido("Barbeiro inválido")
+
+    if args.get('cursor'):
+        valores = decodificar_cursor(args['cursor'], 2)
+        try:
+            horario, ultimo_id = datetime.fromisoformat(valores[0]), int(valores[1])
+        except (TypeError, ValueError):
+            raise ParametroInvalido("Cursor inválido")
+        query = query.filter(or_(
+            Agendamento.horario > horario,
+            and_(Agendamento.horario == horario, Agendamento.id > ultimo_id)
+        ))
+
+    query = query.order_by(Agendamento.horario, Agendamento.id)
+    if limite is None:
+        return [LinhaAgendamento(*linha) for linha in query.all()], None
+
+    # Uma linha a mais só para saber se existe próxima página
+    linhas = [LinhaAgendamento(*linha) for linha in query.limit(limite + 1).all()]
+    proximo_cursor = None
+    if len(linhas) > limite:
+        linhas = linhas[:limite]
+        proximo_cursor = codificar_cursor(linhas[-1].horario, linhas[-1].id)
+    return linhas, proximo_cursor
@@ -1,18 +1,42 @@
 # routes.py
 from flask import Blueprint, request, jsonify, g
-from models import db, BarbeariaCliente, Agendamento, Barbeiro, Servico, Cliente, ConfiguracaoBarbearia
+from models import db, Agendamento, Cliente, ConfiguracaoBarbearia
+from disponibilidade import horarios_disponiveis_dia, horarios_disponiveis_todos, buscar_conflito, invalidar_disponibilidade
+from utils import converter_horario
+from reservas import executar_reserva, reservar_horario, HorarioIndisponivel
+from pre_reservas import pre_reservas
+from uso_mensal import consumir_agendamentos, devolver_agendamento, inicio_do_mes
+from eventos import notificar_agendamento
+from notificacoes import enfileirar
+from listagens import pagina_agendamentos, ParametroInvalido
+from resumos import registrar_agendamentos, registrar_cliente_novo, registrar_mudanca_status, resumo_periodo
+from contexto_barbearia import (
+    obter_barbearia, obter_contexto, obter_contexto_por_dominio, barbearia_em_memoria,
+    versao_barbearia, modificacao_barbearia
+)
+from cache_http import etag_versao, nao_modificado, com_cache
+from autenticacao import principal_atual
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime, timedelta
 import json
 
 routes = Blueprint('routes', __name__)
 
 def verificar_barbearia():
-    """Middleware para verificar se a barbearia existe e está ativa"""
-    barbearia_id = request.headers.get('X-Barbearia-ID')
-    if not barbearia_id:
+    """Middleware para verificar o token da barbearia e se ela existe e está ativa"""
+    principal = principal_atual()
+    if not principal:
+        return None
+
+    # Token de barbearia vale só para ela; admin escolhe a barbearia pelo cabeçalho
+    if principal.tipo == 'barbearia':
+        barbearia_id = principal.barbearia_id
+    elif principal.tipo == 'admin':
+        barbearia_id = request.headers.get('X-Barbearia-ID')
+    else:
         return None
     
-    barbearia = BarbeariaCliente.query.get(barbearia_id)
+    barbearia = obter_barbearia(barbearia_id)
     if not barbearia or not barbearia.ativo:
         return None
     
@@ -24,19 +48,36 @@ def verificar_barbearia():
 def info_barbearia(dominio):
     """Informações públicas da barbearia para agendamento"""
     try:
-        barbearia = BarbeariaCliente.query.filter_by(dominio=dominio, ativo=True).first()
-        if not barbearia:
+        # Revalidação só com a memória: 304 sem carregar o contexto do banco
+        barbearia = barbearia_em_memoria(dominio)
+        if barbearia and barbearia.ativo and not barbearia.expirada:
+            etag = etag_versao('barbearia', barbearia.id, versao_barbearia(barbearia.id))
+            resposta = nao_modificado(etag, modificacao_barbearia(barbearia.id))
+            if resposta:
+                return resposta
+
+        contexto = obter_contexto_por_dominio(dominio)
+        if not contexto or not contexto.barbearia.ativo:
             return jsonify({"erro": "Barbearia não encontrada"}), 404
 
+        barbearia = contexto.barbearia
+
         # Verificar se a assinatura está ativa
-        if barbearia.data_expiracao and barbearia.data_expiracao < datetime.utcnow():
+        if barbearia.expirada:
             return jsonify({"erro": "Barbearia inativa"}), 400
 
-        barbeiros = Barbeiro.query.filter_by(barbearia_id=barbearia.id, ativo=True).all()
-        servicos = Servico.query.filter_by(barbearia_id=barbearia.id, ativo=True).all()
-        config = ConfiguracaoBarbearia.query.filter_by(barbearia_id=barbearia.id).first()
+        # Cliente com a versão atual: 304 sem montar nem serializar o JSON
+        etag = etag_versao('barbearia', barbearia.id, contexto.versao)
+        modificado_em = modificacao_barbearia(barbearia.id)
+        resposta = nao_modificado(etag, modificado_em)
+        if resposta:
+            return resposta
 
-        return jsonify({
+        barbeiros = contexto.barbeiros
+        servicos = contexto.servicos
+        config = contexto.configuracao
+
+        return com_cache(jsonify({
             "barbearia": {
                 "id": barbearia.id,
                 "nome": barbearia.nome,
@@ -67,7 +108,7 @@ def info_barbearia(dominio):
                 }
                 for s in servicos
             ]
-        }), 200
+        }), etag, modificado_em)
 
     except Exception as e:
         return jsonify({"erro": "Erro interno do servidor"}), 500
@@ -88,68 +129,92 @@ def criar_agendamento():
             return jsonify({"erro": "Dados incompletos"}), 400
 
         # Verificar barbearia
-        barbearia = BarbeariaCliente.query.get(barbearia_id)
-        if not barbearia or not barbearia.ativo:
+        contexto = obter_contexto(barbearia_id)
+        if not contexto or not contexto.barbearia.ativo:
             return jsonify({"erro": "Barbearia não encontrada"}), 404
 
         # Verificar se a assinatura está ativa
-        if barbearia.data_expiracao and barbearia.data_expiracao < datetime.utcnow():
+        if contexto.barbearia.expirada:
             return jsonify({"erro": "Barbearia inativa"}), 400
 
         # Verificar barbeiro e serviço
-        barbeiro = Barbeiro.query.filter_by(id=barbeiro_id, barbearia_id=barbearia_id).first()
-        servico = Servico.query.filter_by(id=servico_id, barbearia_id=barbearia_id).first()
+        barbeiro = contexto.barbeiro(barbeiro_id)
+        servico = contexto.servico(servico_id)
         
         if not barbeiro or not servico:
             return jsonify({"erro": "Barbeiro ou serviço inválido"}), 400
 
         # Converter horário
-        horario_dt = datetime.fromisoformat(horario.replace('Z', '+00:00'))
+        horario_dt = converter_horario(horario)
+        if not horario_dt:
+            return jsonify({"erro": "Formato de horário inválido"}), 400
 
-        # Verificar conflito de horário
-        conflito = Agendamento.query.filter_by(
-            barbearia_id=barbearia_id,
-            barbeiro_id=barbeiro_id,
-            horario=horario_dt
-        ).first()
+        fim = horario_dt + timedelta(minutes=servico.duracao_minutos)
+
+        # Verificar conflito de horário (qualquer sobreposição com a duração do serviço)
+        conflito = buscar_conflito(barbeiro_id, horario_dt, fim)
 
         if conflito:
             return jsonify({"erro": "Horário indisponível"}), 400
 
-        # Buscar ou criar cliente
-        cliente = Cliente.query.filter_by(
-            barbearia_id=barbearia_id,
-            telefone=cliente_telefone
-        ).first()
+        # Horário segurado por outro cliente que ainda está preenchendo os dados
+        token_pre_reserva = data.get('pre_reserva')
+        if pre_reservas.conflito(barbearia_id, barbeiro_id, horario_dt, fim, ignorar_token=token_pre_reserva):
+            return jsonify({"erro": "Horário reservado temporariamente"}), 400
+
+        def criar():
+            # Conta no uso do mês (este endpoint não bloqueia pelo limite do plano)
+            consumir_agendamentos(barbearia_id)
 
-        if not cliente:
-            cliente = Cliente(
+            # Buscar ou criar cliente
+            cliente = Cliente.query.filter_by(
                 barbearia_id=barbearia_id,
-                nome=cliente_nome,
                 telefone=cliente_telefone
+            ).first()
+
+            if not cliente:
+                cliente = Cliente(
+                    barbearia_id=barbearia_id,
+                    nome=cliente_nome,
+                    telefone=cliente_telefone
+                )
+                db.session.add(cliente)
+                db.session.flush()
+                registrar_cliente_novo(cliente)
+
+            # Criar agendamento
+            agendamento = Agendamento(
+                barbearia_id=barbearia_id,
+                cliente_id=cliente.id,
+                barbeiro_id=barbeiro_id,
+                servico_id=servico_id,
+                horario=horario_dt,
+                fim=fim,
+                status='confirmado'
             )
-            db.session.add(cliente)
+
+            db.session.add(agendamento)
             db.session.flush()
+            reservar_horario(agendamento)
+            registrar_agendamentos(barbearia_id, barbeiro_id, [horario_dt], servico.preco)
+            notificar_agendamento('agendamento_criado', agendamento.id, barbearia_id, agendamento.barbeiro_id, horario_dt, 'confirmado')
 
-        # Criar agendamento
-        agendamento = Agendamento(
-            barbearia_id=barbearia_id,
-            cliente_id=cliente.id,
-            barbeiro_id=barbeiro_id,
-            servico_id=servico_id,
-            horario=horario_dt,
-            status='confirmado'
-        )
-
-        db.session.add(agendamento)
-        db.session.commit()
+            # Confirmação por WhatsApp vai para o outbox, no mesmo commit do agendamento
+            config = contexto.configuracao
+            if config and config.whatsapp_ativo and config.confirmacao_automatica:
+                enfileirar(barbearia_id, 'confirmacao_agendamento', agendamento.id)
+            return agendamento
 
-        # Enviar confirmação por WhatsApp (se configurado)
         try:
-            from whatsapp_service import whatsapp_service
-            whatsapp_service.enviar_confirmacao_agendamento(agendamento)
-        except Exception as e:
-            print(f"Erro ao enviar WhatsApp: {e}")
+            agendamento = executar_reserva(criar)
+        except HorarioIndisponivel:
+            return jsonify({"erro": "Horário indisponível"}), 400
+
+        # A pré-reserva virou agendamento (só se for deste mesmo horário)
+        pre = pre_reservas.obter(token_pre_reserva) if token_pre_reserva else None
+        if pre and (pre.barbearia_id, pre.barbeiro_id, pre.inicio, pre.fim) == (int(barbearia_id), barbeiro.id, horario_dt, fim):
+            pre_reservas.liberar(pre.token)
+        invalidar_disponibilidade(barbearia_id, agendamento.barbeiro_id, agendamento.horario.date())
 
         return jsonify({
             "msg": "Agendamento criado com sucesso",
@@ -167,39 +232,53 @@ def horarios_disponiveis(dominio):
     try:
         data_str = request.args.get('data')
         barbeiro_id = request.args.get('barbeiro_id')
+        servico_id = request.args.get('servico_id')
         
         if not data_str:
             return jsonify({"erro": "Data é obrigatória"}), 400
 
         data = datetime.strptime(data_str, '%Y-%m-%d').date()
         
-        barbearia = BarbeariaCliente.query.filter_by(dominio=dominio, ativo=True).first()
-        if not barbearia:
+        contexto = obter_contexto_por_dominio(dominio)
+        if not contexto or not contexto.barbearia.ativo:
             return jsonify({"erro": "Barbearia não encontrada"}), 404
 
-        config = ConfiguracaoBarbearia.query.filter_by(barbearia_id=barbearia.id).first()
+        config = contexto.configuracao
         if not config:
             return jsonify({"erro": "Configuração não encontrada"}), 404
 
-        # Gerar horários do dia
-        horarios = []
-        hora_atual = datetime.combine(data, config.horario_abertura)
-        fechamento = datetime.combine(data, config.horario_fechamento)
+        # Duração do serviço (opcional, padrão = um intervalo)
+        duracao = None
+        if servico_id:
+            servico = contexto.servico(servico_id)
+            if not servico:
+                return jsonify({"erro": "Serviço inválido"}), 400
+            duracao = servico.duracao_minutos
 
-        while hora_atual < fechamento:
-            # Verificar se horário está disponível
-            conflito = Agendamento.query.filter_by(
-                barbearia_id=barbearia.id,
-                barbeiro_id=barbeiro_id,
-                horario=hora_atual
-            ).first()
+        if barbeiro_id:
+            # Só barbeiros ativos da barbearia (antes de montar ou guardar qualquer grade)
+            barbeiro = contexto.barbeiro(barbeiro_id)
+            if not barbeiro:
+                return jsonify({"erro": "Barbeiro inválido"}), 400
 
-            if not conflito and hora_atual > datetime.utcnow():
-                horarios.append(hora_atual.strftime('%H:%M'))
+            # Gerar horários do dia
+            horarios = horarios_disponiveis_dia(config, barbeiro.id, data, duracao)
+            return jsonify({"horarios": horarios}), 200
 
-            hora_atual += timedelta(minutes=config.intervalo_agendamento)
+        # Qualquer barbeiro: junta a agenda de todos os barbeiros ativos
+        barbeiros = {b.id: b.nome for b in contexto.barbeiros}
+        disponiveis = horarios_disponiveis_todos(config, list(barbeiros), data, duracao)
 
-        return jsonify({"horarios": horarios}), 200
+        return jsonify({
+            "horarios": [horario for horario, _ in disponiveis],
+            "disponibilidade": [
+                {
+                    "horario": horario,
+                    "barbeiros": [{"id": b_id, "nome": barbeiros[b_id]} for b_id in barbeiro_ids]
+                }
+                for horario, barbeiro_ids in disponiveis
+            ]
+        }), 200
 
     except Exception as e:
         return jsonify({"erro": f"Erro interno: {str(e)}"}), 500
@@ -215,36 +294,17 @@ def dashboard_estatisticas(barbearia_id):
 
     try:
         hoje = datetime.utcnow().date()
-        inicio_mes = hoje.replace(day=1)
-        
-        # Agendamentos do dia
-        agendamentos_hoje = Agendamento.query.filter(
-            Agendamento.barbearia_id == barbearia_id,
-            db.func.date(Agendamento.horario) == hoje
-        ).count()
-
-        # Faturamento do mês
-        faturamento_mes = db.session.query(db.func.sum(Servico.preco)).join(
-            Agendamento, Agendamento.servico_id == Servico.id
-        ).filter(
-            Agendamento.barbearia_id == barbearia_id,
-            Agendamento.horario >= inicio_mes,
-            Agendamento.status == 'confirmado'
-        ).scalar() or 0
-
-        # Clientes novos este mês
-        clientes_novos = Cliente.query.filter(
-            Cliente.barbearia_id == barbearia_id,
-            Cliente.data_cadastro >= inicio_mes
-        ).count()
+        contexto = obter_contexto(barbearia_id)
+
+        # Totais dos resumos diários: o dia de hoje e o mês desde o dia 1
+        resumo_hoje = resumo_periodo(barbearia_id, hoje, hoje)
+        resumo_mes = resumo_periodo(barbearia_id, hoje.replace(day=1))
 
         return jsonify({
-            "agendamentos_hoje": agendamentos_hoje,
-            "faturamento_mes": float(faturamento_mes),
-            "clientes_novos": clientes_novos,
-            "barbeiros_ativos": Barbeiro.query.filter_by(
-                barbearia_id=barbearia_id, ativo=True
-            ).count()
+            "agendamentos_hoje": resumo_hoje["agendamentos"],
+            "faturamento_mes": resumo_mes["faturamento"],
+            "clientes_novos": resumo_mes["clientes_novos"],
+            "barbeiros_ativos": len(contexto.barbeiros) if contexto else 0
         }), 200
 
     except Exception as e:
@@ -252,34 +312,31 @@ def dashboard_estatisticas(barbearia_id):
 
 @routes.route('/api/barbearias/<int:barbearia_id>/agendamentos', methods=['GET'])
 def listar_agendamentos(barbearia_id):
-    """Listar agendamentos da barbearia"""
+    """Listar agendamentos da barbearia (paginado por cursor; ver listagens.pagina_agendamentos)"""
     barbearia = verificar_barbearia()
     if not barbearia or barbearia.id != barbearia_id:
         return jsonify({"erro": "Não autorizado"}), 401
 
     try:
-        data = request.args.get('data')
-        query = Agendamento.query.filter_by(barbearia_id=barbearia_id)
-        
-        if data:
-            data_obj = datetime.strptime(data, '%Y-%m-%d').date()
-            query = query.filter(db.func.date(Agendamento.horario) == data_obj)
-
-        agendamentos = query.order_by(Agendamento.horario.asc()).all()
+        try:
+            linhas, proximo_cursor = pagina_agendamentos(barbearia_id, request.args)
+        except ParametroInvalido as e:
+            return jsonify({"erro": str(e)}), 400
 
         return jsonify({
             "agendamentos": [
                 {
                     "id": a.id,
-                    "cliente": a.cliente_info.nome,
-                    "barbeiro": a.barbeiro_info.nome,
-                    "servico": a.servico_info.nome,
+                    "cliente": a.cliente,
+                    "barbeiro": a.barbeiro,
+                    "servico": a.servico,
                     "horario": a.horario.isoformat(),
                     "status": a.status,
-                    "telefone": a.cliente_info.telefone
+                    "telefone": a.telefone
                 }
-                for a in agendamentos
-            ]
+                for a in linhas
+            ],
+            "proximo_cursor": proximo_cursor
         }), 200
 
     except Exception as e:
@@ -302,12 +359,73 @@ def atualizar_agendamento(barbearia_id, agendamento_id):
             return jsonify({"erro": "Agendamento não encontrado"}), 404
 
         if 'status' in data:
-            agendamento.status = data['status']
+            novo_status = data['status']
+            if novo_status == 'confirmado' and agendamento.status != 'confirmado':
+                # Reativar um agendamento não pode sobrepor outro já confirmado
+                if buscar_conflito(agendamento.barbeiro_id, agendamento.horario, agendamento.fim, ignorar_id=agendamento.id):
+                    return jsonify({"erro": "Horário indisponível"}), 400
+                reservar_horario(agendamento)
+
+            # Uso mensal conta os agendamentos não cancelados
+            if novo_status == 'cancelado' and agendamento.status != 'cancelado':
+                devolver_agendamento(agendamento)
+            elif novo_status != 'cancelado' and agendamento.status == 'cancelado':
+                consumir_agendamentos(barbearia_id, mes=inicio_do_mes(agendamento.data_criacao))
+            status_anterior = agendamento.status
+            agendamento.status = novo_status
+            registrar_mudanca_status(agendamento, status_anterior, agendamento.servico_info.preco)
+            if novo_status != status_anterior:
+                notificar_agendamento(
+                    'agendamento_cancelado' if novo_status == 'cancelado' else 'agendamento_atualizado',
+                    agendamento.id, barbearia_id, agendamento.barbeiro_id, agendamento.horario, novo_status
+                )
 
         db.session.commit()
+        invalidar_disponibilidade(barbearia_id, agendamento.barbeiro_id, agendamento.horario.date())
 
         return jsonify({"msg": "Agendamento atualizado"}), 200
 
+    except (HorarioIndisponivel, IntegrityError):
+        db.session.rollback()
+        return jsonify({"erro": "Horário indisponível"}), 400
     except Exception as e:
         db.session.rollback()
-        return jsonify({"erro": "Erro interno"}), 500
\ No newline at end of file
+        return jsonify({"erro": "Erro interno"}), 500
+
+
+@routes.route('/api/barbearias/<int:barbearia_id>/whatsapp', methods=['PUT'])
+def atualizar_whatsapp(barbearia_id):
+    """Número (phone_number_id) e token próprios da barbearia na WhatsApp Business API"""
+    barbearia = verificar_barbearia()
+    if not barbearia or barbearia.id != barbearia_id:
+        return jsonify({"erro": "Não autorizado"}), 401
+
+    try:
+        data = request.json or {}
+        config = ConfiguracaoBarbearia.query.filter_by(barbearia_id=barbearia_id).first()
+        if not config:
+            config = ConfiguracaoBarbearia(barbearia_id=barbearia_id)
+            db.session.add(config)
+
+        if 'whatsapp_numero' in data:
+            numero = str(data['whatsapp_numero'] or '').strip()
+            if numero and (not numero.isdigit() or len(numero) > 20):
+                return jsonify({"erro": "Número do WhatsApp inválido"}), 400
+            config.whatsapp_numero = numero or None
+        if 'whatsapp_token' in data:
+            config.whatsapp_token = (data['whatsapp_token'] or '').strip() or None
+        if 'whatsapp_ativo' in data:
+            config.whatsapp_ativo = bool(data['whatsapp_ativo'])
+
+        # O registro de clientes WhatsApp é invalidado no commit (whatsapp_service)
+        db.session.commit()
+
+        return jsonify({
+            "whatsapp_ativo": config.whatsapp_ativo,
+            "whatsapp_numero": config.whatsapp_numero,
+            "numero_proprio": bool(config.whatsapp_numero and config.whatsapp_token)
+        }), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"erro": "Erro interno"}), 500
@@ -0,0 +1,83 @@
+# migracoes.py
+# O projeto cria o schema com db.create_all(), que não altera tabelas existentes.
+# As migrações abaixo são idempotentes e rodam na inicialização, depois do create_all.
+import logging
+from datetime import timedelta
+from sqlalchemy import inspect, text
+from models import db, Agendamento, BarbeariaCliente, Servico
+from resumos import migrar_resumos
+
+logger = logging.getLogger(__name__)
+
+
+def _adicionar_coluna(modelo, nome_coluna):
+    """ALTER TABLE ... ADD COLUMN se a coluna ainda não existir. Retorna True se criou."""
+    tabela = modelo.__table__
+    existentes = {c['name'] for c in inspect(db.engine).get_columns(tabela.name)}
+    if nome_coluna in existentes:
+        return False
+
+    tipo = tabela.c[nome_coluna].type.compile(dialect=db.engine.dialect)
+    db.session.execute(text(f'ALTER TABLE {tabela.name} ADD COLUMN {nome_coluna} {tipo}'))
+    db.session.commit()
+    logger.info(f"🛠️ Coluna {tabela.name}.{nome_coluna} criada")
+    return True
+
+
+def _criar_indices(modelo):
+    """Cria os índices declarados no modelo que ainda não existem no banco"""
+    for indice in modelo.__table__.indexes:
+        indice.create(bind=db.engine, checkfirst=True)
+
+
+def migrar_fim_agendamento():
+    """Adiciona Agendamento.fim e preenche as linhas antigas a partir da duração do serviço"""
+    _adicionar_coluna(Agendamento, 'fim')
+
+    pendentes = db.session.query(
+        Agendamento.id, Agendamento.horario, Servico.duracao_minutos
+    ).join(
+        Servico, Agendamento.servico_id == Servico.id
+    ).filter(Agendamento.fim.is_(None)).all()
+
+    if pendentes:
+        db.session.bulk_update_mappings(Agendamento, [
+            {"id": ag_id, "fim": horario + timedelta(minutes=duracao)}
+            for ag_id, horario, duracao in pendentes
+        ])
+        db.session.commit()
+        logger.info(f"🛠️ {len(pendentes)} agendamentos com fim preenchido")
+
+
+def migrar_lembretes():
+    """Marcas de lembrete enviado em Agendamento"""
+    _adicionar_coluna(Agendamento, 'lembrete_24h_em')
+    _adicionar_coluna(Agendamento, 'lembrete_1h_em')
+
+
+def remover_reservas_horario():
+    """A tabela de blocos reservados (reserva_horario) deu lugar à verificação de
+    sobreposição em reservas.reservar_intervalos; ela ainda referencia barbeiros"""
+    if inspect(db.engine).has_table('reserva_horario'):
+        db.session.execute(text('DROP TABLE reserva_horario'))
+        db.session.commit()
+        logger.info("🛠️ Tabela reserva_horario removida")
+
+
+def migrar_indices():
+    _criar_indices(Agendamento)
+    _criar_indices(BarbeariaCliente)
+
+
+MIGRACOES = [
+    migrar_fim_agendamento,
+    migrar_lembretes,
+    migrar_indices,
+    remover_reservas_horario,
+    migrar_resumos,
+]
+
+
+def aplicar_migracoes():
+    for migracao in MIGRACOES:
+        migracao()
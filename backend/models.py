@@ -3,6 +3,7 @@ from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta
 import json
+from sqlalchemy import event, select
 from sqlalchemy.orm import validates
 
 db = SQLAlchemy()
@@ -21,11 +22,18 @@ class BarbeariaCliente(db.Model):
     
     # Relacionamentos
     barbeiros = db.relationship('Barbeiro', backref='barbearia', lazy=True)
+    servicos = db.relationship('Servico', backref='barbearia', lazy=True)
     agendamentos = db.relationship('Agendamento', backref='barbearia', lazy=True)
     clientes = db.relationship('Cliente', backref='barbearia', lazy=True)
     configuracao = db.relationship('ConfiguracaoBarbearia', backref='barbearia', uselist=False)
     pagamentos = db.relationship('Pagamento', backref='barbearia', lazy=True)
 
+    # Ordenações da listagem do admin (paginação por cursor com desempate pelo id)
+    __table_args__ = (
+        db.Index('ix_barbearia_cliente_data_criacao_id', 'data_criacao', 'id'),
+        db.Index('ix_barbearia_cliente_nome_id', 'nome', 'id'),
+    )
+
     def __repr__(self):
         return f'<Barbearia {self.nome} ({self.dominio})>'
     
@@ -159,9 +167,26 @@ class Agendamento(db.Model):
     barbeiro_id = db.Column(db.Integer, db.ForeignKey('barbeiro.id'), nullable=False) 
     servico_id = db.Column(db.Integer, db.ForeignKey('servico.id'), nullable=False)
     horario = db.Column(db.DateTime, nullable=False)
+    fim = db.Column(db.DateTime)  # horario + duração do serviço
     status = db.Column(db.String(20), nullable=False, default='confirmado')
     data_criacao = db.Column(db.DateTime, default=datetime.utcnow)
     observacoes = db.Column(db.Text)
+    # Quando cada lembrete entrou no outbox (marca contra envio duplicado)
+    lembrete_24h_em = db.Column(db.DateTime)
+    lembrete_1h_em = db.Column(db.DateTime)
+
+    __table_args__ = (
+        # Verificação de sobreposição: barbeiro + faixa [horario, fim)
+        db.Index('ix_agendamento_barbeiro_horario_fim', 'barbeiro_id', 'horario', 'fim'),
+        # Listagens e contagens do dia/período por barbearia
+        db.Index('ix_agendamento_barbearia_horario', 'barbearia_id', 'horario'),
+        # Agenda do barbeiro filtrada por status (igualdades antes da faixa de horário)
+        db.Index('ix_agendamento_barbeiro_status_horario', 'barbeiro_id', 'status', 'horario'),
+        # Contagens mensais por data de criação (limites do plano, estatísticas)
+        db.Index('ix_agendamento_barbearia_data_criacao', 'barbearia_id', 'data_criacao'),
+        # Janela de lembretes de todas as barbearias (lembretes.AgendadorLembretes)
+        db.Index('ix_agendamento_horario', 'horario'),
+    )
 
     def __repr__(self):
         return f'<Agendamento #{self.id} - {self.horario.strftime("%d/%m/%Y %H:%M")}>'
@@ -172,6 +197,104 @@ class Agendamento(db.Model):
             raise ValueError("Não é possível agendar para o passado")
         return horario
 
+@event.listens_for(Agendamento, 'before_insert')
+def preencher_fim_agendamento(mapper, connection, agendamento):
+    """Garante `fim` em agendamentos criados sem ele (ex.: scripts de carga)"""
+    if agendamento.fim is None and agendamento.horario is not None:
+        duracao = connection.execute(
+            select(Servico.duracao_minutos).where(Servico.id == agendamento.servico_id)
+        ).scalar()
+        agendamento.fim = agendamento.horario + timedelta(minutes=duracao or 30)
+
+class UsoMensal(db.Model):
+    """Agendamentos não cancelados de cada barbearia por mês de criação.
+
+    Atualizado na mesma transação de agendamentos e cancelamentos, então a
+    verificação do limite do plano é uma leitura de uma linha.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    barbearia_id = db.Column(db.Integer, db.ForeignKey('barbearia_cliente.id'), nullable=False)
+    mes = db.Column(db.Date, nullable=False)  # primeiro dia do mês
+    agendamentos = db.Column(db.Integer, nullable=False, default=0)
+    atualizado_em = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('barbearia_id', 'mes', name='uq_uso_mensal_barbearia_mes'),
+    )
+
+    def __repr__(self):
+        return f'<UsoMensal barbearia={self.barbearia_id} {self.mes:%m/%Y}: {self.agendamentos}>'
+
+class ResumoDiario(db.Model):
+    """Totais de um dia (data do atendimento) por barbearia, mantidos junto com
+    agendamentos e cancelamentos; reconstruídos por resumos.reconstruir_resumos."""
+    id = db.Column(db.Integer, primary_key=True)
+    barbearia_id = db.Column(db.Integer, db.ForeignKey('barbearia_cliente.id'), nullable=False)
+    data = db.Column(db.Date, nullable=False)
+    confirmados = db.Column(db.Integer, nullable=False, default=0)
+    cancelados = db.Column(db.Integer, nullable=False, default=0)
+    outros = db.Column(db.Integer, nullable=False, default=0)  # demais status (ex.: concluído)
+    faturamento = db.Column(db.Float, nullable=False, default=0.0)  # só confirmados
+    clientes_novos = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('barbearia_id', 'data', name='uq_resumo_diario_barbearia_data'),
+    )
+
+    def __repr__(self):
+        return f'<ResumoDiario barbearia={self.barbearia_id} {self.data}>'
+
+class ResumoDiarioBarbeiro(db.Model):
+    """Totais de um dia por barbeiro (mesma regra de ResumoDiario)"""
+    id = db.Column(db.Integer, primary_key=True)
+    barbearia_id = db.Column(db.Integer, db.ForeignKey('barbearia_cliente.id'), nullable=False)
+    barbeiro_id = db.Column(db.Integer, db.ForeignKey('barbeiro.id'), nullable=False)
+    data = db.Column(db.Date, nullable=False)
+    confirmados = db.Column(db.Integer, nullable=False, default=0)
+    cancelados = db.Column(db.Integer, nullable=False, default=0)
+    outros = db.Column(db.Integer, nullable=False, default=0)
+    faturamento = db.Column(db.Float, nullable=False, default=0.0)
+
+    __table_args__ = (
+        db.UniqueConstraint('barbeiro_id', 'data', name='uq_resumo_diario_barbeiro_data'),
+        db.Index('ix_resumo_diario_barbeiro_barbearia_data', 'barbearia_id', 'data'),
+    )
+
+    def __repr__(self):
+        return f'<ResumoDiarioBarbeiro barbeiro={self.barbeiro_id} {self.data}>'
+
+class TokenRevogado(db.Model):
+    """Tokens JWT revogados antes do `exp` (logout). Guardados só pelo hash."""
+    token_hash = db.Column(db.String(64), primary_key=True)
+    expira_em = db.Column(db.DateTime, nullable=False, index=True)
+    data_criacao = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<TokenRevogado {self.token_hash[:12]}>'
+
+class NotificacaoPendente(db.Model):
+    """Outbox de notificações (WhatsApp): gravada na mesma transação do agendamento
+    e enviada em segundo plano por notificacoes.ProcessadorNotificacoes."""
+    id = db.Column(db.Integer, primary_key=True)
+    barbearia_id = db.Column(db.Integer, db.ForeignKey('barbearia_cliente.id'), nullable=False)
+    agendamento_id = db.Column(db.Integer, db.ForeignKey('agendamento.id'))
+    tipo = db.Column(db.String(50), nullable=False)
+    dados = db.Column(db.Text)  # JSON com parâmetros extras do tipo
+    status = db.Column(db.String(20), nullable=False, default='pendente')  # pendente, processando, enviada, falha
+    tentativas = db.Column(db.Integer, nullable=False, default=0)
+    proxima_tentativa = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    bloqueada_ate = db.Column(db.DateTime)  # fim da posse por um worker (status processando)
+    ultimo_erro = db.Column(db.Text)
+    data_criacao = db.Column(db.DateTime, default=datetime.utcnow)
+    enviada_em = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_notificacao_pendente_status_proxima', 'status', 'proxima_tentativa'),
+    )
+
+    def __repr__(self):
+        return f'<NotificacaoPendente {self.tipo} #{self.id} ({self.status})>'
+
 class ConfiguracaoBarbearia(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     barbearia_id = db.Column(db.Integer, db.ForeignKey('barbearia_cliente.id'), nullable=False)
@@ -0,0 +1,316 @@
+# notificacoes.py
+# Outbox de notificações WhatsApp. As rotas só gravam NotificacaoPendente na
+# transação do agendamento; o ProcessadorNotificacoes drena a tabela em segundo
+# plano com um pool de threads, novas tentativas com backoff e dead-letter
+# (status 'falha') depois de MAX_TENTATIVAS.
+#
+#   python notificacoes.py --reprocessar-falhas [--barbearia 3]
+import argparse
+import json
+import logging
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import and_, event, insert, or_, update
+from sqlalchemy.orm import Session, joinedload
+from models import db, Agendamento, NotificacaoPendente
+
+logger = logging.getLogger(__name__)
+
+MAX_TENTATIVAS = 5
+# Espera antes da nova tentativa: dobra a cada falha, com jitter, até o máximo
+ESPERA_BASE_SEGUNDOS = 30
+ESPERA_MAXIMA_SEGUNDOS = 3600
+# Tempo que um worker tem para concluir o envio antes que outro possa assumir
+POSSE_SEGUNDOS = 120
+# Varredura da tabela quando ninguém acordou o processador
+INTERVALO_VARREDURA = 5
+
+
+class EnvioImpossivel(Exception):
+    """Falha permanente: a notificação vai direto para o dead-letter"""
+
+
+def enfileirar(barbearia_id, tipo, agendamento_id=None, **dados):
+    """Grava a notificação na transação atual; o envio acontece depois do commit"""
+    notificacao = NotificacaoPendente(
+        barbearia_id=barbearia_id,
+        agendamento_id=agendamento_id,
+        tipo=tipo,
+        dados=json.dumps(dados) if dados else None
+    )
+    db.session.add(notificacao)
+    db.session.info['notificacoes_novas'] = True
+    return notificacao
+
+
+def enfileirar_lote(tipo, itens, **dados):
+    """Grava de uma vez várias notificações do mesmo tipo: itens = [(barbearia_id, agendamento_id)]"""
+    if not itens:
+        return
+    agora = datetime.utcnow()
+    dados = json.dumps(dados) if dados else None
+    db.session.execute(insert(NotificacaoPendente), [
+        {
+            "barbearia_id": barbearia_id,
+            "agendamento_id": agendamento_id,
+            "tipo": tipo,
+            "dados": dados,
+            "status": 'pendente',
+            "tentativas": 0,
+            "proxima_tentativa": agora
+        }
+        for barbearia_id, agendamento_id in itens
+    ])
+    db.session.info['notificacoes_novas'] = True
+
+
+def _whatsapp(barbearia_id):
+    """Serviço do número da barbearia (ou da plataforma, se ela não tiver um)"""
+    from whatsapp_service import servico_whatsapp
+    servico = servico_whatsapp(barbearia_id)
+    if not servico.configurado:
+        raise EnvioImpossivel("WhatsApp Business não configurado")
+    return servico
+
+
+def _carregar_agendamento(notificacao):
+    agendamento = Agendamento.query.options(
+        joinedload(Agendamento.cliente_info),
+        joinedload(Agendamento.servico_info),
+        joinedload(Agendamento.barbeiro_info),
+        joinedload(Agendamento.barbearia)
+    ).filter_by(id=notificacao.agendamento_id).first()
+    if not agendamento:
+        raise EnvioImpossivel(f"Agendamento {notificacao.agendamento_id} não existe")
+    return agendamento
+
+
+def _enviar_confirmacao(notificacao):
+    agendamento = _carregar_agendamento(notificacao)
+    if agendamento.status == 'cancelado':
+        return False
+    if not _whatsapp(agendamento.barbearia_id).enviar_confirmacao_agendamento(agendamento):
+        raise RuntimeError("Mensagem de confirmação não aceita pela API")
+    return True
+
+
+def _enviar_cancelamento(notificacao):
+    agendamento = _carregar_agendamento(notificacao)
+    if not _whatsapp(agendamento.barbearia_id).enviar_cancelamento(agendamento):
+        raise RuntimeError("Mensagem de cancelamento não aceita pela API")
+    return True
+
+
+def _enviar_lembrete(notificacao):
+    agendamento = _carregar_agendamento(notificacao)
+    # Cancelado ou já começou enquanto a notificação esperava na fila
+    if agendamento.status != 'confirmado' or agendamento.horario <= datetime.utcnow():
+        return False
+    horas_antes = json.loads(notificacao.dados or '{}').get('horas_antes', 24)
+    if not _whatsapp(agendamento.barbearia_id).enviar_lembrete_agendamento(agendamento, horas_antes):
+        raise RuntimeError("Mensagem de lembrete não aceita pela API")
+    return True
+
+
+# Cada tipo devolve True (enviada) ou False (não há mais o que enviar); exceções
+# geram nova tentativa, exceto EnvioImpossivel
+TIPOS = {
+    'confirmacao_agendamento': _enviar_confirmacao,
+    'cancelamento_agendamento': _enviar_cancelamento,
+    'lembrete_agendamento': _enviar_lembrete,
+}
+
+
+def _espera(tentativas):
+    segundos = min(ESPERA_MAXIMA_SEGUNDOS, ESPERA_BASE_SEGUNDOS * 2 ** (tentativas - 1))
+    return timedelta(seconds=segundos * random.uniform(0.5, 1.0))
+
+
+def _disponivel(agora):
+    # Pendentes no horário, ou em processamento por um worker que perdeu a posse
+    return or_(
+        and_(NotificacaoPendente.status == 'pendente', NotificacaoPendente.proxima_tentativa <= agora),
+        and_(NotificacaoPendente.status == 'processando', NotificacaoPendente.bloqueada_ate < agora)
+    )
+
+
+def reservar_proxima():
+    """Toma posse da próxima notificação disponível (UPDATE condicional); id ou None"""
+    agora = datetime.utcnow()
+    candidatas = db.session.query(NotificacaoPendente.id).filter(
+        _disponivel(agora)
+    ).order_by(NotificacaoPendente.proxima_tentativa).limit(5).all()
+
+    for (notificacao_id,) in candidatas:
+        resultado = db.session.execute(
+            update(NotificacaoPendente).where(
+                NotificacaoPendente.id == notificacao_id, _disponivel(agora)
+            ).values(
+                status='processando',
+                bloqueada_ate=agora + timedelta(seconds=POSSE_SEGUNDOS),
+                tentativas=NotificacaoPendente.tentativas + 1
+            ).execution_options(synchronize_session=False)
+        )
+        if resultado.rowcount:
+            db.session.commit()
+            return notificacao_id
+
+    db.session.commit()
+    return None
+
+
+def processar_notificacao(notificacao_id):
+    """Envia uma notificação já reservada e registra o resultado"""
+    notificacao = db.session.get(NotificacaoPendente, notificacao_id)
+    if not notificacao or notificacao.status != 'processando':
+        return
+
+    tipo = notificacao.tipo
+    try:
+        enviar = TIPOS.get(tipo)
+        if not enviar:
+            raise EnvioImpossivel(f"Tipo de notificação desconhecido: {tipo}")
+        enviada = enviar(notificacao)
+        notificacao.status = 'enviada' if enviada else 'descartada'
+        notificacao.enviada_em = datetime.utcnow() if enviada else None
+        notificacao.ultimo_erro = None
+    except EnvioImpossivel as e:
+        notificacao.status = 'falha'
+        notificacao.ultimo_erro = str(e)
+        logger.error(f"Notificação {notificacao_id} ({tipo}) não pode ser enviada: {str(e)}")
+    except Exception as e:
+        db.session.rollback()
+        notificacao = db.session.get(NotificacaoPendente, notificacao_id)
+        notificacao.ultimo_erro = str(e)
+        if notificacao.tentativas >= MAX_TENTATIVAS:
+            notificacao.status = 'falha'
+            logger.error(f"Notificação {notificacao_id} ({tipo}) falhou {notificacao.tentativas} vezes: {str(e)}")
+        else:
+            notificacao.status = 'pendente'
+            notificacao.proxima_tentativa = datetime.utcnow() + _espera(notificacao.tentativas)
+
+    notificacao.bloqueada_ate = None
+    db.session.commit()
+
+
+class ProcessadorNotificacoes:
+    """Thread que reserva notificações e as entrega a um pool de `workers` threads.
+
+    Nunca há mais reservas em andamento do que workers livres; o commit de uma
+    nova notificação acorda o processador, então o envio começa logo em seguida.
+    """
+
+    def __init__(self):
+        self._app = None
+        self._thread = None
+        self._executor = None
+        self._vagas = None
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+
+    def iniciar(self, app, workers=4):
+        if self._thread:
+            return
+        self._app = app
+        self._vagas = threading.BoundedSemaphore(workers)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='notificacao')
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._laco, name='notificacoes', daemon=True)
+        self._thread.start()
+        logger.info(f"📨 Processador de notificações iniciado com {workers} workers")
+
+    def parar(self):
+        if not self._thread:
+            return
+        self._parar.set()
+        self._acordar.set()
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+        self._thread = None
+
+    def acordar(self):
+        self._acordar.set()
+
+    def _laco(self):
+        while not self._parar.is_set():
+            if not self._vagas.acquire(timeout=INTERVALO_VARREDURA):
+                continue
+
+            notificacao_id = None
+            try:
+                with self._app.app_context():
+                    notificacao_id = reservar_proxima()
+            except Exception as e:
+                logger.error(f"Erro ao reservar notificação: {str(e)}")
+
+            if notificacao_id is None:
+                self._vagas.release()
+                self._acordar.wait(INTERVALO_VARREDURA)
+                self._acordar.clear()
+                continue
+
+            self._executor.submit(self._processar, notificacao_id)
+
+    def _processar(self, notificacao_id):
+        try:
+            with self._app.app_context():
+                processar_notificacao(notificacao_id)
+        except Exception as e:
+            logger.error(f"Erro ao processar notificação {notificacao_id}: {str(e)}")
+        finally:
+            self._vagas.release()
+
+
+processador_notificacoes = ProcessadorNotificacoes()
+
+
+@event.listens_for(Session, 'after_commit')
+def _acordar_processador(sessao):
+    if sessao.info.pop('notificacoes_novas', False):
+        processador_notificacoes.acordar()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_notificacoes_novas(sessao):
+    sessao.info.pop('notificacoes_novas', None)
+
+
+def reprocessar_falhas(barbearia_id=None):
+    """Devolve as notificações do dead-letter para a fila; retorna quantas"""
+    query = NotificacaoPendente.query.filter_by(status='falha')
+    if barbearia_id is not None:
+        query = query.filter_by(barbearia_id=barbearia_id)
+    total = query.update({
+        NotificacaoPendente.status: 'pendente',
+        NotificacaoPendente.tentativas: 0,
+        NotificacaoPendente.proxima_tentativa: datetime.utcnow(),
+        NotificacaoPendente.ultimo_erro: None
+    }, synchronize_session=False)
+    db.session.commit()
+    return total
+
+
+if __name__ == '__main__':
+    from flask import Flask
+    from config import Config
+
+    parser = argparse.ArgumentParser(description="Manutenção do outbox de notificações")
+    parser.add_argument('--reprocessar-falhas', action='store_true', help="Devolve as falhas para a fila")
+    parser.add_argument('--barbearia', type=int, help="Só esta barbearia")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    db.init_app(app)
+
+    with app.app_context():
+        if args.reprocessar_falhas:
+            print(f"{reprocessar_falhas(args.barbearia)} notificação(ões) devolvida(s) para a fila")
+        else:
+            for status, total in db.session.query(
+                NotificacaoPendente.status, db.func.count(NotificacaoPendente.id)
+            ).group_by(NotificacaoPendente.status).all():
+                print(f"{status}: {total}")
@@ -0,0 +1,136 @@
+# pre_reservas.py
+import heapq
+import secrets
+import threading
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+# Tempo que o cliente tem para preencher os dados depois de escolher o horário
+PRE_RESERVA_TTL_SEGUNDOS = 5 * 60
+
+PreReserva = namedtuple('PreReserva', 'token barbearia_id barbeiro_id inicio fim expira_em dono')
+
+
+def _dias(inicio, fim):
+    """Datas que o intervalo [inicio, fim) toca (fim à meia-noite não conta o dia seguinte)"""
+    data, ultimo = inicio.date(), max(inicio, fim - timedelta(microseconds=1)).date()
+    while data <= ultimo:
+        yield data
+        data += timedelta(days=1)
+
+
+class PreReservas:
+    """Pré-reservas temporárias de horário, em memória e com expiração preguiçosa.
+
+    Indexadas por (barbearia_id, barbeiro_id, data) em cada dia que tocam (uma
+    pré-reserva que passa da meia-noite aparece nos dois), então a consulta de
+    disponibilidade só olha as pré-reservas do barbeiro naquele dia. Itens
+    vencidos saem quando são consultados ou quando o heap de expiração é
+    varrido em uma nova pré-reserva; não há thread de limpeza.
+
+    Cada `dono` (quem pediu, ex.: o IP) tem no máximo uma pré-reserva ativa por
+    barbearia: uma nova substitui a anterior, então ninguém segura a agenda inteira.
+    """
+
+    def __init__(self, ttl=PRE_RESERVA_TTL_SEGUNDOS):
+        self.ttl = ttl
+        self._por_token = {}
+        self._por_dia = {}
+        self._por_dono = {}
+        self._expiracoes = []
+        self._lock = threading.Lock()
+
+    def _remover(self, token):
+        pre = self._por_token.pop(token, None)
+        if pre:
+            for data in _dias(pre.inicio, pre.fim):
+                chave = (pre.barbearia_id, pre.barbeiro_id, data)
+                tokens = self._por_dia.get(chave)
+                if tokens:
+                    tokens.discard(token)
+                    if not tokens:
+                        del self._por_dia[chave]
+            if self._por_dono.get((pre.barbearia_id, pre.dono)) == token:
+                del self._por_dono[(pre.barbearia_id, pre.dono)]
+        return pre
+
+    def _varrer_expiradas(self, agora):
+        while self._expiracoes and self._expiracoes[0][0] <= agora:
+            _, token = heapq.heappop(self._expiracoes)
+            pre = self._por_token.get(token)
+            if pre and pre.expira_em <= agora:
+                self._remover(token)
+
+    def _ativas_do_dia(self, barbearia_id, barbeiro_id, data, agora):
+        tokens = self._por_dia.get((barbearia_id, barbeiro_id, data), ())
+        ativas = []
+        for token in list(tokens):
+            pre = self._por_token[token]
+            if pre.expira_em <= agora:
+                self._remover(token)
+            else:
+                ativas.append(pre)
+        return ativas
+
+    def criar(self, barbearia_id, barbeiro_id, inicio, fim, dono=None):
+        """Cria uma pré-reserva (substituindo a anterior do `dono` na barbearia);
+        retorna None se o intervalo já estiver pré-reservado por outro"""
+        barbearia_id, barbeiro_id = int(barbearia_id), int(barbeiro_id)
+        agora = time.monotonic()
+        with self._lock:
+            self._varrer_expiradas(agora)
+            # A pré-reserva atual do mesmo dono não bloqueia a que vai substituí-la
+            anterior = self._por_dono.get((barbearia_id, dono)) if dono is not None else None
+            for data in _dias(inicio, fim):
+                for pre in self._ativas_do_dia(barbearia_id, barbeiro_id, data, agora):
+                    if pre.token != anterior and pre.inicio < fim and pre.fim > inicio:
+                        return None
+
+            if anterior:
+                self._remover(anterior)
+            pre = PreReserva(secrets.token_urlsafe(16), barbearia_id, barbeiro_id, inicio, fim, agora + self.ttl, dono)
+            self._por_token[pre.token] = pre
+            if dono is not None:
+                self._por_dono[(barbearia_id, dono)] = pre.token
+            for data in _dias(inicio, fim):
+                self._por_dia.setdefault((barbearia_id, barbeiro_id, data), set()).add(pre.token)
+            heapq.heappush(self._expiracoes, (pre.expira_em, pre.token))
+            return pre
+
+    def obter(self, token):
+        """Pré-reserva ativa do token, ou None se não existir/tiver expirado"""
+        with self._lock:
+            pre = self._por_token.get(token)
+            if pre and pre.expira_em <= time.monotonic():
+                self._remover(token)
+                return None
+            return pre
+
+    def liberar(self, token):
+        with self._lock:
+            return self._remover(token) is not None
+
+    def intervalos(self, barbearia_id, barbeiro_id, data, ignorar_token=None):
+        """[(inicio, fim)] pré-reservados do barbeiro que tocam o dia (inclusive os que
+        começaram na véspera)"""
+        with self._lock:
+            return [
+                (pre.inicio, pre.fim)
+                for pre in self._ativas_do_dia(int(barbearia_id), int(barbeiro_id), data, time.monotonic())
+                if pre.token != ignorar_token
+            ]
+
+    def conflito(self, barbearia_id, barbeiro_id, inicio, fim, ignorar_token=None):
+        """True se outra pré-reserva ativa se sobrepõe a [inicio, fim)"""
+        for data in _dias(inicio, fim):
+            for pre_inicio, pre_fim in self.intervalos(barbearia_id, barbeiro_id, data, ignorar_token):
+                if pre_inicio < fim and pre_fim > inicio:
+                    return True
+        return False
+
+    def segundos_restantes(self, pre):
+        return max(0, int(pre.expira_em - time.monotonic()))
+
+
+pre_reservas = PreReservas()
@@ -0,0 +1,113 @@
+# reservas.py
+# Um agendamento confirmado não pode sobrepor outro do mesmo barbeiro. A
+# verificação roda na própria transação do agendamento, depois de travar a
+# linha dos barbeiros envolvidos: pedidos concorrentes para o mesmo barbeiro
+# esperam um pelo outro e o segundo já enxerga o agendamento do primeiro.
+# A sobreposição é comparada em [horario, fim), então funciona com qualquer
+# intervalo de agenda, duração de serviço ou horário de abertura.
+import logging
+import random
+import time
+from datetime import timedelta
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError, OperationalError
+from models import db, Agendamento, Barbeiro
+from disponibilidade import DURACAO_MAXIMA_MINUTOS
+
+logger = logging.getLogger(__name__)
+
+# Tentativas para falhas transitórias do banco (ex.: "database is locked" no SQLite)
+MAX_TENTATIVAS = 4
+
+
+class HorarioIndisponivel(Exception):
+    """Outro agendamento confirmado já ocupa parte do intervalo"""
+
+
+def travar_barbeiros(barbeiro_ids):
+    """Serializa as reservas dos barbeiros até o fim da transação.
+
+    UPDATE sem efeito na linha do barbeiro: no Postgres segura o lock da linha;
+    no SQLite pega o lock de escrita do banco. Em ordem de id, para que duas
+    transações nunca travem os mesmos barbeiros em ordens diferentes.
+    """
+    for barbeiro_id in sorted(set(barbeiro_ids)):
+        db.session.execute(
+            update(Barbeiro).where(Barbeiro.id == barbeiro_id).values(id=Barbeiro.id)
+            .execution_options(synchronize_session=False)
+        )
+
+
+def _sobrepoe(inicio, fim, ocupados):
+    return any(i < fim and f > inicio for i, f in ocupados)
+
+
+def reservar_intervalos(agendamentos):
+    """Confere [(agendamento_id, barbeiro_id, inicio, fim), ...] contra os confirmados.
+
+    Os agendamentos já devem estar na sessão (com id). Levanta HorarioIndisponivel
+    se algum se sobrepõe a outro confirmado do mesmo barbeiro ou a outro da lista.
+    Uma única consulta de faixa para a lista toda.
+    """
+    if not agendamentos:
+        return
+
+    travar_barbeiros(barbeiro_id for _, barbeiro_id, _, _ in agendamentos)
+
+    inicio = min(i for _, _, i, _ in agendamentos)
+    fim = max(f for _, _, _, f in agendamentos)
+    existentes = db.session.query(
+        Agendamento.barbeiro_id, Agendamento.horario, Agendamento.fim
+    ).filter(
+        Agendamento.barbeiro_id.in_({barbeiro_id for _, barbeiro_id, _, _ in agendamentos}),
+        Agendamento.id.notin_([agendamento_id for agendamento_id, _, _, _ in agendamentos]),
+        Agendamento.status == 'confirmado',
+        Agendamento.horario >= inicio - timedelta(minutes=DURACAO_MAXIMA_MINUTOS),
+        Agendamento.horario < fim,
+        Agendamento.fim > inicio
+    ).all()
+
+    ocupados = {}
+    for barbeiro_id, horario, horario_fim in existentes:
+        ocupados.setdefault(barbeiro_id, []).append((horario, horario_fim))
+
+    for _, barbeiro_id, novo_inicio, novo_fim in agendamentos:
+        do_barbeiro = ocupados.setdefault(barbeiro_id, [])
+        if _sobrepoe(novo_inicio, novo_fim, do_barbeiro):
+            raise HorarioIndisponivel()
+        do_barbeiro.append((novo_inicio, novo_fim))
+
+
+def reservar_horario(agendamento):
+    """Confere um agendamento já com id (após flush) antes de confirmá-lo"""
+    reservar_intervalos([(agendamento.id, agendamento.barbeiro_id, agendamento.horario, agendamento.fim)])
+
+
+def executar_reserva(operacao, tentativas=MAX_TENTATIVAS):
+    """Executa `operacao()` e faz commit, sem lock global.
+
+    - HorarioIndisponivel (sobreposição) ou IntegrityError: rollback -> HorarioIndisponivel.
+    - OperationalError (banco ocupado/serialização): rollback e nova tentativa com
+      espera exponencial com jitter, até `tentativas` vezes.
+
+    `operacao` precisa ser reexecutável: tudo que ela adiciona à sessão é
+    descartado no rollback.
+    """
+    for tentativa in range(1, tentativas + 1):
+        try:
+            resultado = operacao()
+            db.session.commit()
+            return resultado
+        except (HorarioIndisponivel, IntegrityError):
+            db.session.rollback()
+            raise HorarioIndisponivel()
+        except OperationalError as e:
+            db.session.rollback()
+            if tentativa == tentativas:
+                raise
+            espera = min(0.5, 0.01 * 2 ** tentativa) * random.uniform(0.5, 1.5)
+            logger.warning(f"Banco ocupado ao reservar horário (tentativa {tentativa}): {str(e)}")
+            time.sleep(espera)
+        except Exception:
+            db.session.rollback()
+            raise
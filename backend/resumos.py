@@ -0,0 +1,303 @@
+# resumos.py
+# Resumos diários (ResumoDiario / ResumoDiarioBarbeiro) para as estatísticas.
+# Agendamentos e cancelamentos somam deltas na mesma transação; a reconstrução
+# recalcula qualquer período a partir dos agendamentos:
+#
+#   python resumos.py --de 2024-01-01 --ate 2024-03-31 [--barbearia 3]
+import argparse
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from sqlalchemy import case, func, insert, update
+from sqlalchemy.exc import IntegrityError
+from models import db, Agendamento, Barbeiro, Cliente, Servico, ResumoDiario, ResumoDiarioBarbeiro
+from utils import intervalo_do_dia
+
+logger = logging.getLogger(__name__)
+
+COLUNAS_STATUS = {'confirmado': 'confirmados', 'cancelado': 'cancelados'}
+
+
+def _coluna_status(status):
+    return COLUNAS_STATUS.get(status, 'outros')
+
+
+def _como_data(valor):
+    # func.date devolve texto no SQLite e date no PostgreSQL
+    return date.fromisoformat(valor) if isinstance(valor, str) else valor
+
+
+def _contagens():
+    confirmado = Agendamento.status == 'confirmado'
+    return (
+        func.count(case((confirmado, 1))),
+        func.count(case((Agendamento.status == 'cancelado', 1))),
+        func.count(case((Agendamento.status.notin_(list(COLUNAS_STATUS)), 1))),
+        func.coalesce(func.sum(case((confirmado, Servico.preco))), 0)
+    )
+
+
+def _totais_do_dia(barbearia_id, data, barbeiro_id=None):
+    """Totais do dia direto dos agendamentos (usado quando o resumo ainda não existe)"""
+    inicio, fim = intervalo_do_dia(data)
+    query = db.session.query(*_contagens()).select_from(Agendamento).join(
+        Servico, Agendamento.servico_id == Servico.id
+    ).filter(
+        Agendamento.barbearia_id == barbearia_id,
+        Agendamento.horario >= inicio,
+        Agendamento.horario < fim
+    )
+    if barbeiro_id is not None:
+        query = query.filter(Agendamento.barbeiro_id == barbeiro_id)
+
+    confirmados, cancelados, outros, faturamento = query.one()
+    totais = {
+        "confirmados": confirmados,
+        "cancelados": cancelados,
+        "outros": outros,
+        "faturamento": float(faturamento)
+    }
+    if barbeiro_id is None:
+        totais["clientes_novos"] = Cliente.query.filter(
+            Cliente.barbearia_id == barbearia_id,
+            Cliente.data_cadastro >= inicio,
+            Cliente.data_cadastro < fim
+        ).count()
+    return totais
+
+
+def _acumular(modelo, chave, incrementos, semear):
+    """Soma `incrementos` à linha `chave`; se ela não existe, cria a partir da fonte.
+
+    A criação roda depois de um flush, então a contagem na fonte já inclui a
+    alteração atual e o delta não é aplicado de novo. Se outra transação criou a
+    linha ao mesmo tempo, o INSERT falha no savepoint e o delta vai por UPDATE.
+    """
+    incrementos = {coluna: valor for coluna, valor in incrementos.items() if valor}
+    if not incrementos:
+        return
+
+    atualizar = update(modelo).where(
+        *[getattr(modelo, coluna) == valor for coluna, valor in chave.items()]
+    ).values(
+        {coluna: getattr(modelo, coluna) + valor for coluna, valor in incrementos.items()}
+    ).execution_options(synchronize_session=False)
+
+    if db.session.execute(atualizar).rowcount:
+        return
+
+    db.session.flush()
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(modelo).values(**chave, **semear()))
+    except IntegrityError:
+        db.session.execute(atualizar)
+
+
+def _aplicar(barbearia_id, barbeiro_id, data, incrementos):
+    _acumular(
+        ResumoDiario,
+        {"barbearia_id": barbearia_id, "data": data},
+        incrementos,
+        lambda: _totais_do_dia(barbearia_id, data)
+    )
+    _acumular(
+        ResumoDiarioBarbeiro,
+        {"barbearia_id": barbearia_id, "barbeiro_id": barbeiro_id, "data": data},
+        incrementos,
+        lambda: _totais_do_dia(barbearia_id, data, barbeiro_id)
+    )
+
+
+def registrar_agendamentos(barbearia_id, barbeiro_id, horarios, preco, status='confirmado'):
+    """Soma agendamentos novos (já gravados na sessão) aos resumos dos dias deles"""
+    por_dia = defaultdict(int)
+    for horario in horarios:
+        por_dia[horario.date()] += 1
+
+    coluna = _coluna_status(status)
+    for data, quantidade in sorted(por_dia.items()):
+        incrementos = {coluna: quantidade}
+        if status == 'confirmado':
+            incrementos["faturamento"] = quantidade * (preco or 0)
+        _aplicar(int(barbearia_id), int(barbeiro_id), data, incrementos)
+
+
+def registrar_mudanca_status(agendamento, status_anterior, preco):
+    """Move o agendamento entre as colunas de status; chamar depois de mudar o status"""
+    if status_anterior == agendamento.status:
+        return
+
+    incrementos = defaultdict(int)
+    incrementos[_coluna_status(status_anterior)] -= 1
+    incrementos[_coluna_status(agendamento.status)] += 1
+    if status_anterior == 'confirmado':
+        incrementos["faturamento"] -= preco or 0
+    if agendamento.status == 'confirmado':
+        incrementos["faturamento"] += preco or 0
+
+    _aplicar(agendamento.barbearia_id, agendamento.barbeiro_id, agendamento.horario.date(), incrementos)
+
+
+def registrar_cliente_novo(cliente):
+    """Conta um cliente recém-cadastrado (após flush) no dia do cadastro"""
+    data = (cliente.data_cadastro or datetime.utcnow()).date()
+    _acumular(
+        ResumoDiario,
+        {"barbearia_id": cliente.barbearia_id, "data": data},
+        {"clientes_novos": 1},
+        lambda: _totais_do_dia(cliente.barbearia_id, data)
+    )
+
+
+def mes_corrente(hoje=None):
+    """(primeiro dia, último dia) do mês de `hoje`"""
+    hoje = hoje or datetime.utcnow().date()
+    inicio = hoje.replace(day=1)
+    proximo = (inicio + timedelta(days=32)).replace(day=1)
+    return inicio, proximo - timedelta(days=1)
+
+
+def resumo_periodo(barbearia_id, de=None, ate=None):
+    """Somatório dos resumos diários da barbearia em [de, ate] (limites opcionais)"""
+    query = db.session.query(
+        func.coalesce(func.sum(ResumoDiario.confirmados), 0),
+        func.coalesce(func.sum(ResumoDiario.cancelados), 0),
+        func.coalesce(func.sum(ResumoDiario.outros), 0),
+        func.coalesce(func.sum(ResumoDiario.faturamento), 0),
+        func.coalesce(func.sum(ResumoDiario.clientes_novos), 0)
+    )
+    if barbearia_id is not None:
+        query = query.filter(ResumoDiario.barbearia_id == barbearia_id)
+    if de:
+        query = query.filter(ResumoDiario.data >= de)
+    if ate:
+        query = query.filter(ResumoDiario.data <= ate)
+
+    confirmados, cancelados, outros, faturamento, clientes_novos = query.one()
+    return {
+        "confirmados": int(confirmados),
+        "cancelados": int(cancelados),
+        "outros": int(outros),
+        "agendamentos": int(confirmados + cancelados + outros),
+        "faturamento": float(faturamento),
+        "clientes_novos": int(clientes_novos)
+    }
+
+
+def resumo_por_barbeiro(barbearia_id, de=None, ate=None):
+    """[(barbeiro_id, nome, confirmados, faturamento)] em [de, ate]"""
+    query = db.session.query(
+        Barbeiro.id, Barbeiro.nome,
+        func.sum(ResumoDiarioBarbeiro.confirmados),
+        func.sum(ResumoDiarioBarbeiro.faturamento)
+    ).select_from(ResumoDiarioBarbeiro).join(
+        Barbeiro, ResumoDiarioBarbeiro.barbeiro_id == Barbeiro.id
+    ).filter(ResumoDiarioBarbeiro.barbearia_id == barbearia_id)
+    if de:
+        query = query.filter(ResumoDiarioBarbeiro.data >= de)
+    if ate:
+        query = query.filter(ResumoDiarioBarbeiro.data <= ate)
+
+    return [
+        (barbeiro_id, nome, int(confirmados or 0), float(faturamento or 0))
+        for barbeiro_id, nome, confirmados, faturamento in
+        query.group_by(Barbeiro.id, Barbeiro.nome).order_by(Barbeiro.nome).all()
+    ]
+
+
+def reconstruir_resumos(de, ate, barbearia_id=None):
+    """Apaga e recalcula os resumos de [de, ate] a partir dos agendamentos e clientes"""
+    inicio = datetime.combine(de, datetime.min.time())
+    fim = datetime.combine(ate + timedelta(days=1), datetime.min.time())
+
+    for modelo in (ResumoDiario, ResumoDiarioBarbeiro):
+        apagar = modelo.query.filter(modelo.data >= de, modelo.data <= ate)
+        if barbearia_id is not None:
+            apagar = apagar.filter(modelo.barbearia_id == barbearia_id)
+        apagar.delete(synchronize_session=False)
+
+    dia = func.date(Agendamento.horario)
+    query = db.session.query(
+        Agendamento.barbearia_id, Agendamento.barbeiro_id, dia, *_contagens()
+    ).join(
+        Servico, Agendamento.servico_id == Servico.id
+    ).filter(Agendamento.horario >= inicio, Agendamento.horario < fim)
+    if barbearia_id is not None:
+        query = query.filter(Agendamento.barbearia_id == barbearia_id)
+
+    por_barbeiro = []
+    por_barbearia = defaultdict(lambda: {
+        "confirmados": 0, "cancelados": 0, "outros": 0, "faturamento": 0.0, "clientes_novos": 0
+    })
+    for b_id, barbeiro_id, data, confirmados, cancelados, outros, faturamento in query.group_by(
+        Agendamento.barbearia_id, Agendamento.barbeiro_id, dia
+    ).all():
+        data = _como_data(data)
+        por_barbeiro.append({
+            "barbearia_id": b_id, "barbeiro_id": barbeiro_id, "data": data,
+            "confirmados": confirmados, "cancelados": cancelados, "outros": outros,
+            "faturamento": float(faturamento)
+        })
+        totais = por_barbearia[(b_id, data)]
+        totais["confirmados"] += confirmados
+        totais["cancelados"] += cancelados
+        totais["outros"] += outros
+        totais["faturamento"] += float(faturamento)
+
+    dia_cadastro = func.date(Cliente.data_cadastro)
+    clientes = db.session.query(Cliente.barbearia_id, dia_cadastro, func.count(Cliente.id)).filter(
+        Cliente.data_cadastro >= inicio, Cliente.data_cadastro < fim
+    )
+    if barbearia_id is not None:
+        clientes = clientes.filter(Cliente.barbearia_id == barbearia_id)
+    for b_id, data, quantidade in clientes.group_by(Cliente.barbearia_id, dia_cadastro).all():
+        por_barbearia[(b_id, _como_data(data))]["clientes_novos"] += quantidade
+
+    linhas = [
+        {"barbearia_id": b_id, "data": data, **totais}
+        for (b_id, data), totais in por_barbearia.items()
+    ]
+    if linhas:
+        db.session.execute(insert(ResumoDiario), linhas)
+    if por_barbeiro:
+        db.session.execute(insert(ResumoDiarioBarbeiro), por_barbeiro)
+    db.session.commit()
+
+    logger.info(f"📊 Resumos de {de} a {ate} reconstruídos: {len(linhas)} dias, {len(por_barbeiro)} linhas por barbeiro")
+    return len(linhas), len(por_barbeiro)
+
+
+def migrar_resumos():
+    """Primeira carga dos resumos para bancos que já têm agendamentos"""
+    if ResumoDiario.query.first() is not None:
+        return
+
+    primeiro_ag, ultimo_ag = db.session.query(func.min(Agendamento.horario), func.max(Agendamento.horario)).one()
+    primeiro_cli, ultimo_cli = db.session.query(func.min(Cliente.data_cadastro), func.max(Cliente.data_cadastro)).one()
+    datas = [d for d in (primeiro_ag, ultimo_ag, primeiro_cli, ultimo_cli) if d]
+    if datas:
+        reconstruir_resumos(min(datas).date(), max(datas).date())
+
+
+if __name__ == '__main__':
+    from flask import Flask
+    from config import Config
+
+    parser = argparse.ArgumentParser(description="Reconstrói os resumos diários de um período")
+    parser.add_argument('--de', required=True, help="Data inicial YYYY-MM-DD")
+    parser.add_argument('--ate', required=True, help="Data final YYYY-MM-DD (inclusiva)")
+    parser.add_argument('--barbearia', type=int, help="Só esta barbearia")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    db.init_app(app)
+
+    with app.app_context():
+        dias, linhas_barbeiro = reconstruir_resumos(
+            date.fromisoformat(args.de), date.fromisoformat(args.ate), args.barbearia
+        )
+
+    print(f"{dias} dia(s) por barbearia, {linhas_barbeiro} linha(s) por barbeiro")
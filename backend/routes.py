@@ -1,43 +1,66 @@
 # routes.py
-from flask import Blueprint, request, jsonify, g
+from flask import Blueprint, Response, request, jsonify, g
 from models import db, Cliente, Agendamento, Barbeiro, Servico, BarbeariaCliente, PlanoAssinatura, ConfiguracaoBarbearia
-from utils import validar_telefone, validar_horario, formatar_telefone
-from sqlalchemy import func
+from utils import validar_telefone, converter_horario, formatar_telefone, intervalo_do_dia
+from disponibilidade import (
+    horarios_disponiveis_dia, horarios_disponiveis_periodo, proximo_horario_livre,
+    buscar_conflito, conflitos_em_lote, invalidar_disponibilidade, cache_disponibilidade, MAX_DIAS_BUSCA
+)
+from sqlalchemy import insert
 from sqlalchemy.exc import IntegrityError
 from datetime import datetime, timedelta
 import logging
-from whatsapp_service import whatsapp_service
+from reservas import executar_reserva, reservar_horario, reservar_intervalos, HorarioIndisponivel
+from pre_reservas import pre_reservas
+from contexto_barbearia import obter_barbearia, obter_contexto, versao_barbearia, modificacao_barbearia, versao_planos
+from cache_http import etag_versao, nao_modificado, com_cache
+from uso_mensal import agendamentos_no_mes, consumir_agendamentos, devolver_agendamento, LimitePlanoAtingido
+from resumos import registrar_agendamentos, registrar_cliente_novo, registrar_mudanca_status, resumo_periodo, resumo_por_barbeiro, mes_corrente
+from eventos import notificar_agendamento, fluxo_eventos
+from listagens import pagina_agendamentos, ParametroInvalido
+from notificacoes import enfileirar
+from autenticacao import principal_atual
 
 logger = logging.getLogger(__name__)
 routes = Blueprint('routes', __name__)
 
+# Máximo de ocorrências criadas por uma única série recorrente
+MAX_OCORRENCIAS_RECORRENTES = 52
+
 def get_barbearia_id():
     """Helper para obter ID da barbearia do contexto"""
     return getattr(g, 'barbearia_id', 1)
 
-def verificar_limites_plano(barbearia_id):
+def get_barbearia():
+    """Snapshot da barbearia resolvida pelo middleware (sem nova consulta)"""
+    barbearia = getattr(g, 'barbearia', None)
+    if barbearia is None:
+        barbearia = obter_barbearia(get_barbearia_id())
+    return barbearia
+
+def get_contexto():
+    """Contexto da barbearia (configuração, serviços, barbeiros e plano) em cache"""
+    return obter_contexto(get_barbearia_id())
+
+def verificar_limites_plano(barbearia_id, novos_agendamentos=1):
     """Verifica se a barbearia está dentro dos limites do plano"""
-    barbearia = BarbeariaCliente.query.get(barbearia_id)
-    if not barbearia or not barbearia.plano:
+    contexto = obter_contexto(barbearia_id)
+    if not contexto or not contexto.barbearia.plano_id:
         return False, "Plano não encontrado"
     
-    plano = barbearia.plano
+    barbearia = contexto.barbearia
     
     # Verificar limite de barbeiros
-    total_barbeiros = Barbeiro.query.filter_by(barbearia_id=barbearia_id, ativo=True).count()
-    if total_barbeiros >= plano.limite_barbeiros:
-        return False, f"Limite de {plano.limite_barbeiros} barbeiros atingido"
+    total_barbeiros = len(contexto.barbeiros)
+    if total_barbeiros >= barbearia.limite_barbeiros:
+        return False, f"Limite de {barbearia.limite_barbeiros} barbeiros atingido"
     
     # Verificar limite de agendamentos (mensal)
-    if plano.limite_agendamentos:
-        inicio_mes = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0)
-        agendamentos_mes = Agendamento.query.filter(
-            Agendamento.barbearia_id == barbearia_id,
-            Agendamento.data_criacao >= inicio_mes
-        ).count()
+    if barbearia.limite_agendamentos:
+        agendamentos_mes = agendamentos_no_mes(contexto.barbearia.id)
         
-        if agendamentos_mes >= plano.limite_agendamentos:
-            return False, f"Limite de {plano.limite_agendamentos} agendamentos/mês atingido"
+        if agendamentos_mes + novos_agendamentos > barbearia.limite_agendamentos:
+            return False, f"Limite de {barbearia.limite_agendamentos} agendamentos/mês atingido"
     
     return True, "Dentro dos limites"
 
@@ -122,6 +145,12 @@ def criar_barbearia():
 @routes.route('/planos', methods=['GET'])
 def listar_planos():
     try:
+        versao, modificado_em = versao_planos()
+        etag = etag_versao('planos', versao)
+        resposta = nao_modificado(etag, modificado_em)
+        if resposta:
+            return resposta
+
         planos = PlanoAssinatura.query.all()
         resultado = [{
             "id": p.id,
@@ -131,7 +160,7 @@ def listar_planos():
             "limite_agendamentos": p.limite_agendamentos
         } for p in planos]
         
-        return jsonify(resultado)
+        return com_cache(jsonify(resultado), etag, modificado_em)
     except Exception as e:
         logger.error(f"Erro ao listar planos: {str(e)}")
         return jsonify({"erro": "Erro interno do servidor"}), 500
@@ -140,16 +169,25 @@ def listar_planos():
 @routes.route('/barbeiros', methods=['GET'])
 def listar_barbeiros():
     try:
+        # A versão está em memória: o 304 sai antes de carregar o contexto
         barbearia_id = get_barbearia_id()
-        barbeiros = Barbeiro.query.filter_by(barbearia_id=barbearia_id, ativo=True).all()
+        etag = etag_versao('barbeiros', barbearia_id, versao_barbearia(barbearia_id))
+        modificado_em = modificacao_barbearia(barbearia_id)
+        resposta = nao_modificado(etag, modificado_em, vary='X-Barbearia-ID')
+        if resposta:
+            return resposta
+
+        contexto = obter_contexto(barbearia_id)
+        if not contexto:
+            return jsonify([])
         
         resultado = [{
             "id": b.id, 
             "nome": b.nome, 
             "especialidade": b.especialidade
-        } for b in barbeiros]
+        } for b in contexto.barbeiros]
         
-        return jsonify(resultado)
+        return com_cache(jsonify(resultado), etag, modificado_em, vary='X-Barbearia-ID')
     except Exception as e:
         logger.error(f"Erro ao listar barbeiros: {str(e)}")
         return jsonify({"erro": "Erro interno do servidor"}), 500
@@ -158,17 +196,26 @@ def listar_barbeiros():
 @routes.route('/servicos', methods=['GET'])
 def listar_servicos():
     try:
+        # A versão está em memória: o 304 sai antes de carregar o contexto
         barbearia_id = get_barbearia_id()
-        servicos = Servico.query.filter_by(barbearia_id=barbearia_id, ativo=True).all()
+        etag = etag_versao('servicos', barbearia_id, versao_barbearia(barbearia_id))
+        modificado_em = modificacao_barbearia(barbearia_id)
+        resposta = nao_modificado(etag, modificado_em, vary='X-Barbearia-ID')
+        if resposta:
+            return resposta
+
+        contexto = obter_contexto(barbearia_id)
+        if not contexto:
+            return jsonify([])
         
         resultado = [{
             "id": s.id, 
             "nome": s.nome, 
             "duracao_minutos": s.duracao_minutos,
             "preco": s.preco
-        } for s in servicos]
+        } for s in contexto.servicos]
         
-        return jsonify(resultado)
+        return com_cache(jsonify(resultado), etag, modificado_em, vary='X-Barbearia-ID')
     except Exception as e:
         logger.error(f"Erro ao listar serviços: {str(e)}")
         return jsonify({"erro": "Erro interno do servidor"}), 500
@@ -177,42 +224,56 @@ def listar_servicos():
 @routes.route('/horarios-disponiveis', methods=['GET'])
 def horarios_disponiveis():
     try:
-        barbearia_id = get_barbearia_id()
         barbeiro_id = request.args.get('barbeiro_id')
+        servico_id = request.args.get('servico_id')
         data_str = request.args.get('data')
+        de_str = request.args.get('de')
+        ate_str = request.args.get('ate')
         
-        if not barbeiro_id or not data_str:
+        if not barbeiro_id or not (data_str or de_str):
             return jsonify({"erro": "Barbeiro ID e data são obrigatórios"}), 400
 
-        # Converter data
-        data = datetime.strptime(data_str, '%Y-%m-%d').date()
-        
         # Buscar configurações da barbearia
-        config = ConfiguracaoBarbearia.query.filter_by(barbearia_id=barbearia_id).first()
+        contexto = get_contexto()
+        config = contexto.configuracao if contexto else None
         if not config:
             return jsonify({"erro": "Configuração não encontrada"}), 400
 
-        # Buscar agendamentos existentes
-        agendamentos = Agendamento.query.filter(
-            func.date(Agendamento.horario) == data,
-            Agendamento.barbeiro_id == barbeiro_id,
-            Agendamento.status == 'confirmado'
-        ).all()
+        # Só barbeiros ativos da barbearia (antes de montar ou guardar qualquer grade)
+        barbeiro = contexto.barbeiro(barbeiro_id)
+        if not barbeiro:
+            return jsonify({"erro": "Barbeiro inválido"}), 400
+
+        # Duração do serviço (opcional, padrão = um intervalo)
+        duracao = None
+        if servico_id:
+            servico = contexto.servico(servico_id)
+            if not servico:
+                return jsonify({"erro": "Serviço inválido"}), 400
+            duracao = servico.duracao_minutos
+
+        # Modo período: vários dias numa única consulta
+        if de_str:
+            de = datetime.strptime(de_str, '%Y-%m-%d').date()
+            ate = datetime.strptime(ate_str, '%Y-%m-%d').date() if ate_str else de
+            try:
+                dias = horarios_disponiveis_periodo(config, barbeiro.id, de, ate, duracao)
+            except ValueError as e:
+                return jsonify({"erro": str(e)}), 400
+
+            return jsonify({
+                "de": de.isoformat(),
+                "ate": ate.isoformat(),
+                "dias": dias
+            })
 
-        horarios_ocupados = [ag.horario.time() for ag in agendamentos]
-        horarios_disponiveis = []
+        # Converter data
+        data = datetime.strptime(data_str, '%Y-%m-%d').date()
 
-        # Gerar horários baseado na configuração
-        hora_atual = datetime.combine(data, config.horario_abertura)
-        hora_fim = datetime.combine(data, config.horario_fechamento)
-        
-        while hora_atual < hora_fim:
-            if hora_atual.time() not in horarios_ocupados and hora_atual > datetime.utcnow():
-                horarios_disponiveis.append(hora_atual.strftime("%H:%M"))
-            hora_atual += timedelta(minutes=config.intervalo_agendamento)
+        horarios = horarios_disponiveis_dia(config, barbeiro.id, data, duracao)
 
         return jsonify({
-            "horarios_disponiveis": horarios_disponiveis
+            "horarios_disponiveis": horarios
         })
 
     except ValueError:
@@ -221,6 +282,113 @@ def horarios_disponiveis():
         logger.error(f"Erro ao buscar horários: {str(e)}")
         return jsonify({"erro": "Erro interno do servidor"}), 500
 
+# ROTA PARA ESTATÍSTICAS DO CACHE DE HORÁRIOS (só admin)
+@routes.route('/horarios-disponiveis/cache', methods=['GET'])
+def estatisticas_cache_horarios():
+    principal = principal_atual()
+    if not principal or principal.tipo != 'admin':
+        return jsonify({"erro": "Não autorizado"}), 401
+    return jsonify(cache_disponibilidade.estatisticas())
+
+# ROTA PARA PRÓXIMO HORÁRIO LIVRE
+@routes.route('/proximo-horario', methods=['GET'])
+def proximo_horario():
+    try:
+        servico_id = request.args.get('servico_id')
+        barbeiro_id = request.args.get('barbeiro_id', type=int)
+        dias = request.args.get('dias', 14, type=int)
+
+        contexto = get_contexto()
+        config = contexto.configuracao if contexto else None
+        if not config:
+            return jsonify({"erro": "Configuração não encontrada"}), 400
+
+        duracao = None
+        if servico_id:
+            servico = contexto.servico(servico_id)
+            if not servico:
+                return jsonify({"erro": "Serviço inválido"}), 400
+            duracao = servico.duracao_minutos
+
+        # Um barbeiro específico ou qualquer barbeiro ativo
+        barbeiros = {b.id: b for b in contexto.barbeiros if not barbeiro_id or b.id == barbeiro_id}
+
+        if not barbeiros:
+            return jsonify({"erro": "Barbeiro inválido"}), 400
+
+        dias = max(1, min(dias, MAX_DIAS_BUSCA))
+        resultado = proximo_horario_livre(config, list(barbeiros), duracao, dias=dias)
+        if not resultado:
+            return jsonify({"erro": f"Nenhum horário livre nos próximos {dias} dias"}), 404
+
+        barbeiro_livre, horario = resultado
+        return jsonify({
+            "barbeiro_id": barbeiro_livre,
+            "barbeiro": barbeiros[barbeiro_livre].nome,
+            "data": horario.strftime('%Y-%m-%d'),
+            "hora": horario.strftime('%H:%M'),
+            "horario": horario.isoformat()
+        })
+
+    except Exception as e:
+        logger.error(f"Erro ao buscar próximo horário: {str(e)}")
+        return jsonify({"erro": "Erro interno do servidor"}), 500
+
+# ROTA PARA PRÉ-RESERVAR UM HORÁRIO DURANTE O PREENCHIMENTO
+@routes.route('/pre-reservas', methods=['POST'])
+def criar_pre_reserva():
+    try:
+        barbearia_id = get_barbearia_id()
+        data = request.json
+        servico_id = data.get('servico_id')
+        barbeiro_id = data.get('barbeiro_id')
+        horario = converter_horario(data.get('horario'))
+
+        if not all([servico_id, barbeiro_id]):
+            return jsonify({"erro": "Serviço e barbeiro são obrigatórios"}), 400
+
+        if not horario:
+            return jsonify({"erro": "Formato de horário inválido"}), 400
+
+        if horario < datetime.utcnow():
+            return jsonify({"erro": "Não é possível reservar horários no passado"}), 400
+
+        contexto = get_contexto()
+        servico = contexto.servico(servico_id) if contexto else None
+        barbeiro = contexto.barbeiro(barbeiro_id) if contexto else None
+        
+        if not servico or not barbeiro:
+            return jsonify({"erro": "Serviço ou barbeiro inválido"}), 400
+
+        fim = horario + timedelta(minutes=servico.duracao_minutos)
+        if buscar_conflito(barbeiro.id, horario, fim):
+            return jsonify({"erro": f"Horário {horario.strftime('%H:%M')} já agendado"}), 409
+
+        # Uma pré-reserva ativa por cliente (IP) e barbearia: a nova substitui a anterior
+        pre = pre_reservas.criar(barbearia_id, barbeiro.id, horario, fim, dono=request.remote_addr)
+        if not pre:
+            return jsonify({"erro": f"Horário {horario.strftime('%H:%M')} está reservado temporariamente"}), 409
+
+        return jsonify({
+            "pre_reserva": pre.token,
+            "horario": horario.isoformat(),
+            "expira_em_segundos": pre_reservas.segundos_restantes(pre)
+        }), 201
+
+    except Exception as e:
+        logger.error(f"Erro ao criar pré-reserva: {str(e)}")
+        return jsonify({"erro": "Erro interno do servidor"}), 500
+
+# ROTA PARA SOLTAR UMA PRÉ-RESERVA
+@routes.route('/pre-reservas/<token>', methods=['DELETE'])
+def liberar_pre_reserva(token):
+    pre = pre_reservas.obter(token)
+    if not pre or pre.barbearia_id != int(get_barbearia_id()):
+        return jsonify({"erro": "Pré-reserva não encontrada"}), 404
+
+    pre_reservas.liberar(token)
+    return jsonify({"msg": "Pré-reserva liberada"}), 200
+
 # ROTA PRINCIPAL DE AGENDAMENTO
 @routes.route('/agendar', methods=['POST'])
 def agendar():
@@ -229,11 +397,11 @@ def agendar():
         data = request.json
         
         # Verificar se barbearia está ativa
-        barbearia = BarbeariaCliente.query.get(barbearia_id)
+        barbearia = get_barbearia()
         if not barbearia or not barbearia.ativo:
             return jsonify({"erro": "Barbearia não está ativa"}), 400
             
-        if barbearia.data_expiracao and barbearia.data_expiracao < datetime.utcnow():
+        if barbearia.expirada:
             return jsonify({"erro": "Assinatura expirada. Renove para continuar usando."}), 400
 
         # Verificar limites do plano
@@ -253,69 +421,95 @@ def agendar():
         if not validar_telefone(telefone):
             return jsonify({"erro": "Número de telefone inválido"}), 400
 
-        horario = validar_horario(horario_str)
+        horario = converter_horario(horario_str)
         if not horario:
             return jsonify({"erro": "Formato de horário inválido"}), 400
 
         if horario < datetime.utcnow():
             return jsonify({"erro": "Não é possível agendar para horários no passado"}), 400
 
-        # Verificar conflito de horário
-        ag_existente = Agendamento.query.filter_by(
-            horario=horario, 
-            barbeiro_id=barbeiro_id, 
-            status='confirmado'
-        ).first()
+        # Verificar se serviços/barbeiros pertencem à barbearia
+        contexto = get_contexto()
+        servico = contexto.servico(servico_id) if contexto else None
+        barbeiro = contexto.barbeiro(barbeiro_id) if contexto else None
+        
+        if not servico or not barbeiro:
+            return jsonify({"erro": "Serviço ou barbeiro inválido"}), 400
+
+        fim = horario + timedelta(minutes=servico.duracao_minutos)
+
+        # Verificar conflito de horário (qualquer sobreposição com a duração do serviço)
+        ag_existente = buscar_conflito(barbeiro_id, horario, fim)
         
         if ag_existente:
             hora_formatada = horario.strftime("%H:%M")
             return jsonify({"erro": f"Horário {hora_formatada} já agendado"}), 400
 
-        # Criar ou encontrar cliente
-        cliente = Cliente.query.filter_by(telefone=telefone, barbearia_id=barbearia_id).first()
-        if not cliente:
-            cliente = Cliente(
+        # Horário segurado por outro cliente que ainda está preenchendo os dados
+        token_pre_reserva = data.get('pre_reserva')
+        if pre_reservas.conflito(barbearia_id, barbeiro_id, horario, fim, ignorar_token=token_pre_reserva):
+            hora_formatada = horario.strftime("%H:%M")
+            return jsonify({"erro": f"Horário {hora_formatada} está reservado temporariamente"}), 400
+
+        config = contexto.configuracao
+        whatsapp_confirmacao = bool(config and config.whatsapp_ativo and config.confirmacao_automatica)
+
+        def criar_agendamento():
+            # Consome o limite do plano na mesma transação (antes do INSERT do agendamento)
+            if not consumir_agendamentos(barbearia_id, 1, contexto.barbearia.limite_agendamentos or None):
+                raise LimitePlanoAtingido()
+
+            # Criar ou encontrar cliente
+            cliente = Cliente.query.filter_by(telefone=telefone, barbearia_id=barbearia_id).first()
+            if not cliente:
+                cliente = Cliente(
+                    barbearia_id=barbearia_id,
+                    nome=nome, 
+                    telefone=telefone,
+                    email=data.get('email')
+                )
+                db.session.add(cliente)
+                db.session.flush()
+                registrar_cliente_novo(cliente)
+
+            # Criar agendamento
+            agendamento = Agendamento(
                 barbearia_id=barbearia_id,
-                nome=nome, 
-                telefone=telefone,
-                email=data.get('email')
+                cliente_id=cliente.id,
+                barbeiro_id=barbeiro_id,
+                servico_id=servico_id,
+                horario=horario,
+                fim=fim,
+                status='confirmado',
+                observacoes=data.get('observacoes')
             )
-            db.session.add(cliente)
+            
+            db.session.add(agendamento)
             db.session.flush()
 
-        # Verificar se serviços/barbeiros pertencem à barbearia
-        servico = Servico.query.filter_by(id=servico_id, barbearia_id=barbearia_id).first()
-        barbeiro = Barbeiro.query.filter_by(id=barbeiro_id, barbearia_id=barbearia_id).first()
-        
-        if not servico or not barbeiro:
-            return jsonify({"erro": "Serviço ou barbeiro inválido"}), 400
+            # Sobreposição conferida com o barbeiro travado: um pedido concorrente falha aqui
+            reservar_horario(agendamento)
+            registrar_agendamentos(barbearia_id, barbeiro_id, [horario], servico.preco)
+            notificar_agendamento('agendamento_criado', agendamento.id, barbearia_id, agendamento.barbeiro_id, horario, 'confirmado')
 
-        # Criar agendamento
-        agendamento = Agendamento(
-            barbearia_id=barbearia_id,
-            cliente_id=cliente.id,
-            barbeiro_id=barbeiro_id,
-            servico_id=servico_id,
-            horario=horario,
-            status='confirmado',
-            observacoes=data.get('observacoes')
-        )
-        
-        db.session.add(agendamento)
-        db.session.commit()
+            # Confirmação por WhatsApp vai para o outbox, no mesmo commit do agendamento
+            if whatsapp_confirmacao:
+                enfileirar(barbearia_id, 'confirmacao_agendamento', agendamento.id)
+            return cliente, agendamento
 
-        # ✅ INTEGRAÇÃO WHATSAPP
-        whatsapp_enviado = False
         try:
-            config = ConfiguracaoBarbearia.query.filter_by(barbearia_id=barbearia_id).first()
-            
-            if config and config.whatsapp_ativo and config.confirmacao_automatica:
-                whatsapp_enviado = whatsapp_service.enviar_confirmacao_agendamento(
-                    agendamento, cliente, barbearia
-                )
-                logger.info(f"📱 WhatsApp enviado: {whatsapp_enviado}")
-        except Exception as e:
-            logger.error(f"❌ Erro ao enviar WhatsApp: {str(e)}")
+            cliente, agendamento = executar_reserva(criar_agendamento)
+        except HorarioIndisponivel:
+            hora_formatada = horario.strftime("%H:%M")
+            return jsonify({"erro": f"Horário {hora_formatada} já agendado"}), 400
+        except LimitePlanoAtingido:
+            return jsonify({"erro": f"Limite de {contexto.barbearia.limite_agendamentos} agendamentos/mês atingido"}), 400
+
+        # A pré-reserva virou agendamento (só se for deste mesmo horário)
+        pre = pre_reservas.obter(token_pre_reserva) if token_pre_reserva else None
+        if pre and (pre.barbearia_id, pre.barbeiro_id, pre.inicio, pre.fim) == (int(barbearia_id), barbeiro.id, horario, fim):
+            pre_reservas.liberar(pre.token)
+        invalidar_disponibilidade(barbearia_id, agendamento.barbeiro_id, agendamento.horario.date())
 
         return jsonify({
             "msg": "Agendamento realizado com sucesso!",
@@ -325,7 +519,7 @@ def agendar():
             "servico": servico.nome,
             "barbeiro": barbeiro.nome,
             "horario": horario.isoformat(),
-            "whatsapp_enviado": whatsapp_enviado
+            "whatsapp_agendado": whatsapp_confirmacao
         }), 200
 
     except Exception as e:
@@ -333,42 +527,226 @@ def agendar():
         logger.error(f"Erro no agendamento: {str(e)}")
         return jsonify({"erro": "Erro interno do servidor"}), 500
 
-# ROTA PARA LISTAR AGENDAMENTOS
-@routes.route('/agendamentos', methods=['GET'])
-def listar_agendamentos():
+# ROTA PARA AGENDAMENTO RECORRENTE / EM LOTE
+@routes.route('/agendar/recorrente', methods=['POST'])
+def agendar_recorrente():
+    """Cria uma série de agendamentos (ex.: toda terça às 10h por 12 semanas) numa única transação.
+
+    Aceita `horario` + `intervalo_dias` + `ocorrencias`, ou uma lista explícita em `horarios`.
+    Com `parcial=true` cria as ocorrências livres e só reporta as que conflitam;
+    sem ele, qualquer conflito cancela a série inteira.
+    """
     try:
         barbearia_id = get_barbearia_id()
+        data = request.json
         
-        # Filtros
-        data = request.args.get('data')
-        status = request.args.get('status')
-        
-        query = Agendamento.query.filter_by(barbearia_id=barbearia_id)
-        
-        if data:
-            data_obj = datetime.strptime(data, '%Y-%m-%d').date()
-            query = query.filter(func.date(Agendamento.horario) == data_obj)
-        
-        if status:
-            query = query.filter_by(status=status)
-        
-        agendamentos = query.order_by(Agendamento.horario.asc()).all()
+        # Verificar se barbearia está ativa
+        barbearia = get_barbearia()
+        if not barbearia or not barbearia.ativo:
+            return jsonify({"erro": "Barbearia não está ativa"}), 400
+            
+        if barbearia.expirada:
+            return jsonify({"erro": "Assinatura expirada. Renove para continuar usando."}), 400
+
+        nome = data.get('nome')
+        telefone = data.get('telefone')
+        servico_id = data.get('servico_id')
+        barbeiro_id = data.get('barbeiro_id')
+        parcial = bool(data.get('parcial', False))
+
+        if not all([nome, telefone, servico_id, barbeiro_id]):
+            return jsonify({"erro": "Todos os campos são obrigatórios"}), 400
+
+        if not validar_telefone(telefone):
+            return jsonify({"erro": "Número de telefone inválido"}), 400
+
+        # Montar as ocorrências
+        if data.get('horarios'):
+            horarios = [converter_horario(h) for h in data['horarios']]
+        else:
+            primeiro = converter_horario(data.get('horario'))
+            try:
+                intervalo_dias = int(data.get('intervalo_dias', 7))
+                ocorrencias = int(data.get('ocorrencias', 1))
+            except (TypeError, ValueError):
+                return jsonify({"erro": "Regra de recorrência inválida"}), 400
+            if not primeiro or intervalo_dias < 1 or ocorrencias < 1:
+                return jsonify({"erro": "Regra de recorrência inválida"}), 400
+            # Antes de montar a lista: um número enorme não chega a alocar nada
+            if ocorrencias > MAX_OCORRENCIAS_RECORRENTES:
+                return jsonify({"erro": f"Máximo de {MAX_OCORRENCIAS_RECORRENTES} ocorrências por série"}), 400
+            horarios = [primeiro + timedelta(days=intervalo_dias * n) for n in range(ocorrencias)]
+
+        if not horarios or None in horarios:
+            return jsonify({"erro": "Formato de horário inválido"}), 400
+
+        if len(horarios) > MAX_OCORRENCIAS_RECORRENTES:
+            return jsonify({"erro": f"Máximo de {MAX_OCORRENCIAS_RECORRENTES} ocorrências por série"}), 400
+
+        horarios.sort()
+
+        contexto = get_contexto()
+        servico = contexto.servico(servico_id) if contexto else None
+        barbeiro = contexto.barbeiro(barbeiro_id) if contexto else None
         
+        if not servico or not barbeiro:
+            return jsonify({"erro": "Serviço ou barbeiro inválido"}), 400
+
+        barbeiro_id, servico_id = barbeiro.id, servico.id
+
+        # Verificar todas as ocorrências com uma única consulta
+        duracao = timedelta(minutes=servico.duracao_minutos)
+        agora = datetime.utcnow()
+        conflitos = conflitos_em_lote(barbeiro_id, [(h, h + duracao) for h in horarios])
+
         resultado = []
-        for ag in agendamentos:
-            resultado.append({
-                "id": ag.id,
-                "cliente": ag.cliente_info.nome,
-                "telefone": formatar_telefone(ag.cliente_info.telefone),
-                "email": ag.cliente_info.email,
-                "servico": ag.servico_info.nome,
-                "barbeiro": ag.barbeiro_info.nome,
-                "horario": ag.horario.isoformat(),
-                "status": ag.status,
-                "observacoes": ag.observacoes
-            })
+        livres = []
+        for horario, conflito in zip(horarios, conflitos):
+            if horario < agora:
+                situacao = "passado"
+            elif conflito:
+                situacao = "conflito"
+            else:
+                situacao = "livre"
+                livres.append(horario)
+            resultado.append({"horario": horario.isoformat(), "status": situacao})
+
+        if not livres or (len(livres) < len(horarios) and not parcial):
+            return jsonify({
+                "erro": "Há ocorrências indisponíveis; nenhum agendamento foi criado",
+                "ocorrencias": resultado
+            }), 409
+
+        # Verificar limites do plano para a série inteira
+        limite_ok, msg_erro = verificar_limites_plano(barbearia_id, len(livres))
+        if not limite_ok:
+            return jsonify({"erro": msg_erro}), 400
+
+        def criar_serie():
+            # Consome o limite do plano para a série inteira
+            if not consumir_agendamentos(barbearia_id, len(livres), contexto.barbearia.limite_agendamentos or None):
+                raise LimitePlanoAtingido()
+
+            # Criar ou encontrar cliente
+            cliente = Cliente.query.filter_by(telefone=telefone, barbearia_id=barbearia_id).first()
+            if not cliente:
+                cliente = Cliente(
+                    barbearia_id=barbearia_id,
+                    nome=nome, 
+                    telefone=telefone,
+                    email=data.get('email')
+                )
+                db.session.add(cliente)
+                db.session.flush()
+                registrar_cliente_novo(cliente)
+
+            # Inserir a série com um único INSERT em lote
+            ids = db.session.scalars(
+                insert(Agendamento).returning(Agendamento.id, sort_by_parameter_order=True),
+                [
+                    {
+                        "barbearia_id": barbearia_id,
+                        "cliente_id": cliente.id,
+                        "barbeiro_id": barbeiro_id,
+                        "servico_id": servico_id,
+                        "horario": horario,
+                        "fim": horario + duracao,
+                        "status": "confirmado",
+                        "observacoes": data.get('observacoes')
+                    }
+                    for horario in livres
+                ]
+            ).all()
+
+            reservar_intervalos([
+                (agendamento_id, barbeiro_id, horario, horario + duracao)
+                for agendamento_id, horario in zip(ids, livres)
+            ])
+            registrar_agendamentos(barbearia_id, barbeiro_id, livres, servico.preco)
+            for agendamento_id, horario in zip(ids, livres):
+                notificar_agendamento('agendamento_criado', agendamento_id, barbearia_id, barbeiro_id, horario, 'confirmado')
+            return cliente, ids
+
+        try:
+            cliente, ids = executar_reserva(criar_serie)
+        except HorarioIndisponivel:
+            return jsonify({"erro": "Outro agendamento ocupou parte da série; tente novamente"}), 409
+        except LimitePlanoAtingido:
+            return jsonify({"erro": f"Limite de {contexto.barbearia.limite_agendamentos} agendamentos/mês atingido"}), 400
+
+        for horario in livres:
+            invalidar_disponibilidade(barbearia_id, barbeiro_id, horario.date())
+
+        codigos = iter(ids)
+        for item in resultado:
+            if item["status"] == "livre":
+                agendamento_id = next(codigos)
+                item.update(status="criado", id=agendamento_id, codigo=f"AG{agendamento_id:06d}")
+
+        return jsonify({
+            "msg": f"{len(livres)} agendamento(s) realizado(s) com sucesso!",
+            "cliente": cliente.nome,
+            "servico": servico.nome,
+            "barbeiro": barbeiro.nome,
+            "ocorrencias": resultado
+        }), 200
+
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Erro no agendamento recorrente: {str(e)}")
+        return jsonify({"erro": "Erro interno do servidor"}), 500
+
+# ROTA DE EVENTOS EM TEMPO REAL (SSE)
+@routes.route('/eventos', methods=['GET'])
+def eventos_agenda():
+    """Stream text/event-stream com agendamentos criados, cancelados e atualizados.
+
+    EventSource não envia cabeçalhos próprios, então a barbearia vem em
+    `barbearia_id` na query string. O navegador reenvia Last-Event-ID ao
+    reconectar; se algo se perdeu, chega um evento `recarregar`.
+    """
+    barbearia = get_barbearia()
+    if not barbearia:
+        return jsonify({"erro": "Barbearia não encontrada"}), 404
+
+    return Response(
+        fluxo_eventos(barbearia.id, request.headers.get('Last-Event-ID')),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+# ROTA PARA LISTAR AGENDAMENTOS
+@routes.route('/agendamentos', methods=['GET'])
+def listar_agendamentos():
+    """Agendamentos em ordem de horário (ver listagens.pagina_agendamentos).
+
+    Sem `limite` nem `cursor` devolve todos, como antes da paginação. Com eles,
+    o corpo continua sendo a lista e o cursor da próxima página, quando houver,
+    vem no cabeçalho X-Proximo-Cursor.
+    """
+    try:
+        barbearia_id = get_barbearia_id()
+        paginar = 'limite' in request.args or 'cursor' in request.args
         
-        return jsonify(resultado)
+        try:
+            linhas, proximo_cursor = pagina_agendamentos(barbearia_id, request.args, paginar)
+        except ParametroInvalido as e:
+            return jsonify({"erro": str(e)}), 400
+        
+        resposta = jsonify([{
+            "id": ag.id,
+            "cliente": ag.cliente,
+            "telefone": formatar_telefone(ag.telefone),
+            "email": ag.email,
+            "servico": ag.servico,
+            "barbeiro": ag.barbeiro,
+            "horario": ag.horario.isoformat(),
+            "status": ag.status,
+            "observacoes": ag.observacoes
+        } for ag in linhas])
+        if proximo_cursor:
+            resposta.headers['X-Proximo-Cursor'] = proximo_cursor
+        return resposta
     except Exception as e:
         logger.error(f"Erro ao listar agendamentos: {str(e)}")
         return jsonify({"erro": "Erro interno do servidor"}), 500
@@ -390,20 +768,22 @@ def cancelar_agendamento(agendamento_id):
         if agendamento.status == 'cancelado':
             return jsonify({"erro": "Agendamento já está cancelado"}), 400
         
+        status_anterior = agendamento.status
         agendamento.status = 'cancelado'
+        devolver_agendamento(agendamento)
+        registrar_mudanca_status(agendamento, status_anterior, agendamento.servico_info.preco)
+        notificar_agendamento(
+            'agendamento_cancelado', agendamento.id, barbearia_id,
+            agendamento.barbeiro_id, agendamento.horario, agendamento.status
+        )
+
+        # Aviso por WhatsApp vai para o outbox, no mesmo commit do cancelamento
+        contexto = get_contexto()
+        config = contexto.configuracao if contexto else None
+        if config and config.whatsapp_ativo:
+            enfileirar(barbearia_id, 'cancelamento_agendamento', agendamento.id)
         db.session.commit()
-        
-        # ✅ WHATSAPP CANCELAMENTO
-        try:
-            config = ConfiguracaoBarbearia.query.filter_by(barbearia_id=barbearia_id).first()
-            barbearia = BarbeariaCliente.query.get(barbearia_id)
-            
-            if config and config.whatsapp_ativo:
-                whatsapp_service.enviar_cancelamento(
-                    agendamento, agendamento.cliente_info, barbearia
-                )
-        except Exception as e:
-            logger.error(f"Erro WhatsApp cancelamento: {str(e)}")
+        invalidar_disponibilidade(barbearia_id, agendamento.barbeiro_id, agendamento.horario.date())
         
         return jsonify({
             "msg": "Agendamento cancelado com sucesso",
@@ -421,29 +801,19 @@ def estatisticas():
     try:
         barbearia_id = get_barbearia_id()
         
-        # Agendamentos do mês
-        inicio_mes = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0)
-        agendamentos_mes = Agendamento.query.filter(
-            Agendamento.barbearia_id == barbearia_id,
-            Agendamento.data_criacao >= inicio_mes
-        ).count()
+        # Agendamentos do mês e de hoje vêm dos resumos diários (pelo dia do atendimento)
+        hoje = datetime.utcnow().date()
+        inicio_mes, fim_mes = mes_corrente(hoje)
+        contexto = get_contexto()
         
         # Clientes cadastrados
         total_clientes = Cliente.query.filter_by(barbearia_id=barbearia_id).count()
         
-        # Agendamentos de hoje
-        hoje = datetime.utcnow().date()
-        agendamentos_hoje = Agendamento.query.filter(
-            Agendamento.barbearia_id == barbearia_id,
-            func.date(Agendamento.horario) == hoje,
-            Agendamento.status == 'confirmado'
-        ).count()
-        
         return jsonify({
-            "agendamentos_mes": agendamentos_mes,
+            "agendamentos_mes": resumo_periodo(barbearia_id, inicio_mes, fim_mes)["agendamentos"],
             "total_clientes": total_clientes,
-            "agendamentos_hoje": agendamentos_hoje,
-            "barbeiros_ativos": Barbeiro.query.filter_by(barbearia_id=barbearia_id, ativo=True).count()
+            "agendamentos_hoje": resumo_periodo(barbearia_id, hoje, hoje)["confirmados"],
+            "barbeiros_ativos": len(contexto.barbeiros) if contexto else 0
         })
         
     except Exception as e:
@@ -453,36 +823,59 @@ def estatisticas():
 # ROTA PARA DASHBOARD
 @routes.route('/api/dashboard-data', methods=['GET'])
 def dashboard_data():
+    """Faturamento (total e por barbeiro) e agenda de hoje.
+
+    Período opcional em `de`/`ate` (YYYY-MM-DD, inclusivos) sobre o dia do
+    atendimento; o padrão é o mês corrente. Os totais vêm dos resumos diários.
+    """
     try:
         barbearia_id = get_barbearia_id()
-        
-        # Faturamento do mês (simulado)
-        agendamentos_mes = Agendamento.query.filter(
-            Agendamento.barbearia_id == barbearia_id,
-            Agendamento.data_criacao >= datetime.utcnow().replace(day=1)
-        ).all()
-        
-        faturamento_mes = sum(ag.servico_info.preco for ag in agendamentos_mes if ag.status == 'confirmado')
-        
-        # Agendamentos de hoje
-        hoje = datetime.utcnow().date()
-        agendamentos_hoje = Agendamento.query.filter(
+        de_str = request.args.get('de')
+        ate_str = request.args.get('ate')
+
+        inicio_mes, fim_mes = mes_corrente()
+        try:
+            de = datetime.strptime(de_str, '%Y-%m-%d').date() if de_str else inicio_mes
+            ate = datetime.strptime(ate_str, '%Y-%m-%d').date() if ate_str else fim_mes
+        except ValueError:
+            return jsonify({"erro": "Formato de data inválido. Use YYYY-MM-DD"}), 400
+
+        por_barbeiro = resumo_por_barbeiro(barbearia_id, de, ate)
+        faturamento_mes = sum(faturamento for _, _, _, faturamento in por_barbeiro)
+        
+        # Agendamentos de hoje: só as colunas exibidas, já com os nomes
+        inicio_hoje, fim_hoje = intervalo_do_dia(datetime.utcnow().date())
+        agendamentos_hoje = db.session.query(
+            Agendamento.horario, Cliente.nome, Servico.nome, Barbeiro.nome
+        ).join(
+            Cliente, Agendamento.cliente_id == Cliente.id
+        ).join(
+            Servico, Agendamento.servico_id == Servico.id
+        ).join(
+            Barbeiro, Agendamento.barbeiro_id == Barbeiro.id
+        ).filter(
             Agendamento.barbearia_id == barbearia_id,
-            func.date(Agendamento.horario) == hoje,
+            Agendamento.horario >= inicio_hoje,
+            Agendamento.horario < fim_hoje,
             Agendamento.status == 'confirmado'
-        ).all()
+        ).order_by(Agendamento.horario).all()
         
-        agendamentos_hoje_lista = []
-        for ag in agendamentos_hoje:
-            agendamentos_hoje_lista.append({
-                "horario": ag.horario.strftime("%H:%M"),
-                "cliente": ag.cliente_info.nome,
-                "servico": ag.servico_info.nome,
-                "barbeiro": ag.barbeiro_info.nome
-            })
+        agendamentos_hoje_lista = [{
+            "horario": horario.strftime("%H:%M"),
+            "cliente": cliente,
+            "servico": servico,
+            "barbeiro": barbeiro
+        } for horario, cliente, servico, barbeiro in agendamentos_hoje]
         
         return jsonify({
             "faturamento_mes": faturamento_mes,
+            "faturamento_por_barbeiro": [{
+                "barbeiro_id": b_id,
+                "barbeiro": nome,
+                "agendamentos": total,
+                "faturamento": faturamento
+            } for b_id, nome, total, faturamento in por_barbeiro],
+            "periodo": {"de": de.isoformat(), "ate": ate.isoformat()},
             "agendamentos_hoje": len(agendamentos_hoje),
             "total_clientes": Cliente.query.filter_by(barbearia_id=barbearia_id).count(),
             "agendamentos_hoje_lista": agendamentos_hoje_lista
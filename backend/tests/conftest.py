@@ -0,0 +1,58 @@
+# tests/conftest.py
+# App Flask com SQLite em memória e uma barbearia de exemplo.
+#
+#   cd backend && python -m pytest
+import pytest
+from flask import Flask
+from models import db, PlanoAssinatura, BarbeariaCliente, Barbeiro, Servico, Cliente, ConfiguracaoBarbearia
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    app.config['SECRET_KEY'] = 'chave-de-teste'
+    app.config['TESTING'] = True
+    db.init_app(app)
+
+    import routes
+    import main_routes
+    from auth_routes import auth_routes
+    from admin_routes import admin_routes
+    app.register_blueprint(routes.routes)
+    # main_routes também chama seu blueprint de 'routes'
+    app.register_blueprint(main_routes.routes, name='main_routes')
+    app.register_blueprint(auth_routes)
+    app.register_blueprint(admin_routes)
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def barbearia(app):
+    """Barbearia 'ze' com dois barbeiros, serviços de 30 e 60 min e um cliente"""
+    plano = PlanoAssinatura(nome='Start', preco_mensal=150, limite_barbeiros=5, limite_agendamentos=1000)
+    db.session.add(plano)
+    db.session.flush()
+
+    barbearia = BarbeariaCliente(
+        nome='Barbearia do Zé', email='ze@gplan.com.br', telefone='11999999999',
+        dominio='ze', plano_id=plano.id, ativo=True
+    )
+    db.session.add(barbearia)
+    db.session.flush()
+
+    db.session.add_all([
+        Barbeiro(barbearia_id=barbearia.id, nome='João'),
+        Barbeiro(barbearia_id=barbearia.id, nome='Pedro'),
+        Servico(barbearia_id=barbearia.id, nome='Corte', duracao_minutos=30, preco=30.0),
+        Servico(barbearia_id=barbearia.id, nome='Corte e Barba', duracao_minutos=60, preco=50.0),
+        Cliente(barbearia_id=barbearia.id, nome='Carlos', telefone='11988887777'),
+        ConfiguracaoBarbearia(barbearia_id=barbearia.id)
+    ])
+    db.session.commit()
+    return barbearia
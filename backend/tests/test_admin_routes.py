@@ -0,0 +1,36 @@
+# tests/test_admin_routes.py
+import pytest
+from models import db, AdminUser
+from auth_routes import gerar_token_admin
+from utils import codificar_cursor
+
+
+@pytest.fixture
+def cabecalhos_admin(app):
+    admin = AdminUser(username='admin', password_hash='-', email='admin@gplan.com.br')
+    db.session.add(admin)
+    db.session.commit()
+    return {'Authorization': f'Bearer {gerar_token_admin(admin)}'}
+
+
+@pytest.mark.parametrize('ordenar, cursor', [
+    ('data_criacao', codificar_cursor('ontem', 1)),
+    ('data_expiracao', codificar_cursor(None, 1)),
+    ('data_criacao', codificar_cursor('2030-01-07T00:00:00', 'um')),
+    ('nome', codificar_cursor(42, 1)),
+    ('nome', 'nao-e-cursor'),
+])
+def test_cursor_com_valores_invalidos_e_400(app, barbearia, cabecalhos_admin, ordenar, cursor):
+    resposta = app.test_client().get(
+        '/admin/barbearias', query_string={'ordenar': ordenar, 'cursor': cursor}, headers=cabecalhos_admin
+    )
+    assert resposta.status_code == 400
+    assert resposta.json == {"erro": "Cursor inválido"}
+
+
+def test_cursor_valido_continua_a_listagem(app, barbearia, cabecalhos_admin):
+    resposta = app.test_client().get(
+        '/admin/barbearias', query_string={'ordenar': 'nome', 'cursor': codificar_cursor('A', 0)}, headers=cabecalhos_admin
+    )
+    assert resposta.status_code == 200
+    assert [b['nome'] for b in resposta.json['barbearias']] == ['Barbearia do Zé']
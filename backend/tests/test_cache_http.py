@@ -0,0 +1,51 @@
+# tests/test_cache_http.py
+# Revalidação (If-None-Match) responde 304 pela versão em memória, sem consultar o
+# banco, mesmo quando o contexto da barbearia já saiu do cache.
+from sqlalchemy import event
+from models import db, Servico
+from contexto_barbearia import cache_contextos
+
+
+def contar_consultas(funcao):
+    consultas = []
+
+    def contar(conn, cursor, statement, parameters, context, executemany):
+        consultas.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', contar)
+    try:
+        resposta = funcao()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', contar)
+    return resposta, len(consultas)
+
+
+def test_revalidacao_sem_consulta_com_contexto_fora_do_cache(app, barbearia):
+    cliente = app.test_client()
+    cabecalhos = {'X-Barbearia-ID': str(barbearia.id)}
+
+    for url in ('/barbeiros', '/servicos', '/api/barbearias/ze'):
+        resposta = cliente.get(url, headers=cabecalhos)
+        assert resposta.status_code == 200
+        etag = resposta.headers['ETag']
+
+        cache_contextos.limpar()
+        resposta, consultas = contar_consultas(
+            lambda: cliente.get(url, headers={**cabecalhos, 'If-None-Match': etag})
+        )
+        assert resposta.status_code == 304, url
+        assert consultas == 0, url
+
+
+def test_alteracao_muda_o_etag(app, barbearia):
+    cliente = app.test_client()
+    cabecalhos = {'X-Barbearia-ID': str(barbearia.id)}
+    etags = {url: cliente.get(url, headers=cabecalhos).headers['ETag'] for url in ('/servicos', '/api/barbearias/ze')}
+
+    db.session.add(Servico(barbearia_id=barbearia.id, nome='Barba', duracao_minutos=30, preco=25.0))
+    db.session.commit()
+
+    for url, etag in etags.items():
+        resposta = cliente.get(url, headers={**cabecalhos, 'If-None-Match': etag})
+        assert resposta.status_code == 200, url
+        assert resposta.headers['ETag'] != etag
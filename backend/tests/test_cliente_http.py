@@ -0,0 +1,170 @@
+# tests/test_cliente_http.py
+# ClienteHTTP contra um servidor HTTP local: reuso de conexão, novas tentativas
+# com backoff e o ciclo do disjuntor (aberto -> meio-aberto -> fechado).
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+import cliente_http
+from cliente_http import ClienteHTTP, Disjuntor, CircuitoAberto
+
+
+class ApiStub(BaseHTTPRequestHandler):
+    """Responde na ordem os status de `roteiro` (200 quando vazio) e anota a
+    conexão (porta do cliente) de cada requisição. `atraso` segura a resposta."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        servidor = self.server
+        with servidor.lock:
+            servidor.conexoes.append(self.client_address[1])
+            status = servidor.roteiro.pop(0) if servidor.roteiro else 200
+        if servidor.atraso:
+            time.sleep(servidor.atraso)
+
+        corpo = b'{}'
+        self.send_response(status)
+        if status == 429:
+            self.send_header('Retry-After', '2')
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def api():
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), ApiStub)
+    servidor.daemon_threads = True
+    servidor.lock = threading.Lock()
+    servidor.conexoes = []
+    servidor.roteiro = []
+    servidor.atraso = 0
+    servidor.url = f"http://127.0.0.1:{servidor.server_port}/mensagens"
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    yield servidor
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def aguardar_meio_aberto(disjuntor):
+    limite = time.monotonic() + 2
+    while disjuntor.estado != 'meio_aberto':
+        assert time.monotonic() < limite
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def esperas(monkeypatch):
+    """Esperas de backoff pedidas pelo cliente (sem dormir de verdade)"""
+    pedidas = []
+    monkeypatch.setattr(cliente_http.time, 'sleep', pedidas.append)
+    return pedidas
+
+
+def test_chamadas_em_sequencia_reusam_a_conexao(api):
+    cliente = ClienteHTTP('teste', pool=2)
+    for _ in range(20):
+        assert cliente.post(api.url, json={}).status_code == 200
+
+    assert len(api.conexoes) == 20
+    assert len(set(api.conexoes)) == 1
+
+
+def test_chamadas_concorrentes_respeitam_o_pool(api):
+    cliente = ClienteHTTP('teste', pool=2)
+    threads = [threading.Thread(target=lambda: [cliente.post(api.url) for _ in range(10)]) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(api.conexoes) == 80
+    assert len(set(api.conexoes)) <= 2
+
+
+def test_repete_5xx_e_429_com_backoff(api, esperas):
+    cliente = ClienteHTTP('teste', tentativas=3, espera_base=0.5)
+    api.roteiro[:] = [503, 429]
+
+    assert cliente.post(api.url).status_code == 200
+    assert len(api.conexoes) == 3
+    # Backoff exponencial com jitter na 1ª; Retry-After do 429 na 2ª
+    assert 0 <= esperas[0] <= 0.5
+    assert esperas[1] == 2
+    assert cliente.estatisticas()['contadores'] == {'status_503': 1, 'status_429': 1, 'status_200': 1, 'novas_tentativas': 2}
+
+
+def test_desiste_depois_das_tentativas_e_nao_repete_4xx(api, esperas):
+    cliente = ClienteHTTP('teste', tentativas=3)
+    api.roteiro[:] = [500, 502, 504, 400]
+
+    assert cliente.post(api.url).status_code == 504
+    assert cliente.post(api.url).status_code == 400
+    assert len(api.conexoes) == 4
+    assert len(esperas) == 2
+
+
+def test_repete_erro_de_conexao(esperas):
+    cliente = ClienteHTTP('teste', tentativas=3, disjuntor=Disjuntor(limite_falhas=1))
+
+    with pytest.raises(requests.ConnectionError):
+        cliente.post('http://127.0.0.1:1/mensagens')
+    assert cliente.estatisticas()['contadores'] == {'erros_rede': 3, 'novas_tentativas': 2}
+    assert len(esperas) == 2
+    assert cliente.disjuntor.estado == 'aberto'
+
+
+def test_timeout_de_leitura_nao_e_repetido(api):
+    # O servidor pode ter aceitado a mensagem: repetir poderia duplicá-la
+    api.atraso = 0.5
+    cliente = ClienteHTTP('teste', timeout=(1, 0.1), tentativas=3)
+
+    with pytest.raises(requests.ReadTimeout):
+        cliente.post(api.url)
+    assert len(api.conexoes) == 1
+
+
+def test_disjuntor_abre_testa_e_fecha(api):
+    cliente = ClienteHTTP('teste', tentativas=1, disjuntor=Disjuntor(limite_falhas=2, tempo_aberto=0.2))
+
+    api.roteiro[:] = [503, 503]
+    cliente.post(api.url)
+    assert cliente.disjuntor.estado == 'fechado'
+    cliente.post(api.url)
+    assert cliente.disjuntor.estado == 'aberto'
+
+    # Aberto: falha na hora, sem chegar ao servidor
+    with pytest.raises(CircuitoAberto):
+        cliente.post(api.url)
+    assert len(api.conexoes) == 2
+
+    # Meio-aberto: uma chamada de teste; se falhar, reabre
+    aguardar_meio_aberto(cliente.disjuntor)
+    api.roteiro[:] = [503]
+    cliente.post(api.url)
+    assert cliente.disjuntor.estado == 'aberto'
+    with pytest.raises(CircuitoAberto):
+        cliente.post(api.url)
+
+    # Chamada de teste com sucesso fecha o circuito
+    aguardar_meio_aberto(cliente.disjuntor)
+    assert cliente.post(api.url).status_code == 200
+    assert cliente.disjuntor.estado == 'fechado'
+    assert len(api.conexoes) == 4
+    assert cliente.estatisticas()['contadores']['rejeitadas_circuito'] == 2
+
+
+def test_meio_aberto_deixa_passar_uma_chamada_por_vez():
+    disjuntor = Disjuntor(limite_falhas=1, tempo_aberto=0)
+    disjuntor.registrar_falha()
+
+    assert disjuntor.permitir()
+    assert not disjuntor.permitir()
+    disjuntor.registrar_sucesso()
+    assert disjuntor.permitir()
@@ -0,0 +1,97 @@
+# tests/test_indices.py
+# As consultas quentes de Agendamento precisam usar os índices ix_agendamento_*.
+# Cada teste captura o SQL real emitido pela função (ou rota) e roda
+# EXPLAIN QUERY PLAN com os mesmos parâmetros.
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from models import db
+from disponibilidade import carregar_ocupacoes_por_barbeiro, buscar_conflito
+from listagens import pagina_agendamentos
+from uso_mensal import agendamentos_no_mes
+
+
+@contextmanager
+def consultas_capturadas():
+    capturadas = []
+
+    def capturar(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            capturadas.append((statement, parameters))
+
+    motor = db.engine
+    event.listen(motor, 'before_cursor_execute', capturar)
+    try:
+        yield capturadas
+    finally:
+        event.remove(motor, 'before_cursor_execute', capturar)
+
+
+def plano(statement, parameters):
+    with db.engine.connect() as conn:
+        linhas = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+    return ' | '.join(linha[-1] for linha in linhas)
+
+
+def usa_indice(p, *indices):
+    """O plano busca agendamento por um dos índices (SEARCH), sem varrer a tabela"""
+    return any(f"USING INDEX {i} " in p or f"USING COVERING INDEX {i} " in p for i in indices) \
+        and 'SCAN agendamento' not in p
+
+
+def planos_agendamento(capturadas):
+    """Planos das consultas que leem a tabela agendamento"""
+    return [plano(s, p) for s, p in capturadas if 'FROM agendamento' in s]
+
+
+def test_ocupacoes_da_disponibilidade_usam_indice_do_barbeiro(barbearia):
+    inicio = datetime(2030, 1, 7, 8)
+    with consultas_capturadas() as capturadas:
+        carregar_ocupacoes_por_barbeiro([1, 2], inicio, inicio + timedelta(days=1))
+        buscar_conflito(1, inicio, inicio + timedelta(minutes=30))
+
+    planos = planos_agendamento(capturadas)
+    assert len(planos) == 2
+    for p in planos:
+        # Igualdade no barbeiro (e status) e faixa em horario
+        assert usa_indice(p, 'ix_agendamento_barbeiro_horario_fim', 'ix_agendamento_barbeiro_status_horario'), p
+        assert 'horario>' in p, p
+
+
+def test_agenda_do_dia_no_dashboard_usa_indice_barbearia_horario(app, barbearia):
+    cliente = app.test_client()
+    with consultas_capturadas() as capturadas:
+        resposta = cliente.get('/api/dashboard-data', headers={'X-Barbearia-ID': str(barbearia.id)})
+    assert resposta.status_code == 200
+
+    planos = planos_agendamento(capturadas)
+    assert planos
+    assert all(usa_indice(p, 'ix_agendamento_barbearia_horario') for p in planos), planos
+
+
+def test_listagem_usa_indice_barbearia_horario(barbearia):
+    with consultas_capturadas() as capturadas:
+        pagina_agendamentos(barbearia.id, {'de': '2030-01-07', 'ate': '2030-01-13'})
+
+    planos = planos_agendamento(capturadas)
+    assert len(planos) == 1
+    assert usa_indice(planos[0], 'ix_agendamento_barbearia_horario'), planos[0]
+
+
+def test_listagem_por_barbeiro_e_status_usa_indice_do_barbeiro(barbearia):
+    with consultas_capturadas() as capturadas:
+        pagina_agendamentos(barbearia.id, {'barbeiro_id': '1', 'status': 'confirmado', 'data': '2030-01-07'})
+
+    planos = planos_agendamento(capturadas)
+    assert len(planos) == 1
+    assert usa_indice(planos[0], 'ix_agendamento_barbeiro_status_horario'), planos[0]
+
+
+def test_contagem_mensal_usa_indice_data_criacao(barbearia):
+    with consultas_capturadas() as capturadas:
+        agendamentos_no_mes(barbearia.id)
+
+    planos = planos_agendamento(capturadas)
+    assert planos
+    for p in planos:
+        assert usa_indice(p, 'ix_agendamento_barbearia_data_criacao'), p
@@ -0,0 +1,40 @@
+# tests/test_listagens.py
+from datetime import datetime, timedelta
+from models import db, Agendamento
+
+
+def criar_agendamentos(barbearia, quantidade):
+    inicio = datetime(2030, 1, 7, 8)
+    db.session.add_all([
+        Agendamento(
+            barbearia_id=barbearia.id, cliente_id=1, barbeiro_id=1 + n % 2, servico_id=1,
+            horario=inicio + timedelta(minutes=30 * n), fim=inicio + timedelta(minutes=30 * n + 30)
+        )
+        for n in range(quantidade)
+    ])
+    db.session.commit()
+
+
+def test_sem_limite_nem_cursor_devolve_todos(app, barbearia):
+    criar_agendamentos(barbearia, 60)
+    resposta = app.test_client().get('/agendamentos', headers={'X-Barbearia-ID': str(barbearia.id)})
+
+    assert resposta.status_code == 200
+    assert len(resposta.json) == 60
+    assert 'X-Proximo-Cursor' not in resposta.headers
+
+
+def test_paginas_pelo_cursor_do_cabecalho(app, barbearia):
+    criar_agendamentos(barbearia, 60)
+    cliente = app.test_client()
+    cabecalhos = {'X-Barbearia-ID': str(barbearia.id)}
+
+    primeira = cliente.get('/agendamentos?limite=50', headers=cabecalhos)
+    assert len(primeira.json) == 50
+    cursor = primeira.headers['X-Proximo-Cursor']
+
+    segunda = cliente.get('/agendamentos', query_string={'limite': 50, 'cursor': cursor}, headers=cabecalhos)
+    assert len(segunda.json) == 10
+    assert 'X-Proximo-Cursor' not in segunda.headers
+    ids = [a['id'] for a in primeira.json + segunda.json]
+    assert len(set(ids)) == 60
@@ -0,0 +1,93 @@
+# tests/test_pre_reservas.py
+from datetime import datetime, timedelta
+from pre_reservas import PreReservas
+
+
+def test_pre_reserva_que_passa_da_meia_noite_aparece_nos_dois_dias():
+    pre_reservas = PreReservas()
+    inicio = datetime(2030, 1, 7, 23, 30)
+    pre = pre_reservas.criar(1, 1, inicio, inicio + timedelta(hours=1))
+    assert pre
+
+    dia_seguinte = inicio.date() + timedelta(days=1)
+    assert pre_reservas.intervalos(1, 1, dia_seguinte) == [(pre.inicio, pre.fim)]
+    assert pre_reservas.conflito(1, 1, datetime(2030, 1, 8, 0, 0), datetime(2030, 1, 8, 0, 30))
+    assert pre_reservas.criar(1, 1, datetime(2030, 1, 8, 0, 0), datetime(2030, 1, 8, 0, 30)) is None
+    assert pre_reservas.criar(1, 1, datetime(2030, 1, 8, 0, 30), datetime(2030, 1, 8, 1, 0))
+
+    pre_reservas.liberar(pre.token)
+    assert pre_reservas.intervalos(1, 1, dia_seguinte) == [(datetime(2030, 1, 8, 0, 30), datetime(2030, 1, 8, 1, 0))]
+    assert pre_reservas.intervalos(1, 1, inicio.date()) == []
+
+
+def test_pre_reserva_ate_a_meia_noite_nao_ocupa_o_dia_seguinte():
+    pre_reservas = PreReservas()
+    pre_reservas.criar(1, 1, datetime(2030, 1, 7, 23, 30), datetime(2030, 1, 8, 0, 0))
+
+    assert pre_reservas.intervalos(1, 1, datetime(2030, 1, 8).date()) == []
+
+
+def test_nova_pre_reserva_do_mesmo_dono_substitui_a_anterior():
+    pre_reservas = PreReservas()
+    inicio = datetime(2030, 1, 7, 10, 0)
+    primeira = pre_reservas.criar(1, 1, inicio, inicio + timedelta(minutes=30), dono='10.0.0.1')
+
+    # Pode trocar por um horário que sobrepõe a própria pré-reserva
+    segunda = pre_reservas.criar(1, 1, inicio + timedelta(minutes=15), inicio + timedelta(minutes=45), dono='10.0.0.1')
+    assert segunda
+    assert pre_reservas.obter(primeira.token) is None
+    assert pre_reservas.intervalos(1, 1, inicio.date()) == [(segunda.inicio, segunda.fim)]
+
+    # Outro dono não passa por cima
+    assert pre_reservas.criar(1, 1, inicio, inicio + timedelta(minutes=30), dono='10.0.0.2') is None
+    assert pre_reservas.criar(1, 2, inicio, inicio + timedelta(minutes=30), dono='10.0.0.2')
+    # Em outra barbearia o mesmo dono tem a sua
+    assert pre_reservas.criar(2, 3, inicio, inicio + timedelta(minutes=30), dono='10.0.0.1')
+    assert pre_reservas.obter(segunda.token)
+
+
+def test_rota_mantem_uma_pre_reserva_por_cliente(app, barbearia):
+    dia = (datetime.utcnow() + timedelta(days=7)).date()
+    cliente = app.test_client()
+
+    def pre_reservar(hora, ip):
+        return cliente.post('/pre-reservas', headers={'X-Barbearia-ID': str(barbearia.id)},
+                            environ_base={'REMOTE_ADDR': ip},
+                            json={"servico_id": 1, "barbeiro_id": 1, "horario": f"{dia.isoformat()}T{hora}:00"})
+
+    for hora in ('09:00', '10:00', '11:00', '12:00'):
+        resposta = pre_reservar(hora, '10.0.0.1')
+        assert resposta.status_code == 201
+    assert pre_reservar('12:00', '10.0.0.2').status_code == 409
+
+    livres = cliente.get(f'/horarios-disponiveis?barbeiro_id=1&servico_id=1&data={dia.isoformat()}',
+                         headers={'X-Barbearia-ID': str(barbearia.id)}).json['horarios_disponiveis']
+    assert {'09:00', '10:00', '11:00'} <= set(livres)
+    assert '12:00' not in livres
+
+    assert cliente.delete(f"/pre-reservas/{resposta.json['pre_reserva']}",
+                          headers={'X-Barbearia-ID': str(barbearia.id)}).status_code == 200
+
+
+def test_agendamento_so_libera_a_pre_reserva_do_mesmo_horario(app, barbearia):
+    from pre_reservas import pre_reservas
+    dia = (datetime.utcnow() + timedelta(days=8)).date()
+    cliente = app.test_client()
+    cabecalhos = {'X-Barbearia-ID': str(barbearia.id)}
+
+    token = cliente.post('/pre-reservas', headers=cabecalhos, json={
+        "servico_id": 1, "barbeiro_id": 1, "horario": f"{dia.isoformat()}T09:00:00"
+    }).json['pre_reserva']
+
+    def agendar(hora, n):
+        return cliente.post('/agendar', headers=cabecalhos, json={
+            "nome": f"Cliente {n}", "telefone": f"1197777000{n}", "servico_id": 1, "barbeiro_id": 1,
+            "horario": f"{dia.isoformat()}T{hora}:00", "pre_reserva": token
+        })
+
+    # Outro horário com o token: a pré-reserva das 09:00 continua de pé
+    assert agendar('10:00', 1).status_code == 200
+    assert pre_reservas.obter(token)
+
+    assert agendar('09:00', 2).status_code == 200
+    assert pre_reservas.obter(token) is None
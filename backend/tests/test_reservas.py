@@ -0,0 +1,125 @@
+# tests/test_reservas.py
+from datetime import datetime, timedelta, time
+import pytest
+from models import db, Agendamento, ConfiguracaoBarbearia, Servico
+from reservas import reservar_intervalos, HorarioIndisponivel
+import benchmark_reservas
+
+
+@pytest.fixture
+def dia():
+    return (datetime.utcnow() + timedelta(days=7)).date()
+
+
+def configurar(barbearia, abertura, intervalo):
+    config = ConfiguracaoBarbearia.query.filter_by(barbearia_id=barbearia.id).first()
+    config.horario_abertura = abertura
+    config.intervalo_agendamento = intervalo
+    db.session.commit()
+
+
+def agendar(app, barbearia, horario, servico_id=1, barbeiro_id=1, n=0):
+    return app.test_client().post('/agendar', headers={'X-Barbearia-ID': str(barbearia.id)}, json={
+        "nome": f"Cliente {n}",
+        "telefone": f"1197777{n:04d}",
+        "servico_id": servico_id,
+        "barbeiro_id": barbeiro_id,
+        "horario": horario.isoformat()
+    })
+
+
+def livres(app, barbearia, dia, servico_id=1):
+    resposta = app.test_client().get(
+        f'/horarios-disponiveis?barbeiro_id=1&servico_id={servico_id}&data={dia.isoformat()}',
+        headers={'X-Barbearia-ID': str(barbearia.id)}
+    )
+    return resposta.json['horarios_disponiveis']
+
+
+def test_agendamentos_adjacentes_em_grade_de_20_minutos(app, barbearia, dia):
+    configurar(barbearia, time(8, 0), 20)
+    db.session.add(Servico(barbearia_id=barbearia.id, nome='Pezinho', duracao_minutos=20, preco=15.0))
+    db.session.commit()
+
+    assert agendar(app, barbearia, datetime.combine(dia, time(8, 0)), servico_id=3, n=1).status_code == 200
+    assert '08:20' in livres(app, barbearia, dia, servico_id=3)
+    assert agendar(app, barbearia, datetime.combine(dia, time(8, 20)), servico_id=3, n=2).status_code == 200
+    # Sobrepõe o das 08:20
+    assert agendar(app, barbearia, datetime.combine(dia, time(8, 30)), servico_id=1, n=3).status_code == 400
+
+
+def test_agendamentos_adjacentes_com_abertura_fora_do_quarto_de_hora(app, barbearia, dia):
+    configurar(barbearia, time(8, 10), 30)
+
+    for n, hora in enumerate([time(8, 10), time(8, 40), time(9, 10), time(9, 40)], start=1):
+        assert hora.strftime('%H:%M') in livres(app, barbearia, dia)
+        assert agendar(app, barbearia, datetime.combine(dia, hora), n=n).status_code == 200
+
+    # Serviço de 60 min às 08:40 sobrepõe dois já confirmados
+    assert agendar(app, barbearia, datetime.combine(dia, time(8, 40)), servico_id=2, n=9).status_code == 400
+    assert Agendamento.query.filter_by(status='confirmado').count() == 4
+
+
+def test_cancelado_nao_ocupa_o_horario(app, barbearia, dia):
+    horario = datetime.combine(dia, time(10, 0))
+    resposta = agendar(app, barbearia, horario, n=1)
+    assert resposta.status_code == 200
+
+    agendamento = Agendamento.query.filter_by(horario=horario).first()
+    agendamento.status = 'cancelado'
+    db.session.commit()
+
+    assert agendar(app, barbearia, horario + timedelta(minutes=10), n=2).status_code == 200
+
+
+def test_lista_com_sobreposicao_interna_e_recusada(barbearia, dia):
+    inicio = datetime.combine(dia, time(14, 0))
+    with pytest.raises(HorarioIndisponivel):
+        reservar_intervalos([
+            (1001, 1, inicio, inicio + timedelta(minutes=30)),
+            (1002, 1, inicio + timedelta(minutes=25), inicio + timedelta(minutes=55)),
+        ])
+    db.session.rollback()
+
+    # Outro barbeiro no mesmo horário não conflita
+    reservar_intervalos([
+        (1001, 1, inicio, inicio + timedelta(minutes=30)),
+        (1002, 2, inicio, inicio + timedelta(minutes=30)),
+    ])
+    db.session.rollback()
+
+
+def test_pedidos_concorrentes_no_mesmo_horario_aceitam_um_so():
+    assert benchmark_reservas.executar(requisicoes=60, threads=16)
+
+
+@pytest.mark.parametrize('regra', [
+    {"intervalo_dias": "semanal"},
+    {"ocorrencias": "doze"},
+    {"ocorrencias": None},
+])
+def test_regra_de_recorrencia_invalida_e_erro_do_cliente(app, barbearia, dia, regra):
+    resposta = app.test_client().post('/agendar/recorrente', headers={'X-Barbearia-ID': str(barbearia.id)}, json={
+        "nome": "Cliente", "telefone": "11977770001", "servico_id": 1, "barbeiro_id": 1,
+        "horario": datetime.combine(dia, time(10, 0)).isoformat(), **regra
+    })
+    assert resposta.status_code == 400
+    assert resposta.json == {"erro": "Regra de recorrência inválida"}
+
+
+@pytest.mark.parametrize('barbeiro_id', ['99', 'abc'])
+def test_barbeiro_desconhecido_e_recusado_sem_tocar_o_cache(app, barbearia, dia, barbeiro_id):
+    from disponibilidade import cache_disponibilidade
+    cliente = app.test_client()
+    cabecalhos = {'X-Barbearia-ID': str(barbearia.id)}
+    itens = cache_disponibilidade.estatisticas()['itens']
+
+    for url in (
+        f'/horarios-disponiveis?barbeiro_id={barbeiro_id}&data={dia.isoformat()}',
+        f'/horarios-disponiveis?barbeiro_id={barbeiro_id}&de={dia.isoformat()}&ate={(dia + timedelta(days=30)).isoformat()}',
+        f'/api/barbearias/ze/horarios-disponiveis?barbeiro_id={barbeiro_id}&data={dia.isoformat()}',
+    ):
+        resposta = cliente.get(url, headers=cabecalhos)
+        assert resposta.status_code == 400, url
+        assert resposta.json == {"erro": "Barbeiro inválido"}, url
+    assert cache_disponibilidade.estatisticas()['itens'] == itens
@@ -0,0 +1,72 @@
+# tests/test_whatsapp_service.py
+# Registro de serviços WhatsApp por barbearia: configuração da aplicação e
+# fechamento das conexões de quem sai do registro.
+import pytest
+import requests
+from models import db, BarbeariaCliente, ConfiguracaoBarbearia
+from whatsapp_service import servico_whatsapp, servico_plataforma, registro_whatsapp
+
+
+@pytest.fixture
+def sessoes_fechadas(monkeypatch):
+    fechadas = []
+    monkeypatch.setattr(requests.Session, 'close', lambda sessao: fechadas.append(sessao))
+    registro_whatsapp.limpar()
+    yield fechadas
+    registro_whatsapp.limpar()
+
+
+def numero_proprio(barbearia_id, numero):
+    config = ConfiguracaoBarbearia.query.filter_by(barbearia_id=barbearia_id).first()
+    config.whatsapp_numero = numero
+    config.whatsapp_token = 'token'
+    db.session.commit()
+
+
+def outra_barbearia(barbearia, dominio):
+    outra = BarbeariaCliente(
+        nome=dominio, email=f'{dominio}@gplan.com.br', telefone='11999990000',
+        dominio=dominio, plano_id=barbearia.plano_id
+    )
+    db.session.add(outra)
+    db.session.flush()
+    db.session.add(ConfiguracaoBarbearia(barbearia_id=outra.id))
+    db.session.commit()
+    return outra
+
+
+def test_numero_proprio_usa_a_configuracao_da_aplicacao(app, barbearia, sessoes_fechadas):
+    app.config.update(
+        WHATSAPP_MENSAGENS_POR_SEGUNDO=7, WHATSAPP_RAJADA=3,
+        WHATSAPP_POOL_CONEXOES_BARBEARIA=4, WHATSAPP_TIMEOUT_CONEXAO=1, WHATSAPP_TIMEOUT_LEITURA=5
+    )
+    numero_proprio(barbearia.id, '5511000000701')
+
+    servico = servico_whatsapp(barbearia.id)
+    assert servico is not servico_plataforma()
+    assert (servico.balde.taxa, servico.balde.capacidade) == (7, 3)
+    assert servico.cliente.pool == 4
+    assert servico.cliente.timeout == (1, 5)
+
+
+def test_servico_que_sai_do_registro_fecha_a_sessao(app, barbearia, sessoes_fechadas, monkeypatch):
+    monkeypatch.setattr(registro_whatsapp, 'max_itens', 1)
+    numero_proprio(barbearia.id, '5511000000702')
+    proprio = servico_whatsapp(barbearia.id)
+
+    # Expulso do LRU por outra barbearia (que usa o número da plataforma)
+    servico_whatsapp(outra_barbearia(barbearia, 'outra').id)
+    assert sessoes_fechadas == [proprio.cliente.sessao]
+
+    # A plataforma nunca é fechada
+    servico_whatsapp(barbearia.id)
+    assert servico_plataforma().cliente.sessao not in sessoes_fechadas
+
+
+def test_credenciais_alteradas_fecham_a_sessao_anterior(app, barbearia, sessoes_fechadas):
+    numero_proprio(barbearia.id, '5511000000703')
+    anterior = servico_whatsapp(barbearia.id)
+
+    numero_proprio(barbearia.id, '5511000000704')
+    assert sessoes_fechadas == [anterior.cliente.sessao]
+    assert servico_whatsapp(barbearia.id).phone_number_id == '5511000000704'
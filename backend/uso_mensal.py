@@ -0,0 +1,178 @@
+# uso_mensal.py
+# Contadores de uso do plano (agendamentos por mês) mantidos na mesma transação
+# do agendamento/cancelamento. A reconciliação recalcula a partir da tabela de
+# agendamentos e corrige divergências:
+#
+#   python uso_mensal.py --mes 2024-05 [--somente-verificar]
+import argparse
+import logging
+from datetime import date, datetime
+from sqlalchemy import func, insert, update
+from sqlalchemy.exc import IntegrityError
+from models import db, Agendamento, UsoMensal
+
+logger = logging.getLogger(__name__)
+
+
+class LimitePlanoAtingido(Exception):
+    """O agendamento passaria do limite mensal do plano"""
+
+
+def inicio_do_mes(momento=None):
+    momento = momento or datetime.utcnow()
+    return date(momento.year, momento.month, 1)
+
+
+def _intervalo_do_mes(mes):
+    inicio = datetime(mes.year, mes.month, 1)
+    proximo = datetime(mes.year + mes.month // 12, mes.month % 12 + 1, 1)
+    return inicio, proximo
+
+
+def _filtro_mes(mes):
+    inicio, fim = _intervalo_do_mes(mes)
+    return (
+        Agendamento.data_criacao >= inicio,
+        Agendamento.data_criacao < fim,
+        Agendamento.status != 'cancelado'
+    )
+
+
+def contar_agendamentos_mes(barbearia_id, mes):
+    """Contagem direto na tabela de agendamentos (usada para semear e reconciliar)"""
+    return Agendamento.query.filter(Agendamento.barbearia_id == barbearia_id, *_filtro_mes(mes)).count()
+
+
+def agendamentos_no_mes(barbearia_id, mes=None):
+    """Uso registrado do mês; conta na fonte se a barbearia ainda não tem contador no mês"""
+    mes = mes or inicio_do_mes()
+    valor = db.session.query(UsoMensal.agendamentos).filter_by(barbearia_id=barbearia_id, mes=mes).scalar()
+    return valor if valor is not None else contar_agendamentos_mes(barbearia_id, mes)
+
+
+def _somar(barbearia_id, mes, quantidade, limite=None):
+    condicoes = [UsoMensal.barbearia_id == barbearia_id, UsoMensal.mes == mes]
+    if limite is not None:
+        condicoes.append(UsoMensal.agendamentos + quantidade <= limite)
+    resultado = db.session.execute(
+        update(UsoMensal).where(*condicoes).values(
+            agendamentos=UsoMensal.agendamentos + quantidade
+        ).execution_options(synchronize_session=False)
+    )
+    return resultado.rowcount == 1
+
+
+def _semear(barbearia_id, mes):
+    """Cria o contador do mês a partir da contagem na fonte"""
+    total = contar_agendamentos_mes(barbearia_id, mes)
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(UsoMensal).values(
+                barbearia_id=barbearia_id, mes=mes, agendamentos=total
+            ))
+    except IntegrityError:
+        pass  # outro pedido criou o contador primeiro
+
+
+def consumir_agendamentos(barbearia_id, quantidade=1, limite=None, mes=None):
+    """Soma `quantidade` ao uso do mês se couber em `limite` (None = sem limite).
+
+    O UPDATE condicional é atômico: dois pedidos simultâneos não passam do
+    limite. Deve rodar na transação do agendamento e antes do INSERT dele,
+    porque o primeiro uso do mês conta os agendamentos já gravados.
+    """
+    barbearia_id = int(barbearia_id)
+    mes = mes or inicio_do_mes()
+    if _somar(barbearia_id, mes, quantidade, limite):
+        return True
+
+    existe = db.session.query(UsoMensal.id).filter_by(barbearia_id=barbearia_id, mes=mes).first()
+    if existe:
+        return False
+
+    _semear(barbearia_id, mes)
+    return _somar(barbearia_id, mes, quantidade, limite)
+
+
+def devolver_agendamento(agendamento):
+    """Tira um agendamento cancelado do uso do mês em que foi criado"""
+    mes = inicio_do_mes(agendamento.data_criacao)
+    db.session.execute(
+        update(UsoMensal).where(
+            UsoMensal.barbearia_id == agendamento.barbearia_id,
+            UsoMensal.mes == mes,
+            UsoMensal.agendamentos > 0
+        ).values(
+            agendamentos=UsoMensal.agendamentos - 1
+        ).execution_options(synchronize_session=False)
+    )
+
+
+def reconciliar_uso_mensal(mes=None, corrigir=True):
+    """Recalcula o uso do mês a partir dos agendamentos e retorna as divergências.
+
+    Com `corrigir`, grava o valor recalculado; um contador que mudou durante a
+    reconciliação (agendamento concorrente) fica para a próxima execução.
+    """
+    mes = mes or inicio_do_mes()
+    reais = dict(
+        db.session.query(Agendamento.barbearia_id, func.count(Agendamento.id))
+        .filter(*_filtro_mes(mes))
+        .group_by(Agendamento.barbearia_id)
+        .all()
+    )
+    registrados = dict(
+        db.session.query(UsoMensal.barbearia_id, UsoMensal.agendamentos).filter_by(mes=mes).all()
+    )
+
+    divergencias = []
+    for barbearia_id in sorted(set(reais) | set(registrados)):
+        real = reais.get(barbearia_id, 0)
+        registrado = registrados.get(barbearia_id)
+        if registrado != real:
+            divergencias.append({
+                "barbearia_id": barbearia_id,
+                "mes": mes.isoformat(),
+                "registrado": registrado,
+                "real": real
+            })
+            logger.warning(f"⚠️ Uso divergente: barbearia {barbearia_id} em {mes:%m/%Y} registrado={registrado} real={real}")
+
+    if corrigir and divergencias:
+        for item in divergencias:
+            if item["registrado"] is None:
+                _semear(item["barbearia_id"], mes)
+            else:
+                db.session.execute(
+                    update(UsoMensal).where(
+                        UsoMensal.barbearia_id == item["barbearia_id"],
+                        UsoMensal.mes == mes,
+                        UsoMensal.agendamentos == item["registrado"]
+                    ).values(agendamentos=item["real"]).execution_options(synchronize_session=False)
+                )
+        db.session.commit()
+
+    return divergencias
+
+
+if __name__ == '__main__':
+    from flask import Flask
+    from config import Config
+
+    parser = argparse.ArgumentParser(description="Reconcilia os contadores de uso mensal com os agendamentos")
+    parser.add_argument('--mes', help="Mês no formato YYYY-MM (padrão: mês atual)")
+    parser.add_argument('--somente-verificar', action='store_true', help="Só reporta, não corrige")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    db.init_app(app)
+
+    with app.app_context():
+        mes = inicio_do_mes(datetime.strptime(args.mes, '%Y-%m')) if args.mes else None
+        divergencias = reconciliar_uso_mensal(mes, corrigir=not args.somente_verificar)
+
+    print(f"{len(divergencias)} divergência(s)")
+    for item in divergencias:
+        print(f"  barbearia {item['barbearia_id']}: registrado={item['registrado']} real={item['real']}")
@@ -1,6 +1,8 @@
+import base64
+import json
 import random
 import string
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from models import db, BarbeariaCliente
 
 def gerar_dominio_unico(nome_barbearia):
@@ -32,47 +34,27 @@ def validar_horario_funcionamento(horario, config_barbearia):
     return (config_barbearia.horario_abertura <= hora_agendamento <= 
             config_barbearia.horario_fechamento)
 
-def calcular_proximo_horario_disponivel(barbeiro_id, barbearia_id, duracao_minutos=30):
-    """Calcula o próximo horário disponível para um barbeiro"""
-    from models import Agendamento, ConfiguracaoBarbearia
+def calcular_proximo_horario_disponivel(barbeiro_id, barbearia_id, duracao_minutos=30, dias=14):
+    """Calcula o próximo horário disponível para um barbeiro (None se não houver vaga em `dias` dias)"""
+    from models import ConfiguracaoBarbearia
+    from disponibilidade import proximo_horario_livre
     
-    agora = datetime.now()
+    agora = datetime.utcnow()
     config = ConfiguracaoBarbearia.query.filter_by(barbearia_id=barbearia_id).first()
     
     if not config:
         return agora.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
     
-    # Começar no próximo intervalo
-    intervalo = config.intervalo_agendamento
-    minutos_ate_proximo = intervalo - (agora.minute % intervalo)
-    horario_candidato = agora.replace(second=0, microsecond=0) + timedelta(minutes=minutos_ate_proximo)
-    
-    # Verificar horário de funcionamento
-    while not validar_horario_funcionamento(horario_candidato, config):
-        horario_candidato += timedelta(minutes=intervalo)
-        # Se passar do fechamento, ir para o próximo dia
-        if horario_candidato.time() > config.horario_fechamento:
-            proximo_dia = horario_candidato.date() + timedelta(days=1)
-            horario_candidato = datetime.combine(proximo_dia, config.horario_abertura)
-    
-    # Verificar conflitos
-    while True:
-        conflito = Agendamento.query.filter_by(
-            barbeiro_id=barbeiro_id,
-            horario=horario_candidato
-        ).first()
-        
-        if not conflito:
-            break
-            
-        horario_candidato += timedelta(minutes=intervalo)
-        
-        # Verificar se ainda está no horário de funcionamento
-        if not validar_horario_funcionamento(horario_candidato, config):
-            proximo_dia = horario_candidato.date() + timedelta(days=1)
-            horario_candidato = datetime.combine(proximo_dia, config.horario_abertura)
-    
-    return horario_candidato
+    resultado = proximo_horario_livre(config, [barbeiro_id], duracao_minutos, agora, dias)
+    return resultado[1] if resultado else None
+
+def intervalo_do_dia(data):
+    """Faixa semiaberta [00:00 do dia, 00:00 do dia seguinte) para filtrar colunas DateTime.
+
+    Comparar a coluna com a faixa (em vez de func.date(coluna) == data) permite usar índices.
+    """
+    inicio = datetime.combine(data, datetime.min.time())
+    return inicio, inicio + timedelta(days=1)
 
 def formatar_telefone(telefone):
     """Formata número de telefone para exibição"""
@@ -114,4 +96,30 @@ def validar_horario(horario):
     """Valida formato de horário HH:MM"""
     import re
     padrao = r'^([0-1]?[0-9]|2[0-3]):[0-5][0-9]$'
-    return bool(re.match(padrao, horario))
\ No newline at end of file
+    return bool(re.match(padrao, horario))
+
+def converter_horario(horario):
+    """Converte data/hora ISO (YYYY-MM-DDTHH:MM[:SS][Z]) em datetime sem fuso; None se inválido"""
+    try:
+        horario_dt = datetime.fromisoformat(horario.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return None
+    
+    if horario_dt.tzinfo:
+        horario_dt = horario_dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return horario_dt
+
+def codificar_cursor(*valores):
+    """Cursor opaco (base64 de JSON) com os valores da última linha de uma página"""
+    dados = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in valores])
+    return base64.urlsafe_b64encode(dados.encode()).decode().rstrip('=')
+
+def decodificar_cursor(cursor, quantidade):
+    """Valores de um cursor de codificar_cursor; None se o cursor for inválido"""
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(valores, list) or len(valores) != quantidade:
+        return None
+    return valores
@@ -1,23 +1,181 @@
 # whatsapp_service.py
-import requests
+# Envio de mensagens pela WhatsApp Business Cloud API. Cada barbearia pode enviar
+# do próprio número (ConfiguracaoBarbearia.whatsapp_numero = phone_number_id e
+# whatsapp_token); sem credenciais próprias, usa o número da plataforma.
+# servico_whatsapp(barbearia_id) devolve o serviço certo, montado uma vez e
+# guardado num registro LRU, com pool de conexões, disjuntor e token bucket
+# próprios por número.
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from flask import current_app
-from models import db, Agendamento, BarbeariaCliente
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+from config import Config
+from models import db, ConfiguracaoBarbearia
+from cache import CacheLRU
+from cliente_http import BaldeTokens, ClienteHTTP, CircuitoAberto
 
 logger = logging.getLogger(__name__)
 
+# Uma sessão keep-alive por processo para o número da plataforma, compartilhada pelos workers
+cliente_whatsapp = ClienteHTTP(
+    'whatsapp',
+    pool=Config.WHATSAPP_POOL_CONEXOES,
+    timeout=(Config.WHATSAPP_TIMEOUT_CONEXAO, Config.WHATSAPP_TIMEOUT_LEITURA)
+)
+
+# O limite de envio da API é por número remetente: todos os envios do mesmo
+# phone_number_id neste processo dividem um token bucket
+_baldes = CacheLRU(max_itens=4096)
+_baldes_lock = threading.Lock()
+
+
+def _fechar_conexoes(servico):
+    # Serviço que sai do registro (expulso, expirado ou invalidado): fecha o pool do
+    # número próprio. Um envio em andamento termina normalmente. Barbearias sem
+    # número próprio apontam para a plataforma, que nunca é fechada.
+    if servico.cliente is not cliente_whatsapp:
+        servico.cliente.sessao.close()
+
+
+# Serviços das barbearias com número próprio (as demais apontam para o da
+# plataforma). O TTL cobre credenciais alteradas por outros processos; as
+# alterações locais invalidam na hora.
+registro_whatsapp = CacheLRU(max_itens=Config.WHATSAPP_CLIENTES_MAX, ttl=300, ao_remover=_fechar_conexoes)
+_plataforma = None
+_plataforma_lock = threading.Lock()
+
+CAMPOS_CREDENCIAIS = ('whatsapp_numero', 'whatsapp_token')
+
+
+def balde_do_numero(phone_number_id, taxa, rajada):
+    with _baldes_lock:
+        balde = _baldes.obter(phone_number_id)
+        if balde is None:
+            balde = BaldeTokens(taxa, rajada)
+            _baldes.definir(phone_number_id, balde)
+        return balde
+
+
+def servico_plataforma():
+    """Serviço do número da plataforma (config da aplicação), criado no primeiro uso"""
+    global _plataforma
+    with _plataforma_lock:
+        if _plataforma is None:
+            config = current_app.config
+            _plataforma = WhatsAppService(
+                config.get('WHATSAPP_BUSINESS_API_URL'),
+                config.get('WHATSAPP_BUSINESS_PHONE_NUMBER_ID'),
+                config.get('WHATSAPP_BUSINESS_ACCESS_TOKEN'),
+                cliente=cliente_whatsapp,
+                taxa=config.get('WHATSAPP_MENSAGENS_POR_SEGUNDO', Config.WHATSAPP_MENSAGENS_POR_SEGUNDO),
+                rajada=config.get('WHATSAPP_RAJADA', Config.WHATSAPP_RAJADA)
+            )
+        return _plataforma
+
+
+def servico_whatsapp(barbearia_id=None):
+    """Serviço que envia em nome da barbearia (ou da plataforma, com barbearia_id None)"""
+    if barbearia_id is None:
+        return servico_plataforma()
+    barbearia_id = int(barbearia_id)
+
+    servico = registro_whatsapp.obter(barbearia_id)
+    if servico is not None:
+        return servico
+
+    geracao = registro_whatsapp.geracao
+    credenciais = db.session.query(
+        ConfiguracaoBarbearia.whatsapp_numero, ConfiguracaoBarbearia.whatsapp_token
+    ).filter_by(barbearia_id=barbearia_id).first()
+
+    if credenciais and credenciais.whatsapp_numero and credenciais.whatsapp_token:
+        config = current_app.config
+        servico = WhatsAppService(
+            config.get('WHATSAPP_BUSINESS_API_URL'),
+            credenciais.whatsapp_numero,
+            credenciais.whatsapp_token,
+            cliente=ClienteHTTP(
+                f'whatsapp-{barbearia_id}',
+                pool=config.get('WHATSAPP_POOL_CONEXOES_BARBEARIA', Config.WHATSAPP_POOL_CONEXOES_BARBEARIA),
+                timeout=(
+                    config.get('WHATSAPP_TIMEOUT_CONEXAO', Config.WHATSAPP_TIMEOUT_CONEXAO),
+                    config.get('WHATSAPP_TIMEOUT_LEITURA', Config.WHATSAPP_TIMEOUT_LEITURA)
+                )
+            ),
+            taxa=config.get('WHATSAPP_MENSAGENS_POR_SEGUNDO', Config.WHATSAPP_MENSAGENS_POR_SEGUNDO),
+            rajada=config.get('WHATSAPP_RAJADA', Config.WHATSAPP_RAJADA)
+        )
+    else:
+        servico = servico_plataforma()
+
+    registro_whatsapp.definir(barbearia_id, servico, geracao)
+    return servico
+
+
+def invalidar_servico_whatsapp(barbearia_id):
+    registro_whatsapp.invalidar(int(barbearia_id))
+
+
+def estatisticas_whatsapp():
+    return {
+        "plataforma": cliente_whatsapp.estatisticas(),
+        "registro": registro_whatsapp.estatisticas()
+    }
+
+
+@event.listens_for(ConfiguracaoBarbearia, 'after_update')
+def _registrar_credenciais_alteradas(mapper, connection, config):
+    estado = inspect(config)
+    if any(estado.attrs[campo].history.has_changes() for campo in CAMPOS_CREDENCIAIS):
+        sessao = object_session(config)
+        if sessao is not None:
+            sessao.info.setdefault('whatsapp_alterados', set()).add(config.barbearia_id)
+
+
+@event.listens_for(ConfiguracaoBarbearia, 'after_insert')
+@event.listens_for(ConfiguracaoBarbearia, 'after_delete')
+def _registrar_configuracao_criada_ou_removida(mapper, connection, config):
+    sessao = object_session(config)
+    if sessao is not None:
+        sessao.info.setdefault('whatsapp_alterados', set()).add(config.barbearia_id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidar_credenciais_alteradas(sessao):
+    for barbearia_id in sessao.info.pop('whatsapp_alterados', ()):
+        invalidar_servico_whatsapp(barbearia_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_credenciais_alteradas(sessao):
+    sessao.info.pop('whatsapp_alterados', None)
+
+
 class WhatsAppService:
-    def __init__(self):
-        self.base_url = current_app.config.get('WHATSAPP_BUSINESS_API_URL')
-        self.phone_number_id = current_app.config.get('WHATSAPP_BUSINESS_PHONE_NUMBER_ID')
-        self.access_token = current_app.config.get('WHATSAPP_BUSINESS_ACCESS_TOKEN')
+    def __init__(self, base_url, phone_number_id, access_token, cliente=None, taxa=None, rajada=None):
+        self.base_url = base_url
+        self.phone_number_id = phone_number_id
+        self.access_token = access_token
+        self.cliente = cliente or cliente_whatsapp
+        self.balde = balde_do_numero(
+            phone_number_id,
+            taxa or Config.WHATSAPP_MENSAGENS_POR_SEGUNDO,
+            rajada or Config.WHATSAPP_RAJADA
+        )
     
-    def enviar_mensagem(self, numero_destino, mensagem):
-        """Envia mensagem via WhatsApp Business API"""
+    @property
+    def configurado(self):
+        return all([self.base_url, self.phone_number_id, self.access_token])
+
+    def _enviar(self, numero_destino, mensagem):
+        """Envia respeitando o limite do número remetente; None se enviada, senão o motivo"""
         try:
-            if not all([self.base_url, self.phone_number_id, self.access_token]):
+            if not self.configurado:
                 logger.warning("WhatsApp Business não configurado")
-                return False
+                return "WhatsApp Business não configurado"
 
             url = f"{self.base_url}/{self.phone_number_id}/messages"
             
@@ -35,18 +193,45 @@ class WhatsAppService:
                 }
             }
             
-            response = requests.post(url, json=payload, headers=headers)
+            self.balde.aguardar()
+            response = self.cliente.post(url, json=payload, headers=headers)
             
             if response.status_code == 200:
                 logger.info(f"Mensagem enviada para {numero_destino}")
-                return True
+                return None
             else:
                 logger.error(f"Erro ao enviar mensagem: {response.status_code} - {response.text}")
-                return False
+                return f"HTTP {response.status_code}"
                 
+        except CircuitoAberto:
+            logger.warning(f"API do WhatsApp indisponível, mensagem para {numero_destino} não enviada")
+            return "Circuito aberto"
         except Exception as e:
             logger.error(f"Erro no WhatsAppService: {str(e)}")
-            return False
+            return str(e)
+
+    def enviar_mensagem(self, numero_destino, mensagem):
+        """Envia mensagem via WhatsApp Business API"""
+        return self._enviar(numero_destino, mensagem) is None
+
+    def enviar_lote(self, mensagens, concorrencia=None):
+        """Envia [(numero_destino, mensagem)] em paralelo, no ritmo do token bucket.
+
+        `concorrencia` padrão é o tamanho do pool de conexões. Retorna, na ordem
+        de entrada, {"destino", "enviada", "erro"} para cada mensagem.
+        """
+        mensagens = list(mensagens)
+        if not mensagens:
+            return []
+
+        def enviar(item):
+            numero_destino, mensagem = item
+            erro = self._enviar(numero_destino, mensagem)
+            return {"destino": numero_destino, "enviada": erro is None, "erro": erro}
+
+        workers = min(len(mensagens), concorrencia or self.cliente.pool)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='whatsapp-lote') as executor:
+            return list(executor.map(enviar, mensagens))
 
     def enviar_confirmacao_agendamento(self, agendamento):
         """Envia confirmação de agendamento"""
@@ -86,11 +271,40 @@ Obrigado pela preferência! 👏
             logger.error(f"Erro ao enviar confirmação: {str(e)}")
             return False
 
+    def enviar_cancelamento(self, agendamento):
+        """Envia aviso de cancelamento de agendamento"""
+        try:
+            cliente = agendamento.cliente_info
+            servico = agendamento.servico_info
+            barbearia = agendamento.barbearia
+            
+            mensagem = f"""
+❌ *Agendamento Cancelado*
+
+Olá {cliente.nome}, seu agendamento foi cancelado.
+
+📅 *Data:* {agendamento.horario.strftime('%d/%m/%Y')}
+⏰ *Horário:* {agendamento.horario.strftime('%H:%M')}
+💈 *Serviço:* {servico.nome}
+
+Para remarcar, entre em contato: {barbearia.telefone}
+
+*Barbearia {barbearia.nome}*
+            """
+            
+            return self.enviar_mensagem(cliente.telefone, mensagem.strip())
+            
+        except Exception as e:
+            logger.error(f"Erro ao enviar cancelamento: {str(e)}")
+            return False
+
     def enviar_lembrete_agendamento(self, agendamento, horas_antes=24):
         """Envia lembrete de agendamento"""
         try:
             cliente = agendamento.cliente_info
             servico = agendamento.servico_info
+            dias = (agendamento.horario.date() - datetime.utcnow().date()).days
+            dia = {0: 'Hoje', 1: 'Amanhã'}.get(dias, agendamento.horario.strftime('%d/%m'))
             
             mensagem = f"""
 🔔 *Lembrete de Agendamento*
@@ -98,7 +312,7 @@ Obrigado pela preferência! 👏
 Olá {cliente.nome}, lembrete do seu agendamento!
 
 💈 *Serviço:* {servico.nome}
-📅 *Amanhã às {agendamento.horario.strftime('%H:%M')}*
+📅 *{dia} às {agendamento.horario.strftime('%H:%M')}*
 
 Não se esqueça do seu horário! 😊
 
@@ -162,6 +376,3 @@ Não perca seus agendamentos e clientes! 🚨
         except Exception as e:
             logger.error(f"Erro ao enviar alerta: {str(e)}")
             return False
-
-# Instância global do serviço
-whatsapp_service = WhatsAppService()
\ No newline at end of file
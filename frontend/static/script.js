@@ -2,6 +2,8 @@
 let SERVICOS = [];
 let BARBEIROS = [];
 let AGENDAMENTOS = [];
+let PROXIMO_CURSOR = null; // Próxima página da lista de agendamentos
+const AGENDAMENTOS_POR_PAGINA = 100;
 let BARBEARIA_ID = 1; // Em produção, isso viria do login
 
 // Constantes DOM
@@ -75,6 +77,68 @@ async function carregarBarbeiros() {
     }
 }
 
+// Cache de horários por barbeiro/serviço/dia (uma requisição cobre a semana)
+let CACHE_HORARIOS = {};
+
+async function buscarHorariosSemana(barbeiroId, servicoId, data) {
+    const chave = `${barbeiroId}|${servicoId}|${data}`;
+    if (CACHE_HORARIOS[chave]) return CACHE_HORARIOS[chave];
+
+    const fim = new Date(`${data}T00:00:00`);
+    fim.setDate(fim.getDate() + 6);
+    const ate = `${fim.getFullYear()}-${String(fim.getMonth() + 1).padStart(2, '0')}-${String(fim.getDate()).padStart(2, '0')}`;
+
+    const res = await fetch(
+        `http://localhost:5000/horarios-disponiveis?barbearia_id=${BARBEARIA_ID}&barbeiro_id=${barbeiroId}&servico_id=${servicoId}&de=${data}&ate=${ate}`
+    );
+    if (!res.ok) throw new Error('Erro ao carregar horários');
+
+    const resposta = await res.json();
+    Object.entries(resposta.dias).forEach(([dia, horarios]) => {
+        CACHE_HORARIOS[`${barbeiroId}|${servicoId}|${dia}`] = horarios;
+    });
+    return CACHE_HORARIOS[chave] || [];
+}
+
+// Pré-reserva do horário escolhido enquanto o cliente preenche os dados
+let PRE_RESERVA = null;
+
+async function liberarPreReserva() {
+    if (!PRE_RESERVA) return;
+    const token = PRE_RESERVA;
+    PRE_RESERVA = null;
+    try {
+        await fetch(`http://localhost:5000/pre-reservas/${token}`, {
+            method: 'DELETE',
+            headers: { 'X-Barbearia-ID': BARBEARIA_ID.toString() }
+        });
+    } catch (error) {
+        console.error('Erro ao liberar pré-reserva:', error);
+    }
+}
+
+async function preReservarHorario(barbeiroId, servicoId, horario) {
+    await liberarPreReserva();
+    try {
+        const res = await fetch('http://localhost:5000/pre-reservas', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-Barbearia-ID': BARBEARIA_ID.toString()
+            },
+            body: JSON.stringify({ barbeiro_id: barbeiroId, servico_id: servicoId, horario })
+        });
+        const data = await res.json();
+        if (!res.ok) throw new Error(data.erro || 'Horário indisponível');
+
+        PRE_RESERVA = data.pre_reserva;
+        return true;
+    } catch (error) {
+        mostrarToast(error.message, 'erro');
+        return false;
+    }
+}
+
 // Carregar horários disponíveis
 async function carregarHorarios() {
     const data = document.getElementById('data').value;
@@ -90,23 +154,22 @@ async function carregarHorarios() {
     }
 
     try {
-        const res = await fetch(
-            `http://localhost:5000/horarios-disponiveis?barbearia_id=${BARBEARIA_ID}&barbeiro_id=${barbeiroId}&data=${data}`
-        );
-        
-        if (!res.ok) throw new Error('Erro ao carregar horários');
-        
-        const dataHorarios = await res.json();
+        const horariosDia = await buscarHorariosSemana(barbeiroId, servicoId, data);
         
-        if (dataHorarios.horarios_disponiveis.length === 0) {
+        if (horariosDia.length === 0) {
             listaHorarios.innerHTML = '<p style="color:#aaa; text-align:center; padding:20px;">Nenhum horário disponível para esta data</p>';
         } else {
-            dataHorarios.horarios_disponiveis.forEach(horario => {
+            horariosDia.forEach(horario => {
                 const div = document.createElement('div');
                 div.className = 'horario-opcao';
                 div.textContent = horario;
                 
-                div.onclick = () => {
+                div.onclick = async () => {
+                    if (!await preReservarHorario(barbeiroId, servicoId, `${data}T${horario}:00`)) {
+                        CACHE_HORARIOS = {};
+                        carregarHorarios();
+                        return;
+                    }
                     document.getElementById('hora').value = `${data}T${horario}:00`;
                     // Remover seleção anterior
                     Array.from(listaHorarios.children).forEach(c => {
@@ -185,7 +248,8 @@ form.addEventListener('submit', async e => {
                 telefone, 
                 servico_id: servicoId, // ✅ CORRIGIDO: servico_id em vez de servico
                 horario, 
-                barbeiro_id: barbeiroId 
+                barbeiro_id: barbeiroId,
+                pre_reserva: PRE_RESERVA
             })
         });
         
@@ -196,6 +260,8 @@ form.addEventListener('submit', async e => {
         }
         
         mostrarToast(data.msg, 'sucesso');
+        CACHE_HORARIOS = {};
+        PRE_RESERVA = null;
         
         // Limpar formulário
         form.reset();
@@ -215,13 +281,27 @@ form.addEventListener('submit', async e => {
     }
 });
 
-// Atualizar lista de agendamentos
+// Buscar uma página de agendamentos (de hoje em diante)
+async function buscarAgendamentos(cursor = null) {
+    const hoje = new Date().toISOString().split('T')[0];
+    let url = `http://localhost:5000/agendamentos?barbearia_id=${BARBEARIA_ID}&de=${hoje}&limite=${AGENDAMENTOS_POR_PAGINA}`;
+    if (cursor) url += `&cursor=${encodeURIComponent(cursor)}`;
+
+    const res = await fetch(url, {
+        headers: { 'X-Barbearia-ID': BARBEARIA_ID.toString() }
+    });
+    if (!res.ok) throw new Error('Erro ao carregar agendamentos');
+
+    const pagina = await res.json();
+    return { pagina, cursor: res.headers.get('X-Proximo-Cursor') };
+}
+
+// Atualizar lista de agendamentos (primeira página)
 async function atualizarListaAgendamentos() {
     try {
-        const res = await fetch(`http://localhost:5000/agendamentos?barbearia_id=${BARBEARIA_ID}`);
-        if (!res.ok) throw new Error('Erro ao carregar agendamentos');
-        
-        AGENDAMENTOS = await res.json();
+        const { pagina, cursor } = await buscarAgendamentos();
+        AGENDAMENTOS = pagina;
+        PROXIMO_CURSOR = cursor;
         filtrarAgendamentos('todos');
     } catch (error) {
         console.error('Erro ao carregar agendamentos:', error);
@@ -229,6 +309,23 @@ async function atualizarListaAgendamentos() {
     }
 }
 
+// Carregar a próxima página ao chegar no fim da lista
+async function carregarMaisAgendamentos() {
+    if (!PROXIMO_CURSOR) return;
+    const cursorAtual = PROXIMO_CURSOR;
+    PROXIMO_CURSOR = null;
+
+    try {
+        const { pagina, cursor } = await buscarAgendamentos(cursorAtual);
+        AGENDAMENTOS = AGENDAMENTOS.concat(pagina);
+        PROXIMO_CURSOR = cursor;
+        filtrarAgendamentos('todos');
+    } catch (error) {
+        PROXIMO_CURSOR = cursorAtual;
+        console.error('Erro ao carregar agendamentos:', error);
+    }
+}
+
 // Filtrar agendamentos
 function filtrarAgendamentos(status, event = null) {
     // Atualizar botões de filtro se event foi passado
@@ -277,7 +374,7 @@ function filtrarAgendamentos(status, event = null) {
         });
     }
     
-    contador.textContent = `Total: ${agendamentosFiltrados.length} agendamento(s)`;
+    contador.textContent = `Total: ${agendamentosFiltrados.length} agendamento(s)${PROXIMO_CURSOR ? ' (role para ver mais)' : ''}`;
 }
 
 // Cancelar agendamento
@@ -296,6 +393,7 @@ async function cancelarAgendamento(agendamentoId) {
         
         const data = await res.json();
         mostrarToast(data.msg, 'sucesso');
+        CACHE_HORARIOS = {};
         await atualizarListaAgendamentos();
     } catch (error) {
         console.error('Erro ao cancelar:', error);
@@ -351,6 +449,46 @@ async function atualizarDados() {
     mostrarToast('Dados atualizados!', 'sucesso');
 }
 
+// Eventos em tempo real: a lista só é recarregada quando algo muda
+let INTERVALO_POLLING = null;
+let RECARGA_PENDENTE = null;
+
+function iniciarPolling() {
+    if (!INTERVALO_POLLING) {
+        INTERVALO_POLLING = setInterval(atualizarListaAgendamentos, 30000);
+    }
+}
+
+function pararPolling() {
+    clearInterval(INTERVALO_POLLING);
+    INTERVALO_POLLING = null;
+}
+
+// Agrupa rajadas de eventos (ex.: agendamento recorrente) numa única recarga
+function agendarRecarga() {
+    clearTimeout(RECARGA_PENDENTE);
+    RECARGA_PENDENTE = setTimeout(() => {
+        CACHE_HORARIOS = {};
+        atualizarListaAgendamentos();
+    }, 300);
+}
+
+function conectarEventos() {
+    if (!window.EventSource) {
+        iniciarPolling();
+        return;
+    }
+
+    const fonte = new EventSource(`http://localhost:5000/eventos?barbearia_id=${BARBEARIA_ID}`);
+    // Na reconexão, o servidor reenvia o que se perdeu (Last-Event-ID) ou manda `recarregar`
+    fonte.addEventListener('open', pararPolling);
+    // O navegador reconecta sozinho; enquanto isso, o polling cobre
+    fonte.addEventListener('error', iniciarPolling);
+    ['agendamento_criado', 'agendamento_cancelado', 'agendamento_atualizado', 'recarregar'].forEach(tipo => {
+        fonte.addEventListener(tipo, agendarRecarga);
+    });
+}
+
 // Inicialização
 document.addEventListener('DOMContentLoaded', () => {
     // Configurar data mínima como hoje
@@ -376,6 +514,13 @@ document.addEventListener('DOMContentLoaded', () => {
     // Carregar dados iniciais
     atualizarDados();
     
-    // Atualizar a cada 30 segundos
-    setInterval(atualizarListaAgendamentos, 30000);
+    // Próximas páginas da lista sob demanda
+    listaAgendamentos.addEventListener('scroll', () => {
+        if (listaAgendamentos.scrollTop + listaAgendamentos.clientHeight >= listaAgendamentos.scrollHeight - 50) {
+            carregarMaisAgendamentos();
+        }
+    });
+    
+    // Atualizações em tempo real (com polling de 30 segundos como reserva)
+    conectarEventos();
 });
\ No newline at end of file